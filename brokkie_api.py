@@ -0,0 +1,313 @@
+# brokkie_api.py
+# Local JSON service for the DealReady quick estimate and owner report (standard library asyncio,
+# no web framework).
+#
+#   python brokkie_api.py [--host 127.0.0.1] [--port 8765] [--max-batch 256] [--max-wait-ms 2]
+#
+#   POST /estimate  {"revenue": 300000, "profit": 45000, "assets": 20000}  (or a list of those)
+#                   -> {"estimate": 457500, "suggestions": [...]}
+#   POST /report    {"name": "Demo SMB", "revenue": ..., "profit": ..., "assets": ...} -> application/pdf
+#   GET  /stats     request counts, cache hit rate, batch sizes, p50 / p99 latency per endpoint
+#   GET  /health
+#
+# Concurrent /estimate requests are gathered for up to --max-wait-ms (or --max-batch inputs) and
+# scored in one vectorized call; a lone request is not held back. Repeated inputs are answered
+# from an LRU before they are queued.
+# Owner reports render on a worker thread and reuse the report cache in brokkie_reports.
+# Request bodies need a Content-Length of at most MAX_BODY bytes; chunked uploads get 501.
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict, deque
+
+ESTIMATE_FIELDS = ("revenue", "profit", "assets")
+MAX_BODY = 64 * 1024
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 501: "Not Implemented"}
+
+class BadRequest(Exception):
+    pass
+
+class RequestError(Exception):
+    # A request the server refuses before reading its body; the connection is closed after it
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def body_length(headers):
+    # Content-Length of a request body; raises RequestError for bodies we cannot or will not read
+    if "transfer-encoding" in headers:
+        raise RequestError(501, "Transfer-Encoding is not supported; send a Content-Length body")
+    value = headers.get("content-length", "")
+    if not value:
+        return 0
+    if not (value.isascii() and value.isdigit()):
+        raise RequestError(400, "invalid Content-Length")
+    length = int(value)
+    if length > MAX_BODY:
+        raise RequestError(413, f"body too large (max {MAX_BODY} bytes)")
+    return length
+
+def estimate_inputs(payload):
+    # -> (revenue, profit, assets) floats; raises BadRequest for missing / non-numeric fields
+    if not isinstance(payload, dict):
+        raise BadRequest("expected a JSON object")
+    try:
+        values = tuple(float(payload[f]) for f in ESTIMATE_FIELDS)
+    except KeyError as e:
+        raise BadRequest(f"missing field {e.args[0]!r}")
+    except (TypeError, ValueError):
+        raise BadRequest(f"fields {ESTIMATE_FIELDS} must be numbers")
+    if any(v != v or v in (float("inf"), float("-inf")) for v in values):
+        raise BadRequest("fields must be finite numbers")
+    return values
+
+class LatencyStats:
+    # Rolling window of request latencies per endpoint
+    def __init__(self, window=10_000):
+        self.window = window
+        self.samples = {}
+        self.counts = {}
+
+    def add(self, endpoint, seconds):
+        self.samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+        self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def summary(self):
+        out = {}
+        for endpoint, samples in self.samples.items():
+            ordered = sorted(samples)
+            pick = lambda q: round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 3)
+            out[endpoint] = {"requests": self.counts[endpoint], "p50_ms": pick(0.50), "p99_ms": pick(0.99),
+                             "max_ms": round(ordered[-1] * 1000, 3)}
+        return out
+
+class EstimateBatcher:
+    # Micro-batches estimate requests: callers await estimate(); one task drains the queue and
+    # scores each batch with brokkie_core.quick_estimate_batch.
+    def __init__(self, max_batch=256, max_wait=0.002, cache_size=10_000):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched = 0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        from brokkie_core import quick_estimate_batch
+        quick_estimate_batch([0], [0], [0])  # load numpy before the first request, not during it
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def estimate(self, inputs):
+        cached = self.cache.get(inputs)
+        if cached is not None:
+            self.cache.move_to_end(inputs)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((inputs, future))
+        return await future
+
+    async def _run(self):
+        from brokkie_core import quick_estimate_batch
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(0)  # let requests already being handled enqueue
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            # A lone request is scored right away; under concurrent load the batch waits up to
+            # max_wait to fill
+            deadline = loop.time() + (self.max_wait if len(batch) > 1 else 0)
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Duplicates inside one batch are scored once
+            unique = list(dict.fromkeys(inputs for inputs, _ in batch))
+            try:
+                values = quick_estimate_batch(*zip(*unique)).tolist()
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            results = dict(zip(unique, values))
+            for inputs, value in results.items():
+                self.cache[inputs] = value
+                self.cache.move_to_end(inputs)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            for inputs, future in batch:
+                if not future.done():
+                    future.set_result(results[inputs])
+            self.batches += 1
+            self.batched += len(batch)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"cache_hits": self.hits, "cache_misses": self.misses,
+                "cache_hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "cache_items": len(self.cache), "batches": self.batches,
+                "avg_batch": round(self.batched / self.batches, 2) if self.batches else 0.0}
+
+class EstimateService:
+    def __init__(self, max_batch=256, max_wait_ms=2.0, cache_size=10_000):
+        self.batcher = EstimateBatcher(max_batch, max_wait_ms / 1000, cache_size)
+        self.latency = LatencyStats()
+        self.started = time.time()
+
+    # ---------- handlers: (status, content type, body bytes) ----------
+    async def handle_estimate(self, payload):
+        from brokkie_core import EXIT_PREP_SUGGESTIONS
+        if isinstance(payload, list):
+            inputs = [estimate_inputs(p) for p in payload]
+            values = await asyncio.gather(*(self.batcher.estimate(i) for i in inputs))
+            body = [{"estimate": v} for v in values]
+        else:
+            body = {"estimate": await self.batcher.estimate(estimate_inputs(payload)),
+                    "suggestions": EXIT_PREP_SUGGESTIONS}
+        return 200, "application/json", json.dumps(body).encode()
+
+    async def handle_report(self, payload):
+        from brokkie_core import generate_final_pdf, owner_report_context
+        revenue, profit, assets = estimate_inputs(payload)
+        estimate = await self.batcher.estimate((revenue, profit, assets))
+        context = owner_report_context(str(payload.get("name") or "Business"), revenue, profit, assets, estimate)
+        # Rendering is CPU work: keep it off the event loop (brokkie_reports caches identical contexts)
+        pdf = await asyncio.to_thread(generate_final_pdf, context)
+        return 200, "application/pdf", pdf
+
+    async def handle_stats(self, payload):
+        body = {"uptime_s": round(time.time() - self.started, 1), "latency": self.latency.summary(),
+                "estimate": self.batcher.stats()}
+        return 200, "application/json", json.dumps(body).encode()
+
+    async def handle_health(self, payload):
+        return 200, "application/json", b'{"ok": true}'
+
+    ROUTES = {
+        ("POST", "/estimate"): "handle_estimate",
+        ("POST", "/report"): "handle_report",
+        ("GET", "/stats"): "handle_stats",
+        ("GET", "/health"): "handle_health",
+    }
+
+    async def dispatch(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if method == "OPTIONS":
+            return 204, None, b""
+        handler = self.ROUTES.get((method, path))
+        if handler is None:
+            status = 405 if any(p == path for _, p in self.ROUTES) else 404
+            return status, "application/json", json.dumps({"error": REASONS[status]}).encode()
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            return 400, "application/json", b'{"error": "invalid JSON"}'
+        try:
+            return await getattr(self, handler)(payload)
+        except BadRequest as e:
+            return 400, "application/json", json.dumps({"error": str(e)}).encode()
+        except Exception as e:
+            return 500, "application/json", json.dumps({"error": f"{type(e).__name__}: {e}"}).encode()
+
+    # ---------- HTTP/1.1 with keep-alive ----------
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                start = time.perf_counter()
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, path, version = lines[0].split(" ", 2)
+                except ValueError:
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                try:
+                    length = body_length(headers)
+                except RequestError as e:
+                    # The body (if any) is left unread, so the connection cannot be reused
+                    status, ctype, body = e.status, "application/json", json.dumps({"error": str(e)}).encode()
+                    keep_alive = False
+                else:
+                    try:
+                        data = await reader.readexactly(length) if length else b""
+                    except (asyncio.IncompleteReadError, ConnectionError):
+                        return
+                    status, ctype, body = await self.dispatch(method.upper(), path, data)
+                out = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                       f"Content-Length: {len(body)}",
+                       "Access-Control-Allow-Origin: *",
+                       "Access-Control-Allow-Methods: GET, POST, OPTIONS",
+                       "Access-Control-Allow-Headers: Content-Type",
+                       f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                if ctype:
+                    out.append(f"Content-Type: {ctype}")
+                writer.write(("\r\n".join(out) + "\r\n\r\n").encode() + body)
+                await writer.drain()
+                self.latency.add(path.split("?", 1)[0], time.perf_counter() - start)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, ready=None):
+        self.batcher.start()
+        server = await asyncio.start_server(self.serve_connection, host, port, backlog=1024)
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the DealReady quick estimate and owner report over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=256, help="max estimate inputs scored per batch")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="how long a batch waits to fill up")
+    parser.add_argument("--cache-size", type=int, default=10_000, help="LRU entries for repeated estimate inputs")
+    args = parser.parse_args(argv)
+
+    service = EstimateService(args.max_batch, args.max_wait_ms, args.cache_size)
+    ready = lambda server: print(f"DealReady API on http://{args.host}:{args.port}", flush=True)
+    try:
+        asyncio.run(service.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(service.latency.summary(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
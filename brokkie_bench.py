@@ -0,0 +1,243 @@
+# brokkie_bench.py
+# Benchmarks for the hot paths of the valuation core, with a stored baseline for regressions.
+#
+#   python brokkie_bench.py [--scale quick|full] [--cases valuation,excel_write,...] [--repeat 3]
+#                           [--save-baseline] [--check] [--baseline bench_baseline.json] [--json out.json]
+#
+# Cases and sizes (quick / full):
+#   valuation        compute_valuation_models per deal             1 .. 100k / 1M deals
+#   valuation_batch  compute_valuation_models_batch                 1 .. 100k / 1M deals
+#   excel_write      save_excel                                     10 .. 10k / 1M rows
+#   excel_read       pd.read_excel of save_excel output             10 .. 10k / 1M rows
+#   final_pdf        generate_final_pdf with long notes             1 .. 10 / 200 pages
+#   cim_pdf          generate_cim_pdf with many highlights          1 .. 10 / 200 pages
+#   safe_text        safe_text on broker notes                      10 KB .. 1 MB / 10 MB
+#   download_link    download_link (base64 data URI)                1 KB .. 1 MB / 32 MB
+#
+# Inputs are generated from a fixed seed. Each size is timed --repeat times (best run kept), then
+# run once more under tracemalloc for peak memory. --save-baseline writes the results to the
+# baseline file (default: $BROKKIE_BENCH_BASELINE or bench_baseline.json next to this script);
+# --check compares against it and exits non-zero when a case is slower than --max-slowdown or
+# needs more than --max-memory-growth times the baseline. Save the baseline on the machine that
+# runs the nightly check; timings from other hardware are not comparable.
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+DEFAULT_BASELINE = os.environ.get("BROKKIE_BENCH_BASELINE",
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json"))
+SEED = 1234
+NOTES_LINE = ("Owner reports steady repeat business; two vehicles due for replacement — see “Capex” schedule. "
+              "Seasonal dip in Q1 is offset by service contracts…")
+
+# ---------- inputs ----------
+def _deals(n):
+    import numpy as np
+    rng = np.random.default_rng(SEED)
+    revenue = rng.integers(200_000, 3_000_000, n)
+    return {
+        "TTM Revenue": revenue,
+        "Net Income": (revenue * rng.uniform(0.05, 0.25, n)).astype("int64"),
+        "SDE (est)": (revenue * rng.uniform(0.1, 0.3, n)).astype("int64"),
+        "Assets": rng.integers(0, 500_000, n),
+    }
+
+def _financials_rows(n):
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(SEED)
+    metrics = ["TTM Revenue", "COGS", "Operating Expenses", "Net Income", "SDE (est)"]
+    return pd.DataFrame({"Metric": [metrics[i % len(metrics)] for i in range(n)],
+                         "Value": rng.integers(0, 3_000_000, n)})
+
+def _notes(chars):
+    return (NOTES_LINE * (chars // len(NOTES_LINE) + 1))[:chars]
+
+# About 45 wrapped lines of notes per final report page and 42 highlights per CIM page
+def _final_context(pages):
+    from brokkie_core import owner_report_context
+    context = owner_report_context("Benchmark Co", 1_250_000, 210_000, 80_000)
+    context["notes"] = "\n".join([NOTES_LINE[:95]] * (45 * pages))
+    return context
+
+def _cim_context(pages):
+    return {"business_name": "Benchmark Co", "location": "Seattle, WA", "industry": "Service",
+            "primary_data": {"TTM Revenue": 1_250_000, "Net Income": 210_000, "SDE (est)": 260_000},
+            "highlights": [f"{NOTES_LINE[:80]} ({i})" for i in range(42 * pages)]}
+
+# ---------- cases ----------
+# Each case: setup(size) -> state (not timed), run(state, rep) -> None, sizes per scale, unit.
+# rep differs per call so cached paths (the report render cache) are not measured.
+def _valuation_setup(n):
+    deals = _deals(n)
+    return [dict(zip(deals, row)) for row in zip(*(deals[k].tolist() for k in deals))]
+
+def _valuation_run(rows, rep):
+    from brokkie_core import compute_valuation_models
+    for row in rows:
+        compute_valuation_models(row, cma_multiple=0.9)
+
+def _valuation_batch_setup(n):
+    import pandas as pd
+    return pd.DataFrame(_deals(n))
+
+def _valuation_batch_run(df, rep):
+    from brokkie_core import compute_valuation_models_batch
+    compute_valuation_models_batch(df, seed=SEED)
+
+def _excel_write_run(df, rep):
+    from brokkie_core import save_excel
+    save_excel(df)
+
+def _excel_read_setup(n):
+    from brokkie_core import save_excel
+    return save_excel(_financials_rows(n))
+
+def _excel_read_run(data, rep):
+    import io
+    import pandas as pd
+    pd.read_excel(io.BytesIO(data), engine="openpyxl")
+
+def _final_pdf_run(context, rep):
+    from brokkie_core import generate_final_pdf
+    generate_final_pdf(dict(context, seller_contact=f"bench run {rep}"))
+
+def _cim_pdf_run(context, rep):
+    from brokkie_core import generate_cim_pdf
+    generate_cim_pdf(dict(context, one_liner=f"Benchmark run {rep}"))
+
+def _safe_text_run(text, rep):
+    from brokkie_core import safe_text
+    safe_text(text)
+
+def _download_link_setup(n):
+    return os.urandom(n) if n < 1 << 20 else bytes(range(256)) * (n // 256)
+
+def _download_link_run(data, rep):
+    from brokkie_core import download_link
+    download_link(data, "bench.bin")
+
+K, M = 1_000, 1_000_000
+CASES = {
+    "valuation": (_valuation_setup, _valuation_run, "deals",
+                  {"quick": [1, 1 * K, 100 * K], "full": [1, 1 * K, 100 * K, 1 * M]}),
+    "valuation_batch": (_valuation_batch_setup, _valuation_batch_run, "deals",
+                        {"quick": [1, 1 * K, 100 * K], "full": [1, 1 * K, 100 * K, 1 * M]}),
+    "excel_write": (_financials_rows, _excel_write_run, "rows",
+                    {"quick": [10, 1 * K, 10 * K], "full": [10, 1 * K, 100 * K, 1 * M]}),
+    "excel_read": (_excel_read_setup, _excel_read_run, "rows",
+                   {"quick": [10, 1 * K, 10 * K], "full": [10, 1 * K, 100 * K, 1 * M]}),
+    "final_pdf": (_final_context, _final_pdf_run, "pages", {"quick": [1, 10], "full": [1, 10, 50, 200]}),
+    "cim_pdf": (_cim_context, _cim_pdf_run, "pages", {"quick": [1, 10], "full": [1, 10, 50, 200]}),
+    "safe_text": (_notes, _safe_text_run, "chars", {"quick": [10 * K, 1 * M], "full": [10 * K, 1 * M, 10 * M]}),
+    "download_link": (_download_link_setup, _download_link_run, "bytes",
+                      {"quick": [1 * K, 1 * M], "full": [1 * K, 1 * M, 32 * M]}),
+}
+
+def run_case(name, size, repeat=3, memory=True):
+    setup, run, unit, _ = CASES[name]
+    state = setup(size)
+    gc.collect()
+    times = []
+    for rep in range(repeat):
+        start = time.perf_counter()
+        run(state, rep)
+        times.append(time.perf_counter() - start)
+    seconds = min(times)
+    result = {"case": name, "size": size, "unit": unit, "seconds": round(seconds, 6),
+              "per_second": round(size / seconds, 1) if seconds > 0 else None}
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run(state, repeat)
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 3)
+        finally:
+            tracemalloc.stop()
+    return result
+
+def result_key(r):
+    return f"{r['case']}@{r['size']}"
+
+# ---------- baseline ----------
+def save_baseline(path, results, scale):
+    payload = {"created": datetime.utcnow().isoformat(timespec="seconds"), "scale": scale,
+               "python": platform.python_version(), "machine": platform.platform(),
+               "results": {result_key(r): r for r in results}}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=1)
+
+def compare(results, baseline, max_slowdown=1.25, max_memory_growth=1.25, min_seconds=0.005, min_mb=1.0):
+    # -> list of (key, message) regressions. Timings under min_seconds and peaks under min_mb are
+    # treated as noise.
+    regressions = []
+    for r in results:
+        base = baseline["results"].get(result_key(r))
+        if base is None:
+            continue
+        if r["seconds"] > max(base["seconds"], min_seconds) * max_slowdown:
+            regressions.append((result_key(r), f"{r['seconds']:.4f}s vs {base['seconds']:.4f}s baseline"))
+        if "peak_mb" in r and base.get("peak_mb") is not None and \
+                r["peak_mb"] > max(base["peak_mb"], min_mb) * max_memory_growth:
+            regressions.append((result_key(r), f"peak {r['peak_mb']:.1f} MB vs {base['peak_mb']:.1f} MB baseline"))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Brokkie hot paths and compare with a stored baseline.")
+    parser.add_argument("--scale", choices=["quick", "full"], default="quick", help="full goes up to 1M deals / rows")
+    parser.add_argument("--cases", default=",".join(CASES), help="comma-separated subset of cases")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per size; the fastest is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory run")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="exit non-zero on regressions against the baseline")
+    parser.add_argument("--max-slowdown", type=float, default=1.25, help="allowed time ratio vs baseline")
+    parser.add_argument("--max-memory-growth", type=float, default=1.25, help="allowed peak-memory ratio vs baseline")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    names = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in names if c not in CASES]
+    if unknown:
+        parser.error(f"unknown cases {unknown}; expected some of {list(CASES)}")
+    baseline = None
+    if args.check:
+        if not os.path.exists(args.baseline):
+            parser.error(f"no baseline at {args.baseline}; run with --save-baseline first")
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = []
+    for name in names:
+        for size in CASES[name][3][args.scale]:
+            r = run_case(name, size, repeat=args.repeat, memory=not args.no_memory)
+            results.append(r)
+            base = (baseline or {}).get("results", {}).get(result_key(r))
+            vs = f"  ({r['seconds'] / base['seconds']:.2f}x baseline)" if base and base["seconds"] else ""
+            peak = f"  peak {r['peak_mb']:9.1f} MB" if "peak_mb" in r else ""
+            print(f"{name:16} {size:>10,} {r['unit']:6} {r['seconds'] * 1000:10.2f} ms "
+                  f"{r['per_second'] or 0:>14,.0f} {r['unit']}/s{peak}{vs}", flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    if args.save_baseline:
+        save_baseline(args.baseline, results, args.scale)
+        print(f"baseline saved to {args.baseline}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.max_slowdown, args.max_memory_growth)
+        for key, message in regressions:
+            print(f"[FAIL] {key}: {message}")
+        if regressions:
+            return 1
+        print(f"[ok] no regressions against {args.baseline} ({baseline.get('created')})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
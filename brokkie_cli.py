@@ -0,0 +1,171 @@
+# brokkie_cli.py
+# Headless batch runner for the 12-step workflow.
+#
+#   python brokkie_cli.py DEALS_DIR --out OUT_DIR [--workers N] [--comps COMPS.parquet]
+#
+# Every sub-folder of DEALS_DIR is one deal. Its files are treated as financial source documents;
+# files under a real_estate/ sub-folder are parsed as property docs. An optional deal.json
+# provides business meta and analyst inputs:
+#   {"name": ..., "location": ..., "industry": ..., "contact": ..., "seed": 123,
+#    "assets": {"Furniture & Fixtures": 20000, ...}, "notes": "..."}
+# Optional "lat" / "lon" place the deal for comparables search; otherwise its location is used.
+# Deals are prepared (steps 1-11) in parallel, then valued together with the vectorized models
+# and their final reports rendered in parallel.
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from brokkie_core import (
+    save_excel, generate_questions, generate_questions_pdf, compute_valuation_models_batch,
+    valuation_multiples, run_market_research, generate_cim_pdf,
+)
+from brokkie_comps import default_index
+from brokkie_ingest import ingest_documents
+from brokkie_reports import render_reports_batch
+
+DEAL_META = "deal.json"
+REAL_ESTATE_DIR = "real_estate"
+
+def _read_files(folder, skip=()):
+    files = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path) and name not in skip and not name.startswith("."):
+            with open(path, "rb") as f:
+                files.append((name, f.read()))
+    return files
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def prepare_deal(deal_dir, out_dir):
+    # Run steps 1-11 for one deal folder and write their artifacts to out_dir. Returns what Step 12
+    # needs; the valuation models run for the whole batch at once (see value_deals).
+    start = time.perf_counter()
+    deal_id = os.path.basename(os.path.normpath(deal_dir))
+    meta = {}
+    meta_path = os.path.join(deal_dir, DEAL_META)
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+
+    # Steps 1-2: ingest documents and confirm primary data
+    docs = _read_files(deal_dir, skip=(DEAL_META,))
+    if not docs:
+        raise ValueError(f"no source documents in {deal_dir}")
+    os.makedirs(out_dir, exist_ok=True)
+    parsed_df, report = ingest_documents(docs, max_workers=1)
+    _write(os.path.join(out_dir, "parsed_financial_data.xlsx"), save_excel(parsed_df))
+    primary_data = {r.Metric: int(r.Value) for r in parsed_df.itertuples()}
+
+    # Step 3: seller Q&A
+    questions = generate_questions(parsed_df)
+    _write(os.path.join(out_dir, "general_questions.pdf"), generate_questions_pdf(questions))
+
+    # Steps 6-10: assets, market research, real estate docs
+    assets = dict(meta.get("assets", {}))
+    re_dir = os.path.join(deal_dir, REAL_ESTATE_DIR)
+    if os.path.isdir(re_dir):
+        re_parsed, _ = ingest_documents(_read_files(re_dir), kind="real_estate", max_workers=1)
+        re_values = {r.Metric: int(r.Value) for r in re_parsed.itertuples()}
+        if "Appraised Value" in re_values:
+            assets.setdefault("Real Estate (land+building)", re_values["Appraised Value"])
+    research = run_market_research(meta, default_index())
+
+    # Step 11: CIM / teaser
+    primary_with_assets = primary_data.copy()
+    primary_with_assets.update(assets)
+    _write(os.path.join(out_dir, "CIM_Teaser.pdf"), generate_cim_pdf({
+        "business_name": meta.get("name", deal_id),
+        "location": meta.get("location", "N/A"),
+        "industry": meta.get("industry", "N/A"),
+        "primary_data": primary_data,
+        "market_research": research,
+        "highlights": meta.get("highlights", ["Recurring contracts", "High margin services", "Low customer churn"]),
+        "one_liner": meta.get("one_liner", "Confidential business opportunity — summary available upon ND."),
+    }))
+
+    # Step 12 inputs. Seed defaults to a hash of the deal id so reruns agree.
+    seed = meta.get("seed", int(hashlib.sha256(deal_id.encode()).hexdigest()[:8], 16))
+    cma_multiple, sde_multiple = valuation_multiples(research, seed, primary_with_assets)
+    return {"deal": deal_id, "out_dir": out_dir, "meta": meta, "documents": len(docs), "seed": seed,
+            "primary_data": primary_with_assets, "cma_multiple": cma_multiple, "sde_multiple": sde_multiple,
+            "ingest_report": report, "seconds": time.perf_counter() - start}
+
+def value_deals(prepared, workers=None):
+    # Step 12 for every prepared deal: one vectorized valuation pass, then the final reports
+    # rendered in parallel. Returns the summary rows.
+    if not prepared:
+        return []
+    frame = pd.DataFrame([d["primary_data"] for d in prepared])
+    frame["CMA Multiple"] = [d["cma_multiple"] for d in prepared]
+    frame["SDE Multiple"] = [d["sde_multiple"] for d in prepared]  # None -> default multiple
+    models = compute_valuation_models_batch(frame)
+    reports = []
+    rows = []
+    for d, values in zip(prepared, models.to_dict("records")):
+        valuations = {k: float(v) for k, v in values.items()}
+        meta = d["meta"]
+        reports.append(("final", {
+            "business_name": meta.get("name", d["deal"]),
+            "seller_contact": meta.get("contact", "Seller"),
+            "primary_data": d["primary_data"],
+            "valuations": valuations,
+            "notes": meta.get("notes", "Selected recommended value based on weighted median of models."),
+        }, os.path.join(d["out_dir"], "Final_Valuation_Report.pdf")))
+        with open(os.path.join(d["out_dir"], "valuations.json"), "w", encoding="utf-8") as f:
+            json.dump({"deal": d["deal"], "seed": d["seed"], "primary_data": d["primary_data"],
+                       "valuations": valuations, "ingest_report": d["ingest_report"]}, f, indent=2)
+        row = {"Deal": d["deal"], "Documents": d["documents"]}
+        row.update({k: round(v, 2) for k, v in valuations.items()})
+        row["Seconds"] = round(d["seconds"], 3)
+        rows.append(row)
+    render_reports_batch(reports, workers=workers)
+    return rows
+
+def find_deals(deals_dir):
+    return [os.path.join(deals_dir, name) for name in sorted(os.listdir(deals_dir))
+            if os.path.isdir(os.path.join(deals_dir, name)) and not name.startswith(".")]
+
+def run_batch(deals_dir, out_dir, workers=None):
+    # Prepare every deal folder concurrently, then value them together; returns (summary rows, {deal: error})
+    deals = find_deals(deals_dir)
+    prepared, errors = [], {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(prepare_deal, d, os.path.join(out_dir, os.path.basename(d))): d for d in deals}
+        for fut in as_completed(futures):
+            deal_id = os.path.basename(futures[fut])
+            try:
+                prepared.append(fut.result())
+                print(f"[ok]    {deal_id}", flush=True)
+            except Exception as e:
+                errors[deal_id] = str(e)
+                print(f"[error] {deal_id}: {e}", file=sys.stderr, flush=True)
+    prepared.sort(key=lambda d: d["deal"])
+    return value_deals(prepared, workers), errors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Brokkie 12-step valuation pipeline over a directory of deal folders.")
+    parser.add_argument("deals_dir", help="directory containing one sub-folder per deal")
+    parser.add_argument("--out", default="brokkie_out", help="output directory (default: brokkie_out)")
+    parser.add_argument("--workers", type=int, default=None, help="deals processed concurrently (default: CPU count)")
+    parser.add_argument("--comps", default=None, help="comparables database for market research (default: $BROKKIE_COMPS_PATH)")
+    args = parser.parse_args(argv)
+    if args.comps:
+        os.environ["BROKKIE_COMPS_PATH"] = args.comps  # inherited by the worker processes
+
+    start = time.perf_counter()
+    rows, errors = run_batch(args.deals_dir, args.out, args.workers)
+    os.makedirs(args.out, exist_ok=True)
+    summary = pd.DataFrame(rows)
+    summary.to_csv(os.path.join(args.out, "summary.csv"), index=False)
+    print(f"{len(rows)} deals valued, {len(errors)} failed in {time.perf_counter() - start:.1f}s -> {args.out}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+# brokkie_comps.py
+# Local comparables database for Step 8 market research. Closed business sales and real estate
+# sales are loaded from CSV / Parquet. Nearest-comparable queries go through KD-trees over
+# unit-sphere coordinates (one tree per kind / industry partition, built on first use), and the
+# per-industry revenue and SDE multiples are kept as sorted arrays, so a quantile is an index lookup.
+# Closed deals added later are merged in incrementally: their multiples are inserted into the sorted
+# arrays, and their points are scanned brute force until enough pile up to rebuild the trees.
+#
+# Comps columns: comp_id, kind ("business" | "real_estate"), industry, location ("City, ST"),
+# address, lat, lon, price, revenue, sde, ffe, closed_at. lat, lon and price are required.
+import os
+import threading
+from functools import lru_cache
+
+COMP_COLUMNS = ("comp_id", "kind", "industry", "location", "address", "lat", "lon",
+                "price", "revenue", "sde", "ffe", "closed_at")
+NUMERIC_COLUMNS = ("lat", "lon", "price", "revenue", "sde", "ffe")
+QUANTILES = (0.25, 0.5, 0.75)
+EARTH_RADIUS_KM = 6371.0
+ALL = "*"
+
+def default_comps_path():
+    return os.environ.get("BROKKIE_COMPS_PATH", os.path.join(os.path.expanduser("~"), ".brokkie", "comps.parquet"))
+
+@lru_cache(maxsize=1)
+def default_index():
+    # Shared per-process index over default_comps_path(); None when no dataset is on disk
+    path = default_comps_path()
+    return CompsIndex.from_path(path) if os.path.exists(path) else None
+
+def _key(value):
+    if value is None or value != value:  # None / NaN
+        return ""
+    return str(value).strip().lower()
+
+def _keys(column):
+    # _key for a whole column; the string work runs once per distinct value
+    import numpy as np
+    import pandas as pd
+    codes, uniques = pd.factorize(column)
+    keys = np.array([_key(u) for u in uniques] + [""], dtype=object)
+    return keys[codes]  # missing values (code -1) map to the trailing ""
+
+def _text(value):
+    return None if value is None or value != value else str(value)
+
+def _number(value):
+    return None if value is None or value != value else float(value)
+
+def normalize_comps(frame):
+    # Fixed column set and dtypes; rows without coordinates or a price are dropped
+    import pandas as pd
+    frame = frame.reindex(columns=COMP_COLUMNS)
+    frame["kind"] = frame["kind"].fillna("business").astype(str).str.lower()
+    for col in NUMERIC_COLUMNS:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce")
+    frame["closed_at"] = pd.to_datetime(frame["closed_at"], errors="coerce")
+    return frame.dropna(subset=["lat", "lon", "price"]).reset_index(drop=True)
+
+def load_comps(path):
+    import pandas as pd
+    if path.lower().endswith((".parquet", ".pq")):
+        return normalize_comps(pd.read_parquet(path))
+    return normalize_comps(pd.read_csv(path))
+
+def _xyz(lat, lon):
+    # Unit-sphere coordinates: euclidean (chord) distance orders points like great-circle distance
+    import numpy as np
+    lat, lon = np.radians(np.asarray(lat, dtype="float64")), np.radians(np.asarray(lon, dtype="float64"))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+def _chord_to_km(chord):
+    import numpy as np
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+def _km_to_chord(km):
+    import numpy as np
+    return 2 * np.sin(min(km / (2 * EARTH_RADIUS_KM), np.pi / 2))
+
+class CompsIndex:
+    def __init__(self, comps, rebuild_every=50_000):
+        self.rebuild_every = rebuild_every
+        self._lock = threading.Lock()
+        self._reset(normalize_comps(comps))
+
+    @classmethod
+    def from_path(cls, path, **kwargs):
+        return cls(load_comps(path), **kwargs)
+
+    def _reset(self, comps):
+        import numpy as np
+        self.comps = comps
+        self._pending = comps.iloc[:0]  # rows added since the last rebuild (not in the trees yet)
+        self._xyz = _xyz(comps["lat"].to_numpy(), comps["lon"].to_numpy())
+        self._kinds = comps["kind"].to_numpy()
+        self._industries = _keys(comps["industry"])
+        self._price = comps["price"].to_numpy(dtype="float64")
+        self._closed = comps["closed_at"].to_numpy(dtype="datetime64[ns]")
+        self._indexed = len(comps)  # array positions past this belong to _pending (scanned brute force)
+        self._trees = {}
+        self._multiples = {}
+        self._locations = {}
+        self._add_multiples(comps)
+        self._add_locations(comps)
+
+    # ---------- incremental updates ----------
+    def _add_multiples(self, rows):
+        # Sorted revenue / SDE multiples per industry (plus ALL), merged with np.insert
+        import numpy as np
+        import pandas as pd
+        business = rows[rows["kind"] == "business"]
+        for name, denom in (("rev", "revenue"), ("sde", "sde")):
+            valid = business[business[denom] > 0]
+            values = (valid["price"] / valid[denom]).to_numpy(dtype="float64")
+            codes, industries = pd.factorize(_keys(valid["industry"]))
+            # One lexsort over (industry code, multiple), then split into per-industry runs
+            order = np.lexsort((values, codes))
+            codes, sorted_values = codes[order], values[order]
+            starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, dtype=int)
+            groups = [(ALL, np.sort(values))]
+            groups += [(industries[codes[a]], sorted_values[a:b])
+                       for a, b in zip(starts, np.r_[starts[1:], len(codes)]) if industries[codes[a]]]
+            for industry, vals in groups:
+                current = self._multiples.get((industry, name))
+                if current is None:
+                    self._multiples[(industry, name)] = vals
+                else:
+                    self._multiples[(industry, name)] = np.insert(current, np.searchsorted(current, vals), vals)
+
+    def _add_locations(self, rows):
+        # Running coordinate sums per "city, st" and per state, used to place a deal that has no lat/lon
+        sums = rows[["lat", "lon"]].groupby(_keys(rows["location"])).agg(["sum", "count"])
+        for city, (lat, _, lon, n) in zip(sums.index, sums.to_numpy()):
+            if not city:
+                continue
+            state = city.rsplit(",", 1)[-1].strip()
+            for k in {city, state}:
+                acc = self._locations.setdefault(k, [0.0, 0.0, 0])
+                acc[0] += lat
+                acc[1] += lon
+                acc[2] += int(n)
+
+    def add_comps(self, rows):
+        # Append newly closed deals / sales. Multiples and locations update in place; the KD-trees
+        # are rebuilt only once rebuild_every rows are waiting.
+        import numpy as np
+        import pandas as pd
+        rows = normalize_comps(rows)
+        if not len(rows):
+            return 0
+        with self._lock:
+            if len(self._pending) + len(rows) >= self.rebuild_every:
+                self._reset(pd.concat([self.comps, self._pending, rows], ignore_index=True))
+                return len(rows)
+            self._pending = pd.concat([self._pending, rows], ignore_index=True)
+            self._xyz = np.vstack([self._xyz, _xyz(rows["lat"].to_numpy(), rows["lon"].to_numpy())])
+            self._kinds = np.concatenate([self._kinds, rows["kind"].to_numpy()])
+            self._industries = np.concatenate([self._industries, _keys(rows["industry"])])
+            self._price = np.concatenate([self._price, rows["price"].to_numpy(dtype="float64")])
+            self._closed = np.concatenate([self._closed, rows["closed_at"].to_numpy(dtype="datetime64[ns]")])
+            self._add_multiples(rows)
+            self._add_locations(rows)
+        return len(rows)
+
+    def all_comps(self):
+        import pandas as pd
+        with self._lock:
+            comps, pending = self.comps, self._pending
+        return pd.concat([comps, pending], ignore_index=True) if len(pending) else comps
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if path.lower().endswith((".parquet", ".pq")):
+            self.all_comps().to_parquet(path, index=False)
+        else:
+            self.all_comps().to_csv(path, index=False)
+
+    # ---------- queries ----------
+    def _snapshot(self):
+        # One consistent generation for a query. add_comps replaces the arrays instead of writing
+        # into them and _reset starts a new tree dict, so the references stay valid after the lock
+        # is released while rows are being added.
+        with self._lock:
+            return {"comps": self.comps, "pending": self._pending, "xyz": self._xyz, "kinds": self._kinds,
+                    "industries": self._industries, "price": self._price, "closed": self._closed,
+                    "indexed": self._indexed, "trees": self._trees}
+
+    def _tree(self, snap, kind, industry):
+        # (tree, row positions) for one partition of the snapshot's indexed rows
+        import numpy as np
+        from scipy.spatial import cKDTree
+        part = (kind, industry)
+        with self._lock:
+            if part not in snap["trees"]:
+                indexed = snap["indexed"]
+                mask = snap["kinds"][:indexed] == kind
+                if industry:
+                    mask &= snap["industries"][:indexed] == industry
+                positions = np.flatnonzero(mask)
+                snap["trees"][part] = (cKDTree(snap["xyz"][positions]) if len(positions) else None, positions)
+            return snap["trees"][part]
+
+    def locate(self, meta):
+        # (lat, lon) from explicit coordinates, else the centroid of comps in the same city / state
+        if meta.get("lat") is not None and meta.get("lon") is not None:
+            return float(meta["lat"]), float(meta["lon"])
+        key = _key(meta.get("location"))
+        for k in (key, key.rsplit(",", 1)[-1].strip()) if key else ():
+            with self._lock:
+                acc = list(self._locations.get(k) or ())
+            if acc:
+                return acc[0] / acc[2], acc[1] / acc[2]
+        return None
+
+    def nearest(self, lat, lon, k=5, kind="business", industry=None, radius_km=None,
+                min_price=None, max_price=None, closed_after=None):
+        # The k closest comps matching the filters, as a DataFrame with a distance_km column.
+        # Attribute filters are applied to the tree's nearest candidates; the candidate count
+        # grows 4x until k rows pass or the partition is exhausted.
+        import numpy as np
+        import pandas as pd
+        snap = self._snapshot()
+        indexed, kinds, industries = snap["indexed"], snap["kinds"], snap["industries"]
+        industry = _key(industry)
+        point = _xyz([lat], [lon])[0]
+        bound = _km_to_chord(radius_km) if radius_km is not None else np.inf
+
+        def keep(rows):
+            ok = np.ones(len(rows), dtype=bool)
+            if min_price is not None:
+                ok &= snap["price"][rows] >= min_price
+            if max_price is not None:
+                ok &= snap["price"][rows] <= max_price
+            if closed_after is not None:
+                ok &= snap["closed"][rows] >= np.datetime64(pd.Timestamp(closed_after), "ns")
+            return ok
+
+        tree, positions = self._tree(snap, kind, industry)
+        found_rows, found_dist = np.empty(0, dtype=np.int64), np.empty(0)
+        if tree is not None:
+            want = k
+            while True:
+                n = min(want, len(positions))
+                dist, idx = tree.query(point, k=n, distance_upper_bound=bound)
+                dist, idx = np.atleast_1d(dist), np.atleast_1d(idx)
+                hit = idx < len(positions)
+                rows, dist = positions[idx[hit]], dist[hit]
+                ok = keep(rows)
+                if ok.sum() >= k or n == len(positions) or not hit.all():
+                    found_rows, found_dist = rows[ok], dist[ok]
+                    break
+                want *= 4
+        # Rows added since the last rebuild
+        pending = np.arange(indexed, len(kinds))
+        if len(pending):
+            mask = kinds[pending] == kind
+            if industry:
+                mask &= industries[pending] == industry
+            pending = pending[mask]
+            dist = np.linalg.norm(snap["xyz"][pending] - point, axis=1)
+            ok = keep(pending) & (dist <= bound)
+            found_rows = np.concatenate([found_rows, pending[ok]])
+            found_dist = np.concatenate([found_dist, dist[ok]])
+        order = np.argsort(found_dist, kind="stable")[:k]
+        rows = found_rows[order]
+        if not len(snap["pending"]):
+            result = snap["comps"].iloc[rows].copy()
+        else:
+            old, new = rows < indexed, rows >= indexed
+            result = pd.concat([snap["comps"].iloc[rows[old]], snap["pending"].iloc[rows[new] - indexed]])
+            # concat puts the indexed rows first; put every row back at its distance rank
+            result = result.iloc[np.argsort(np.r_[np.flatnonzero(old), np.flatnonzero(new)], kind="stable")]
+        result["distance_km"] = _chord_to_km(found_dist[order])
+        return result
+
+    def multiple_quantiles(self, industry=None, quantiles=QUANTILES):
+        # Revenue / SDE multiple quantiles for an industry (all industries when it has no comps)
+        import numpy as np
+        out = {}
+        for name in ("rev", "sde"):
+            values = self._multiples.get((_key(industry), name))
+            if values is None or not len(values):
+                values = self._multiples.get((ALL, name), np.empty(0))
+            out[f"{name}_count"] = int(len(values))
+            for q in quantiles:
+                # Sorted already: nearest-rank quantile is an index lookup
+                out[f"p{int(q * 100)}_{name}_multiple"] = float(values[min(int(q * len(values)), len(values) - 1)]) if len(values) else None
+        return out
+
+    def market_research(self, meta, k=5, radius_km=None):
+        # Step 8 result in the same shape as brokkie_core.run_market_research, computed from comps
+        q = self.multiple_quantiles(meta.get("industry"))
+        research = {
+            "source": "comps",
+            "Industry_multiples": {
+                "median_rev_multiple": q["p50_rev_multiple"],
+                "median_sde_multiple": q["p50_sde_multiple"],
+                "p25_rev_multiple": q["p25_rev_multiple"], "p75_rev_multiple": q["p75_rev_multiple"],
+                "p25_sde_multiple": q["p25_sde_multiple"], "p75_sde_multiple": q["p75_sde_multiple"],
+                "comps": q["rev_count"],
+            },
+            "FFE_avg": None,
+            "RealEstate_comps": [],
+            "Business_comps": [],
+        }
+        where = self.locate(meta)
+        if where is None:
+            return research
+        research["location"] = {"lat": round(where[0], 5), "lon": round(where[1], 5)}
+        business = self.nearest(*where, k=k, kind="business", industry=meta.get("industry"), radius_km=radius_km)
+        if not len(business):
+            business = self.nearest(*where, k=k, kind="business", radius_km=radius_km)
+        estate = self.nearest(*where, k=k, kind="real_estate", radius_km=radius_km)
+        if business["ffe"].notna().any():
+            research["FFE_avg"] = round(float(business["ffe"].mean()), 2)
+        research["Business_comps"] = [
+            {"industry": _text(r.industry), "location": _text(r.location), "price": float(r.price),
+             "revenue": _number(r.revenue), "sde": _number(r.sde), "distance_km": round(float(r.distance_km), 2)}
+            for r in business.itertuples()]
+        research["RealEstate_comps"] = [
+            {"address": _text(r.address), "value": float(r.price), "distance_km": round(float(r.distance_km), 2)}
+            for r in estate.itertuples()]
+        return research
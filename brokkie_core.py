@@ -0,0 +1,463 @@
+# brokkie_core.py
+# UI-free valuation core: parsing mocks, valuation models, Excel/PDF generation and caches.
+# Safe to import from workers, tests and the batch CLI (no Streamlit calls).
+# pandas, numpy and fpdf are imported inside the functions that need them so that importing
+# this module stays cheap (see brokkie_importtime.py for the startup budget).
+import io
+import numbers
+import os
+from functools import lru_cache
+import base64
+import random
+import hashlib
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from brokkie_metrics import timed
+
+# ---------- Helpers ----------
+_SAFE_TEXT = str.maketrans({"—": "-", "–": "-", "“": '"', "”": '"', "’": "'", "…": "..."})
+
+def safe_text(s):
+    if not s:
+        return ""
+    return s.translate(_SAFE_TEXT).encode("latin1", errors="replace").decode("latin1")
+
+@timed()
+def save_excel(df, filename="parsed_financial_data.xlsx"):
+    import pandas as pd
+    import openpyxl  # noqa: F401  (ExcelWriter engine; loaded on first export only)
+    with io.BytesIO() as buffer:
+        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+            df.to_excel(writer, index=False, sheet_name="Financials")
+        data = buffer.getvalue()
+    return data
+
+# Legacy inline data-URI link (base64 in the page HTML). The UI uses download_artifact instead.
+@timed()
+def download_link(byte_data, filename, label="Download"):
+    if byte_data is None:
+        return f'<span style="color: red;">Error: No data to download</span>'
+    try:
+        b64 = base64.b64encode(byte_data).decode()
+        href = f'<a href="data:application/octet-stream;base64,{b64}" download="{filename}">{label}</a>'
+        return href
+    except Exception as e:
+        return f'<span style="color: red;">Error generating download link: {str(e)}</span>'
+
+class ArtifactStore:
+    # Content-addressed store for generated files (PDF/XLSX). Blobs are kept once per SHA-256,
+    # stay in memory below spool_bytes and roll over to a temp file above it. Files that are
+    # already on disk can be registered by path with put_file. get() raises KeyError for an
+    # evicted digest.
+    def __init__(self, spool_bytes=4 * 1024 * 1024, max_items=512):
+        self.spool_bytes = spool_bytes
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._owned = set()
+        self._paths = {}  # path given to put_file -> ((size, mtime_ns), digest)
+        self._lock = threading.Lock()
+
+    def put(self, byte_data):
+        digest = hashlib.sha256(byte_data).hexdigest()
+        with self._lock:
+            if digest in self._items:
+                self._items.move_to_end(digest)
+                return digest
+            if len(byte_data) > self.spool_bytes:
+                blob = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+                blob.write(byte_data)
+            else:
+                blob = bytes(byte_data)
+            self._items[digest] = blob
+            self._evict()
+        return digest
+
+    def _evict(self):
+        while len(self._items) > self.max_items:
+            digest, old = self._items.popitem(last=False)
+            for path in [p for p, (_, d) in self._paths.items() if d == digest]:
+                del self._paths[path]
+            if isinstance(old, str):
+                if old in self._owned:
+                    self._owned.discard(old)
+                    try:
+                        os.remove(old)
+                    except OSError:
+                        pass
+            elif not isinstance(old, bytes):
+                old.close()
+
+    def put_file(self, path, owned=False):
+        # Register an artifact already written to disk (e.g. a streamed report); it is read only when
+        # served. Owned files are deleted on eviction, or right away if the content is already stored.
+        # A path registered before is not hashed again while its size and mtime are unchanged (or
+        # it was an owned duplicate, already deleted); raises FileNotFoundError once it has expired.
+        path = os.fspath(path)
+        try:
+            info = os.stat(path)
+            signature = (info.st_size, info.st_mtime_ns)
+        except FileNotFoundError:
+            signature = None
+        with self._lock:
+            known = self._paths.get(path)
+            if known is not None and known[1] in self._items and signature in (None, known[0]):
+                self._items.move_to_end(known[1])
+                return known[1]
+        if signature is None:
+            raise FileNotFoundError(path)
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with self._lock:
+            self._paths[path] = (signature, digest)
+            if digest in self._items:
+                self._items.move_to_end(digest)
+                if owned and self._items[digest] != path:
+                    os.remove(path)
+                return digest
+            self._items[digest] = path
+            if owned:
+                self._owned.add(path)
+            self._evict()
+        return digest
+
+    def get(self, digest):
+        with self._lock:
+            blob = self._items[digest]
+            self._items.move_to_end(digest)
+            if isinstance(blob, bytes):
+                return blob
+            if isinstance(blob, str):
+                with open(blob, "rb") as f:
+                    return f.read()
+            blob.seek(0)
+            return blob.read()
+
+    def __contains__(self, digest):
+        return digest in self._items
+
+    def stats(self):
+        # Only blobs up to spool_bytes are held in memory; larger ones are spooled straight to disk
+        with self._lock:
+            memory = sum(len(b) for b in self._items.values() if isinstance(b, bytes))
+            return {"items": len(self._items), "memory_bytes": memory, "files": len(self._owned)}
+
+def private_dir(path):
+    # Create path as a directory only this user can use (0700) and refuse one owned by someone
+    # else or open to other users: pickles are only ever loaded from such a directory.
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid"):
+        info = os.stat(path)
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"{path} is owned by another user; refusing to use it as a cache")
+        if info.st_mode & 0o077:
+            os.chmod(path, 0o700)
+    return path
+
+def _trusted_file(f):
+    # An open cache file is loaded only if it belongs to this user and nobody else can write it
+    if not hasattr(os, "getuid"):
+        return True
+    info = os.fstat(f.fileno())
+    return info.st_uid == os.getuid() and not info.st_mode & 0o022
+
+class ParseCache:
+    # Two-tier cache for parsed uploads keyed by content hash: an LRU dict in memory and pickles
+    # on disk under a byte budget (oldest-used files are deleted first). A cached value can own
+    # companion files (companion_path); they count toward the budget and are evicted with it.
+    # The directory is private to this user (see private_dir). Cached values are shared between
+    # sessions, so treat them as read-only.
+    def __init__(self, cache_dir, max_memory_items=64, max_disk_bytes=512 * 1024 * 1024):
+        self.cache_dir = private_dir(cache_dir)
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def companion_path(self, key, suffix):
+        # Where a value stored under key keeps its own data (e.g. a Parquet spill)
+        return os.path.join(self.cache_dir, f"{key}{suffix}")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                if not _trusted_file(f):
+                    raise PermissionError(f"untrusted cache file {path}")
+                value = pickle.load(f)
+            os.utime(path)  # mark as recently used for disk eviction
+        except (OSError, pickle.UnpicklingError, EOFError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._enforce_disk_budget()
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "memory_items": len(self._memory)}
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _enforce_disk_budget(self):
+        # Budget over every file of a key (its pickle and companions); keys used longest ago go first
+        groups = {}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".tmp"):
+                continue  # being written
+            try:
+                info = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            group = groups.setdefault(name.split(".", 1)[0], [0.0, 0, []])
+            group[0] = max(group[0], info.st_mtime)
+            group[1] += info.st_size
+            group[2].append(name)
+        total = sum(size for _, size, _ in groups.values())
+        for key, (_, size, names) in sorted(groups.items(), key=lambda item: item[1][0]):
+            if total <= self.max_disk_bytes:
+                break
+            with self._lock:
+                self._memory.pop(key, None)  # its companions are going away with it
+            for name in names:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+            total -= size
+
+def default_cache_dir():
+    # Per-user cache ($XDG_CACHE_HOME or ~/.cache), never the shared system temp dir
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.environ.get("BROKKIE_CACHE_DIR", os.path.join(base, "brokkie", "parse_cache"))
+
+def file_digest(uploaded_file):
+    return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+
+def uploads_digest(uploaded_files):
+    # Order-independent key for a set of uploads, built from each file's SHA-256
+    digests = sorted(file_digest(f) for f in uploaded_files)
+    return hashlib.sha256("".join(digests).encode()).hexdigest()
+
+@timed()
+def generate_questions(parsed_preview):
+    # Mocked smart Q&A generator
+    q = [
+        "Provide explanation for revenue seasonality (if any).",
+        "List one-time expenses in the last 12 months.",
+        "Explain related-party transactions (if any).",
+        "Confirm recurring monthly revenue streams and churn rates.",
+        "List major customer concentrations (>10% of revenue).",
+        "Provide typical gross margin by service/product line."
+    ]
+    return q
+
+def compute_valuation_models(financials_dict, cma_multiple=None, sde_multiple=None):
+    revenue = financials_dict.get("TTM Revenue", 0)
+    net_income = financials_dict.get("Net Income", 0)
+    sde = financials_dict.get("SDE (est)", 0)
+    BE = revenue * 0.8
+    APEEV = max((sde * (4 if sde_multiple is None else sde_multiple)) + financials_dict.get("Assets", 0), BE * 0.6)
+    IVB = net_income * 6
+    CMA = revenue * (cma_multiple if cma_multiple is not None else random.uniform(0.6, 1.2))
+    return {"BE": BE, "APEEV": APEEV, "IVB": IVB, "CMA": CMA}
+
+@timed()
+def compute_valuation_models_batch(deals_df, seed=None):
+    # Vectorized compute_valuation_models: one row per deal, same column names as financials_dict.
+    # Missing columns count as 0. An optional "CMA Multiple" column pins the CMA draw per deal
+    # (NaN rows fall back to a uniform(0.6, 1.2) draw from a numpy Generator seeded with `seed`),
+    # and an optional "SDE Multiple" column replaces APEEV's default multiple of 4.
+    import numpy as np
+    import pandas as pd
+    n = len(deals_df)
+    def col(name):
+        if name in deals_df.columns:
+            return pd.to_numeric(deals_df[name], errors="coerce").fillna(0).to_numpy(dtype="float64")
+        return np.zeros(n)
+    revenue = col("TTM Revenue")
+    net_income = col("Net Income")
+    sde = col("SDE (est)")
+    BE = revenue * 0.8
+    sde_multiple = np.full(n, 4.0)
+    if "SDE Multiple" in deals_df.columns:
+        pinned = pd.to_numeric(deals_df["SDE Multiple"], errors="coerce").to_numpy(dtype="float64")
+        sde_multiple = np.where(np.isnan(pinned), sde_multiple, pinned)
+    APEEV = np.maximum((sde * sde_multiple) + col("Assets"), BE * 0.6)
+    IVB = net_income * 6
+    multiple = np.random.default_rng(seed).uniform(0.6, 1.2, n)
+    if "CMA Multiple" in deals_df.columns:
+        pinned = pd.to_numeric(deals_df["CMA Multiple"], errors="coerce").to_numpy(dtype="float64")
+        multiple = np.where(np.isnan(pinned), multiple, pinned)
+    CMA = revenue * multiple
+    return pd.DataFrame({"BE": BE, "APEEV": APEEV, "IVB": IVB, "CMA": CMA}, index=deals_df.index)
+
+# DealReady owner estimate (also served by brokkie_api)
+EXIT_PREP_SUGGESTIONS = [
+    "Improve recurring revenue share",
+    "Formalize contracts & processes",
+    "Clean up one-time expenses and records",
+    "Prepare professional marketing materials",
+]
+
+def quick_estimate(revenue, profit, assets):
+    return int(revenue * 0.8 + profit * 3 + assets * 0.5)
+
+def quick_estimate_batch(revenues, profits, assets):
+    # Vectorized quick_estimate over equal-length sequences. Returns an int64 array, or an object
+    # array of Python ints (what quick_estimate returns) when a value does not fit in int64
+    import numpy as np
+    revenues, profits, assets = (np.asarray(a, dtype="float64") for a in (revenues, profits, assets))
+    values = revenues * 0.8 + profits * 3 + assets * 0.5
+    if (np.abs(values) < 2.0 ** 63).all():
+        return values.astype("int64")
+    return np.array([int(v) for v in values], dtype=object)
+
+def owner_report_context(name, revenue, profit, assets, estimate=None):
+    return {
+        "business_name": name,
+        "primary_data": {"TTM Revenue": revenue, "Net Income": profit, "Assets": assets},
+        "valuations": {"QuickEstimate": quick_estimate(revenue, profit, assets) if estimate is None else estimate},
+        "notes": "Owner-facing simplified valuation and exit prep checklist."
+    }
+
+_SIM_ARGS = {"Revenue multiple": "rev_mult", "SDE multiple": "sde_mult", "Add-back rate": "addback"}
+
+@timed()
+def simulate_cma(financials_dict, seed, n_samples=100_000, rev_weight=0.5):
+    # Seeded Monte Carlo for the CMA model. Revenue multiple, SDE multiple and the
+    # add-back rate are drawn as numpy arrays; the value blends the revenue and SDE approaches.
+    # Cached per (financials, seed) so Step 12 reruns show the same bands.
+    # numbers.Real also covers numpy scalars (e.g. a figure taken from a DataFrame .sum())
+    key = tuple(sorted((k, float(v)) for k, v in financials_dict.items() if isinstance(v, numbers.Real)))
+    result = _simulate_cma(key, seed, n_samples, rev_weight)
+    return dict(result, sensitivities=[dict(r) for r in result["sensitivities"]])
+
+@lru_cache(maxsize=256)
+def _simulate_cma(financials_items, seed, n_samples, rev_weight):
+    import numpy as np
+    financials_dict = dict(financials_items)
+    rng = np.random.default_rng(seed)
+    revenue = float(financials_dict.get("TTM Revenue", 0))
+    net_income = float(financials_dict.get("Net Income", 0))
+    expenses = financials_dict.get("Operating Expenses")
+    drivers = {
+        "Revenue multiple": rng.uniform(0.6, 1.2, n_samples),
+        "SDE multiple": rng.triangular(2.5, 3.5, 4.5, n_samples),
+        "Add-back rate": rng.uniform(0.15, 0.35, n_samples),
+    }
+
+    def value(rev_mult, sde_mult, addback):
+        if expenses is None:
+            sde = float(financials_dict.get("SDE (est)", 0))  # no expense line to add back from
+        else:
+            sde = net_income + float(expenses) * addback
+        return rev_weight * revenue * rev_mult + (1 - rev_weight) * sde * sde_mult
+
+    samples = value(*drivers.values())
+    p10, p50, p90 = np.percentile(samples, [10, 50, 90])
+
+    # Tornado: swing each driver between its own P10 and P90 with the others held at P50
+    medians = {k: float(np.median(v)) for k, v in drivers.items()}
+    sensitivities = []
+    for name, draws in drivers.items():
+        lo, hi = np.percentile(draws, [10, 90])
+        low = value(**{_SIM_ARGS[k]: (lo if k == name else m) for k, m in medians.items()})
+        high = value(**{_SIM_ARGS[k]: (hi if k == name else m) for k, m in medians.items()})
+        sensitivities.append({"Driver": name, "Low": float(low), "High": float(high), "Swing": float(abs(high - low))})
+    sensitivities.sort(key=lambda r: r["Swing"], reverse=True)
+    return {"seed": seed, "n_samples": n_samples, "P10": float(p10), "P50": float(p50), "P90": float(p90),
+            "mean": float(samples.mean()), "sensitivities": sensitivities}
+
+@timed()
+def run_market_research(business_meta=None, comps=None):
+    # Step 8: nearest comparables and industry multiples from a brokkie_comps.CompsIndex when one
+    # is loaded, otherwise mocked FFE / real estate / industry research
+    if comps is not None:
+        return comps.market_research(business_meta or {})
+    return {
+        "FFE_avg": 18000,
+        "RealEstate_comps": [{"address":"123 Main", "value": 360000}, {"address":"456 Oak", "value": 340000}],
+        "Industry_multiples": {"median_rev_multiple": 0.9, "median_sde_multiple": 3.5}
+    }
+
+def seeded_cma_multiple(seed):
+    # Fallback CMA multiple when there is no revenue to simulate against
+    return random.Random(seed).uniform(0.6, 1.2)
+
+def simulated_cma_multiple(financials_dict, seed):
+    # Revenue multiple that puts the CMA point value on the simulation's P50 (the figure Step 12
+    # shows next to the P10 / P90 band)
+    revenue = float(financials_dict.get("TTM Revenue", 0) or 0)
+    if revenue <= 0:
+        return seeded_cma_multiple(seed)
+    return simulate_cma(financials_dict, seed)["P50"] / revenue
+
+def valuation_multiples(research, seed, financials_dict=None):
+    # (CMA revenue multiple, APEEV SDE multiple). Comps-backed research supplies the industry
+    # medians; otherwise CMA follows the seeded simulation's P50 and APEEV keeps its default multiple.
+    multiples = (research or {}).get("Industry_multiples") or {}
+    if (research or {}).get("source") == "comps" and multiples.get("median_rev_multiple"):
+        return multiples["median_rev_multiple"], multiples.get("median_sde_multiple")
+    return simulated_cma_multiple(financials_dict or {}, seed), None
+
+def format_usd(x):
+    try:
+        return f"${int(x):,}"
+    except:
+        return f"${x}"
+
+# PDF layouts live in brokkie_reports (compiled templates + render cache)
+@timed()
+def generate_final_pdf(context, filename="Final_Valuation_Report.pdf"):
+    from brokkie_reports import render_report
+    return render_report("final", context)
+
+@timed()
+def generate_cim_pdf(context, filename="CIM_Teaser.pdf"):
+    from brokkie_reports import render_report
+    return render_report("cim", context)
+
+@timed()
+def generate_questions_pdf(questions):
+    from brokkie_reports import render_report
+    return render_report("questions", {"questions": list(questions)})
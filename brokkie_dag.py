@@ -0,0 +1,192 @@
+# brokkie_dag.py
+# Incremental recomputation for the 12-step workflow. Each artifact is a node in a dependency
+# graph (uploads -> parsed_df -> primary_data -> primary_with_assets -> model_valuations, with
+# the Excel export, seller questions and their PDF hanging off the way). Every value is
+# fingerprinted; a derived node is recomputed only when the fingerprints of its inputs differ
+# from the ones it was last computed from. Recomputes that produce an identical value stop there
+# (downstream nodes see an unchanged fingerprint).
+#
+# State lives in a dict-like (a brokkie_session.SessionView over st.session_state in the app): node
+# values under their own keys, fingerprints under META_KEY. Values must be replaced through set(),
+# which re-fingerprints them. Each recompute is timed as the metrics stage "dag.<node>".
+import hashlib
+import json
+import pickle
+
+from brokkie_metrics import stage
+
+META_KEY = "_recompute"
+
+def fingerprint(value):
+    h = hashlib.sha256()
+    if isinstance(value, (bytes, bytearray)):
+        h.update(b"bytes:")
+        h.update(value)
+        return h.hexdigest()
+    if hasattr(value, "columns") and hasattr(value, "dtypes"):
+        try:
+            import pandas as pd
+            h.update(b"frame:")
+            h.update(repr((list(value.columns), [str(t) for t in value.dtypes])).encode())
+            h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+            return h.hexdigest()
+        except TypeError:
+            pass  # unhashable cells; fall through to pickle
+    try:
+        # Key order counts (dict order drives report line order)
+        h.update(b"json:" + json.dumps(value).encode())
+    except (TypeError, ValueError):
+        h.update(b"pickle:" + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    return h.hexdigest()
+
+class RecomputeGraph:
+    def __init__(self):
+        self.nodes = {}  # name -> (input names, compute or None)
+
+    def node(self, name, inputs, compute=None):
+        # compute(*input values) -> value. compute=None marks a node the caller produces itself
+        # (e.g. parsing needs the uploaded files); it is still tracked for staleness.
+        for i in inputs:
+            if i == name or name in self.upstream(i):
+                raise ValueError(f"{name} -> {i} would create a cycle")
+        self.nodes[name] = (tuple(inputs), compute)
+
+    def upstream(self, name):
+        seen, todo = set(), list(self.nodes.get(name, ((), None))[0])
+        while todo:
+            n = todo.pop()
+            if n not in seen:
+                seen.add(n)
+                todo.extend(self.nodes.get(n, ((), None))[0])
+        return seen
+
+    def downstream(self, name):
+        # Every node that (transitively) depends on name, in dependency order
+        out = []
+        for n in self.order():
+            if any(i == name or i in out for i in self.nodes[n][0]):
+                out.append(n)
+        return out
+
+    def order(self):
+        order, done = [], set()
+
+        def visit(n):
+            if n in done or n not in self.nodes:
+                return
+            for i in self.nodes[n][0]:
+                visit(i)
+            done.add(n)
+            order.append(n)
+        for n in self.nodes:
+            visit(n)
+        return order
+
+    @staticmethod
+    def _meta(state):
+        if META_KEY not in state:
+            state[META_KEY] = {}
+        return state[META_KEY]
+
+    def _input_fps(self, state, name, on_compute):
+        return tuple(self._fingerprint(state, i, on_compute) for i in self.nodes[name][0])
+
+    def _fingerprint(self, state, name, on_compute=None):
+        # Fingerprint of name's current value, bringing derived nodes up to date first
+        meta = self._meta(state)
+        if name in self.nodes:
+            inputs, compute = self.nodes[name]
+            input_fps = self._input_fps(state, name, on_compute)
+            fp, deps = meta.get(name, (None, None))
+            if compute is not None and (deps != input_fps or name not in state):
+                with stage(f"dag.{name}"):
+                    value = compute(*(state.get(i) for i in inputs))
+                state[name] = value
+                fp = fingerprint(value)
+                meta[name] = (fp, input_fps)
+                if on_compute is not None:
+                    on_compute(name, value)
+            elif fp is None:
+                # Caller-produced node seen for the first time (e.g. restored from the deal store):
+                # take its value as matching the current inputs
+                fp = fingerprint(state.get(name))
+                meta[name] = (fp, input_fps)
+            return fp
+        if name not in meta:
+            meta[name] = (fingerprint(state.get(name)), None)
+        return meta[name][0]
+
+    def set(self, state, name, value):
+        # Store a new value (a source, or an override of a derived node, which then counts as
+        # computed from the current inputs). Returns True if the fingerprint changed.
+        meta = self._meta(state)
+        fp = fingerprint(value)
+        old = meta.get(name, (None, None))[0]
+        state[name] = value
+        deps = self._input_fps(state, name, None) if name in self.nodes else None
+        meta[name] = (fp, deps)
+        return fp != old
+
+    def update(self, state, name, on_compute=None):
+        # Bring name up to date without reading its value back; returns its fingerprint
+        return self._fingerprint(state, name, on_compute)
+
+    def get(self, state, name, on_compute=None):
+        # Current value of name, recomputing only stale nodes on its path.
+        # on_compute(name, value) is called for every node actually recomputed.
+        self.update(state, name, on_compute)
+        return state.get(name)
+
+    def is_stale(self, state, name):
+        if name not in self.nodes:
+            return False
+        meta = self._meta(state)
+        inputs = self.nodes[name][0]
+        if any(self.is_stale(state, i) for i in inputs):
+            return True
+        current = tuple(meta[i][0] if i in meta else fingerprint(state.get(i)) for i in inputs)
+        return meta.get(name, (None, None))[1] != current
+
+    def stale(self, state):
+        return [n for n in self.order() if self.is_stale(state, n)]
+
+# ---------- workflow graph ----------
+def _primary_data(parsed_df):
+    if parsed_df is None:
+        return {}
+    return {r.Metric: int(r.Value) for r in parsed_df.itertuples()}
+
+def _parsed_xlsx(parsed_df):
+    from brokkie_core import save_excel
+    return save_excel(parsed_df) if parsed_df is not None else None
+
+def _questions(parsed_df):
+    from brokkie_core import generate_questions
+    return generate_questions(parsed_df) if parsed_df is not None else []
+
+def _questions_pdf(questions):
+    from brokkie_core import generate_questions_pdf
+    return generate_questions_pdf(questions)
+
+def _primary_with_assets(primary_data, assets):
+    merged = dict(primary_data or {})
+    merged.update((assets or {}).get("confirmed", {}))
+    return merged
+
+def _model_valuations(primary_with_assets, market_research, cma_seed):
+    from brokkie_core import compute_valuation_models, valuation_multiples
+    cma_multiple, sde_multiple = valuation_multiples(market_research, cma_seed, primary_with_assets)
+    return compute_valuation_models(primary_with_assets, cma_multiple=cma_multiple, sde_multiple=sde_multiple)
+
+def workflow_graph():
+    # Sources (set by the steps): uploads (digest of the Step 1 files), parsed_df overrides from
+    # Steps 2 / 5, assets (Steps 6-7), market_research (Step 8), cma_seed (Step 12)
+    graph = RecomputeGraph()
+    graph.node("parsed_df", ["uploads"])  # parsed in Step 1 (needs the files, not just their digest)
+    graph.node("parsed_xlsx", ["parsed_df"], _parsed_xlsx)
+    graph.node("questions", ["parsed_df"], _questions)
+    graph.node("questions_pdf", ["questions"], _questions_pdf)
+    graph.node("primary_data", ["parsed_df"], _primary_data)
+    graph.node("primary_with_assets", ["primary_data", "assets"], _primary_with_assets)
+    graph.node("model_valuations", ["primary_with_assets", "market_research", "cma_seed"], _model_valuations)
+    return graph
@@ -0,0 +1,119 @@
+# brokkie_dashboard.py
+# Server-side data layer for the BrokerIQ dashboard. Filtering, group-bys and time buckets run as
+# SQL aggregates in the deal store; results are cached until the store version changes, and
+# chart series are downsampled (LTTB) to a fixed point budget before they reach the browser.
+import threading
+from collections import OrderedDict
+
+GROUP_COLUMNS = ("status", "industry", "broker")
+TIME_BUCKETS = {
+    "day": "%Y-%m-%d",
+    "week": "%Y-W%W",
+    "month": "%Y-%m",
+}
+TIME_FIELDS = ("created_at", "updated_at")
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets downsampling. Returns indices of the kept points (always
+    # including the first and last), so several y series can share one selection.
+    import numpy as np
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_end = max(next_end, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+class DashboardData:
+    def __init__(self, store, cache_size=128):
+        self.store = store
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key, compute):
+        # Entries are keyed by the store version, so any deal write invalidates them
+        key = (self.store.version(),) + key
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = value
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def _where(self, filters):
+        clauses, params = self.store.filter_clause(**filters)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    @staticmethod
+    def _filter_key(filters):
+        return tuple(sorted((k, tuple(v) if isinstance(v, (list, set)) else v) for k, v in filters.items()))
+
+    def summary(self, **filters):
+        def compute():
+            where, params = self._where(filters)
+            count, total, avg, buyers = self.store.query(
+                "SELECT COUNT(*), COALESCE(SUM(valuation), 0), AVG(valuation), COALESCE(SUM(matched_buyers), 0) "
+                "FROM deals" + where, params)[0]
+            return {"deals": count, "total_valuation": total, "avg_valuation": avg or 0, "matched_buyers": buyers}
+        return self._cached(("summary", self._filter_key(filters)), compute)
+
+    def group_by(self, column, **filters):
+        if column not in GROUP_COLUMNS:
+            raise ValueError(f"column must be one of {GROUP_COLUMNS}")
+
+        def compute():
+            import pandas as pd
+            where, params = self._where(filters)
+            rows = self.store.query(
+                f"SELECT COALESCE({column}, 'Unassigned'), COUNT(*), COALESCE(SUM(valuation), 0), AVG(valuation), "
+                f"COALESCE(SUM(matched_buyers), 0) FROM deals{where} GROUP BY 1 ORDER BY 3 DESC", params)
+            return pd.DataFrame(rows, columns=[column.title(), "Deals", "Total Valuation", "Avg Valuation", "Matched Buyers"])
+        return self._cached(("group", column, self._filter_key(filters)), compute)
+
+    def time_series(self, bucket="week", field="created_at", max_points=500, **filters):
+        # Deals and valuation per time bucket, downsampled to at most max_points rows
+        if bucket not in TIME_BUCKETS or field not in TIME_FIELDS:
+            raise ValueError(f"bucket must be one of {tuple(TIME_BUCKETS)}, field one of {TIME_FIELDS}")
+
+        def compute():
+            import pandas as pd
+            where, params = self._where(filters)
+            rows = self.store.query(
+                f"SELECT strftime('{TIME_BUCKETS[bucket]}', {field}) AS bucket, COUNT(*), COALESCE(SUM(valuation), 0) "
+                f"FROM deals{where} GROUP BY bucket ORDER BY bucket", params)
+            frame = pd.DataFrame(rows, columns=["Bucket", "Deals", "Deal Value"]).set_index("Bucket")
+            if len(frame) > max_points:
+                keep = lttb(range(len(frame)), frame["Deal Value"].to_numpy(), max_points)
+                frame = frame.iloc[keep]
+            return frame
+        return self._cached(("series", bucket, field, max_points, self._filter_key(filters)), compute)
+
+    def page(self, limit=50, after=None, **filters):
+        return self._cached(("page", limit, after, self._filter_key(filters)),
+                            lambda: self.store.list_deals(limit=limit, after=after, **filters))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache)}
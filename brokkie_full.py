@@ -1,173 +1,336 @@
 # brokkie_full.py
 import streamlit as st
-import pandas as pd
-import io
 import os
-from fpdf import FPDF
-from datetime import datetime
-import base64
 import random
+import statistics
+import hmac
+import mimetypes
+import tempfile
+import time
+import uuid
+from brokkie_core import (
+    save_excel, format_usd, simulate_cma, generate_final_pdf,
+    quick_estimate, owner_report_context, EXIT_PREP_SUGGESTIONS,
+    ArtifactStore, ParseCache, default_cache_dir, file_digest, uploads_digest,
+)
+from brokkie_metrics import METRICS, RerunProfiler, current_session, stage, timed
+from brokkie_session import ArtifactRef, SessionArtifacts, SessionView
 
 st.set_page_config(page_title="Brokkie - Full 12-step Valuation Prototype", layout="wide")
 
-# ---------- Helpers ----------
-def safe_text(s):
-    if not s:
-        return ""
-    return (s.replace("—", "-")
-             .replace("–", "-")
-             .replace("“", '"')
-             .replace("”", '"')
-             .replace("’", "'")
-             .replace("…", "...")
-             .encode("latin1", errors="replace").decode("latin1"))
-
-def save_excel(df, filename="parsed_financial_data.xlsx"):
-    with io.BytesIO() as buffer:
-        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="Financials")
-        data = buffer.getvalue()
+# Whole-rerun timing; cProfile / tracemalloc only when switched on in the admin panel
+rerun_started = time.perf_counter()
+profiler = None
+if st.session_state.get("profile_cpu") or st.session_state.get("profile_memory"):
+    profiler = RerunProfiler(cpu=st.session_state.get("profile_cpu", False),
+                             memory=st.session_state.get("profile_memory", False)).start()
+
+# ---------- Streamlit helpers ----------
+@st.cache_resource
+def get_artifact_store():
+    # One store per server process, shared by all sessions
+    return ArtifactStore()
+
+EXPIRED_DOWNLOAD = "This download has expired; generate it again."
+
+def deferred_download(load):
+    # Download data read only when clicked; by then the artifact may have been evicted or released
+    def data():
+        try:
+            return load()
+        except (KeyError, OSError):
+            raise LookupError(EXPIRED_DOWNLOAD) from None
     return data
 
-def download_link(byte_data, filename, label="Download"):
+@timed("ui.download_artifact")
+def download_artifact(byte_data, filename, label="Download"):
+    # Native download button; bytes are served from the artifact store only when clicked,
+    # so nothing is inlined into the page HTML. A session ArtifactRef is served straight from the
+    # session artifacts without being loaded for the rerun.
     if byte_data is None:
-        return f'<span style="color: red;">Error: No data to download</span>'
+        st.error("Error: No data to download")
+        return
+    mime = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if isinstance(byte_data, ArtifactRef):
+        artifacts = get_session_artifacts()
+        # Streamlit needs its own bytes; read them off the spill file rather than reloading the value
+        st.download_button(label, data=deferred_download(lambda: bytes(artifacts.view(byte_data))), file_name=filename,
+                           mime=mime, key=f"dl_{byte_data.digest[:16]}_{filename}", on_click="ignore")
+        return
+    store = get_artifact_store()
+    digest = store.put(byte_data)
+    st.download_button(label, data=deferred_download(lambda: store.get(digest)), file_name=filename, mime=mime,
+                       key=f"dl_{digest[:16]}_{filename}", on_click="ignore")
+
+def download_artifact_file(path, filename, label="Download"):
+    # Same as download_artifact for a file already on disk (the store takes ownership of it);
+    # it is not loaded until clicked. Called on every job-panel refresh: the file is hashed once.
+    store = get_artifact_store()
     try:
-        b64 = base64.b64encode(byte_data).decode()
-        href = f'<a href="data:application/octet-stream;base64,{b64}" download="{filename}">{label}</a>'
-        return href
-    except Exception as e:
-        return f'<span style="color: red;">Error generating download link: {str(e)}</span>'
-
-def generate_parsed_financials(uploaded_files):
-    # Create a mocked parsed_financial_data.xlsx based on uploaded files
-    revenue = random.randint(200000, 3000000)
-    cogs = int(revenue * random.uniform(0.2, 0.6))
-    expenses = int(revenue * random.uniform(0.1, 0.3))
-    net_income = revenue - cogs - expenses
-    sde = net_income + int(expenses * 0.25)  # simplified add-backs
-    df = pd.DataFrame([{
-        "Metric": "TTM Revenue",
-        "Value": revenue
-    }, {
-        "Metric": "COGS",
-        "Value": cogs
-    }, {
-        "Metric": "Operating Expenses",
-        "Value": expenses
-    }, {
-        "Metric": "Net Income",
-        "Value": net_income
-    }, {
-        "Metric": "SDE (est)",
-        "Value": sde
-    }])
-    return df
-
-def generate_questions(parsed_preview):
-    # Mocked smart Q&A generator
-    q = [
-        "Provide explanation for revenue seasonality (if any).",
-        "List one-time expenses in the last 12 months.",
-        "Explain related-party transactions (if any).",
-        "Confirm recurring monthly revenue streams and churn rates.",
-        "List major customer concentrations (>10% of revenue).",
-        "Provide typical gross margin by service/product line."
-    ]
-    return q
-
-def compute_valuation_models(financials_dict):
-    revenue = financials_dict.get("TTM Revenue", 0)
-    net_income = financials_dict.get("Net Income", 0)
-    sde = financials_dict.get("SDE (est)", 0)
-    BE = revenue * 0.8
-    APEEV = max((sde * 4) + financials_dict.get("Assets", 0), BE * 0.6)
-    IVB = net_income * 6
-    CMA = revenue * random.uniform(0.6, 1.2)
-    return {"BE": BE, "APEEV": APEEV, "IVB": IVB, "CMA": CMA}
-
-def format_usd(x):
+        digest = store.put_file(path, owned=True)
+    except FileNotFoundError:
+        st.caption(f"{filename}: {EXPIRED_DOWNLOAD}")
+        return
+    mime = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    st.download_button(label, data=deferred_download(lambda: store.get(digest)), file_name=filename, mime=mime,
+                       key=f"dl_{digest[:16]}_{filename}", on_click="ignore")
+
+@st.cache_resource
+def get_parse_cache():
+    return ParseCache(default_cache_dir())
+
+@st.cache_resource
+def get_deal_store():
+    from brokkie_store import DealStore
+    return DealStore()
+
+@st.cache_resource
+def get_dashboard_data():
+    from brokkie_dashboard import DashboardData
+    return DashboardData(get_deal_store())
+
+@st.cache_resource(max_entries=1)
+def get_buyer_matcher(buyers_version):
+    # Rebuilt only when the buyer registry changes (the version is part of the cache key)
+    from brokkie_matching import BuyerMatcher
+    buyers = get_deal_store().load_buyers()
+    return BuyerMatcher(buyers) if len(buyers) else None
+
+def get_comps_index():
+    # Local comparables database (BROKKIE_COMPS_PATH), shared with background jobs; None when absent
+    from brokkie_comps import default_index
+    return default_index()
+
+@st.cache_resource
+def get_session_artifacts():
+    # Large step outputs of every session, under BROKKIE_SESSION_MEMORY_MB / BROKKIE_MEMORY_BUDGET_MB
+    return SessionArtifacts()
+
+def session_artifacts():
+    # This session's state with large values held by reference (what the graph reads and writes)
+    return SessionView(st.session_state, get_session_artifacts(), st.session_state.user_id)
+
+@st.cache_resource
+def get_workflow_graph():
+    from brokkie_dag import workflow_graph
+    return workflow_graph()
+
+def ensure_deal():
+    # The deal row is created from business_meta on the first write
+    if not st.session_state.get("deal_saved"):
+        store = get_deal_store()
+        meta = st.session_state.business_meta
+        store.create_deal(st.session_state.deal_id, name=meta.get("name"), industry=meta.get("industry"),
+                          location=meta.get("location"))
+        st.session_state.deal_saved = True
+        store.save_artifact(st.session_state.deal_id, "business_meta", dict(meta))
+        store.save_artifact(st.session_state.deal_id, "cma_seed", st.session_state.cma_seed)
+
+def write_through(key, value):
+    # Save a step output to the deal store
+    ensure_deal()
+    get_deal_store().save_artifact(st.session_state.deal_id, key, value)
+
+def persist(key, value):
+    # Set a step output through the recompute graph (artifacts depending on it go stale) and write
+    # it through to the deal store when its fingerprint changed. Returns True if it changed.
+    changed = get_workflow_graph().set(session_artifacts(), key, value)
+    if changed:
+        write_through(key, value)
+    return changed
+
+def computed(key):
+    # A derived artifact, recomputed (and saved) only when one of its inputs changed
+    return get_workflow_graph().get(session_artifacts(), key, on_compute=write_through)
+
+def computed_ref(key):
+    # Same as computed(), but returns the stored ArtifactRef for a large value instead of loading it
+    state = session_artifacts()
+    get_workflow_graph().update(state, key, on_compute=write_through)
+    return state.ref(key)
+
+def show_invalidated(key):
+    stale = [n for n in get_workflow_graph().downstream(key) if get_workflow_graph().is_stale(session_artifacts(), n)]
+    if stale:
+        st.caption("Recomputed on next use: " + ", ".join(stale))
+
+def persist_assets():
+    persist("assets", st.session_state.assets)
+
+# ---------- background jobs ----------
+JOB_LABELS = {"final_pdf": "Final report", "cim_pdf": "CIM / teaser", "market_research": "Market research",
+              "portfolio_report": "Portfolio report"}
+JOB_DOWNLOADS = {"final_pdf": "Final_Valuation_Report.pdf", "cim_pdf": "CIM_Teaser.pdf",
+                 "portfolio_report": "BrokerIQ_Portfolio_Report.pdf"}
+
+@st.cache_resource
+def get_job_runner():
+    # One runner per server process; limits come from BROKKIE_JOB_WORKERS / BROKKIE_JOBS_PER_USER,
+    # retries and retention from BROKKIE_JOB_MAX_ATTEMPTS / BROKKIE_JOB_RETENTION_DAYS
+    from brokkie_jobs import JobRunner
+    return JobRunner(get_deal_store())
+
+def job_owner():
+    # Who the per-user job limit counts against: the signed-in user (st.login), else the identity
+    # header set by an authenticating proxy ($BROKKIE_USER_HEADER, e.g. X-Forwarded-Email; only set
+    # it when the proxy strips that header from clients), else this browser session
     try:
-        return f"${int(x):,}"
-    except:
-        return f"${x}"
-
-def generate_final_pdf(context, filename="Final_Valuation_Report.pdf"):
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 8, safe_text("Final Valuation Report"), ln=True)
-    pdf.set_font("Arial", size=10)
-    pdf.ln(4)
-    pdf.cell(0, 6, safe_text(f"Generated: {datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')}"), ln=True)
-    pdf.ln(6)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 6, safe_text("Business Summary"), ln=True)
-    pdf.set_font("Arial", size=10)
-    
-    pdf.cell(0, 6, safe_text(f"Business Name: {context.get('business_name','N/A')}"), ln=True)
-    pdf.cell(0, 6, safe_text(f"Primary Contact: {context.get('seller_contact','N/A')}"), ln=True)
-    
-    pdf.ln(4)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 6, safe_text("Primary Data"), ln=True)
-    pdf.set_font("Arial", size=10)
-    for k, v in context.get("primary_data", {}).items():
-        pdf.cell(0, 6, safe_text(f"{k}: {format_usd(v)}"), ln=True)
-    pdf.ln(4)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 6, safe_text("Valuation Models Summary"), ln=True)
-    pdf.set_font("Arial", size=10)
-    for k, v in context.get("valuations", {}).items():
-        pdf.cell(0, 6, safe_text(f"{k}: {format_usd(v)}"), ln=True)
-    pdf.ln(6)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 6, safe_text("Recommended Value & Notes"), ln=True)
-    pdf.set_font("Arial", size=10)
-    
-    notes = context.get("notes", "No notes")
-    pdf.multi_cell(0, 6, safe_text(notes))
-    
-    return pdf.output(dest="S")
-
-def generate_cim_pdf(context, filename="CIM_Teaser.pdf"):
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=12)
-
-    # Cover / Teaser page
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, safe_text(f"{context.get('business_name','Company')} - Teaser"), ln=True, align="C")
-    pdf.ln(4)
-    
-    one_liner = context.get("one_liner", "Confidential business opportunity - summary below.")
-    pdf.set_font("Arial", size=10)
-    pdf.multi_cell(180, 6, safe_text(one_liner))  # Fixed width
-    
-    pdf.ln(4)
-    pdf.cell(0, 6, safe_text(f"Location: {context.get('location','N/A')}"), ln=True)
-    pdf.cell(0, 6, safe_text(f"Industry: {context.get('industry','N/A')}"), ln=True)
-    pdf.cell(0, 6, safe_text(f"Est. Revenue (TTM): {format_usd(context.get('primary_data',{}).get('TTM Revenue',0))}"), ln=True)
-
-    # Financial snapshot
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, safe_text("Financial Snapshot"), ln=True)
-    pdf.set_font("Arial", size=10)
-    for k, v in context.get("primary_data", {}).items():
-        pdf.cell(0, 6, safe_text(f"{k}: {format_usd(v)}"), ln=True)
-
-    # Highlights
-    pdf.ln(4)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 6, safe_text("Investment Highlights"), ln=True)
-    pdf.set_font("Arial", size=10)
-    for h in context.get("highlights", ["Recurring revenue", "Strong margins", "Scalable operations"]):
-        pdf.multi_cell(180, 6, safe_text(f"- {h}"))  # Fixed width
-
-    return pdf.output(dest="S")
+        if st.user.is_logged_in:
+            return f"user:{st.user.get('email') or st.user.get('sub')}"
+    except Exception:
+        pass  # authentication not configured
+    header = os.environ.get("BROKKIE_USER_HEADER")
+    value = st.context.headers.get(header) if header else None
+    if value:
+        return f"user:{value.strip().lower()}"
+    return f"session:{st.session_state.user_id}"
+
+def submit_job(kind, params, result_key=None, attach=True):
+    # Queue a job for this user; with attach=True its result is saved to the current deal
+    if attach:
+        ensure_deal()
+    return get_job_runner().submit(kind, job_owner(), params,
+                                   deal_id=st.session_state.deal_id if attach else None, result_key=result_key)
+
+def session_jobs(limit=8):
+    store = get_deal_store()
+    jobs = {j["id"]: j for j in store.list_jobs(deal_id=st.session_state.deal_id, limit=limit)}
+    jobs.update((j["id"], j) for j in store.list_jobs(owner=job_owner(), limit=limit))
+    return sorted(jobs.values(), key=lambda j: j["created_at"], reverse=True)[:limit]
+
+def apply_job_result(job):
+    # A finished job's artifact enters this session once (through the graph, so dependants go stale)
+    applied = st.session_state.setdefault("applied_jobs", set())
+    if job["id"] in applied or not job["result_key"] or job["deal_id"] != st.session_state.deal_id:
+        return
+    applied.add(job["id"])
+    value = get_deal_store().load_artifact(job["deal_id"], job["result_key"])
+    get_workflow_graph().set(session_artifacts(), job["result_key"], value)
+
+def render_jobs(jobs, downloads=True):
+    from brokkie_jobs import ACTIVE
+    offered = set()
+    for job in jobs:
+        label = JOB_LABELS.get(job["kind"], job["kind"])
+        if job["status"] in ACTIVE:
+            st.progress(job["progress"], text=f"{label}: {job['message'] or job['status']}")
+            if st.button("Cancel", key=f"cancel_{job['id']}"):
+                get_job_runner().cancel(job["id"])
+        elif job["status"] == "done":
+            apply_job_result(job)
+            # Newest result per kind only
+            if downloads and job["kind"] in JOB_DOWNLOADS and job["kind"] not in offered:
+                offered.add(job["kind"])
+                result = get_job_runner().result(job["id"])
+                if isinstance(result, (bytes, bytearray)):
+                    download_artifact(result, JOB_DOWNLOADS[job["kind"]], f"Download {label}")
+                elif isinstance(result, str) and os.path.exists(result):
+                    download_artifact_file(result, JOB_DOWNLOADS[job["kind"]], f"Download {label}")
+            else:
+                st.caption(f"{label}: done")
+        elif job["status"] == "failed":
+            st.error(f"{label} failed: {job['error']}")
+        else:
+            st.caption(f"{label}: {job['status']}")
+
+@st.fragment(run_every=1.0)
+def poll_jobs():
+    # Re-runs on its own every second while jobs are active, without rerunning the page
+    from brokkie_jobs import ACTIVE
+    jobs = session_jobs()
+    render_jobs(jobs, downloads=False)
+    if not any(j["status"] in ACTIVE for j in jobs):
+        st.rerun()  # results reach the steps; the next page run stops polling
+
+def jobs_panel():
+    from brokkie_jobs import ACTIVE
+    jobs = session_jobs()
+    if not jobs:
+        return
+    st.markdown("**Background jobs**")
+    if any(j["status"] in ACTIVE for j in jobs):
+        poll_jobs()
+    else:
+        render_jobs(jobs)
+
+# ---------- instrumentation (admin) ----------
+def admin_enabled():
+    # Off unless the server sets BROKKIE_ADMIN to a secret; then ?admin=<secret> opens the panel
+    secret = os.environ.get("BROKKIE_ADMIN")
+    given = st.query_params.get("admin")
+    return bool(secret) and given is not None and hmac.compare_digest(given.encode(), secret.encode())
+
+def admin_panel():
+    import pandas as pd
+    session = st.session_state.user_id
+    with st.expander("Performance (admin)"):
+        summary = METRICS.summary()
+        st.markdown("**Stages** (ms; p50 / p95 over the last 1,000 calls)")
+        if summary:
+            st.dataframe(pd.DataFrame(summary), hide_index=True)
+        sessions = METRICS.sessions
+        if session in sessions:
+            keys = sessions[session]["keys"]
+            st.markdown(f"**This session state**: {sessions[session]['bytes'] / 1e6:,.2f} MB")
+            st.dataframe(pd.DataFrame(sorted(keys.items(), key=lambda kv: -kv[1])[:15], columns=["Key", "Bytes"]),
+                         hide_index=True)
+        st.markdown(f"**All sessions**: {len(sessions)}, {sum(v['bytes'] for v in sessions.values()) / 1e6:,.2f} MB")
+        spill = get_session_artifacts().stats()
+        st.markdown(f"**Session artifacts**: {spill['memory_bytes'] / 1e6:,.2f} of {spill['global_budget'] / 1e6:,.0f} MB "
+                    f"in memory, {spill['spilled_bytes'] / 1e6:,.2f} MB on disk, {spill['entries']} stored once "
+                    f"({spill['deduped']} shared, {spill['reloads']} reloads)")
+        from brokkie_reports import cache_stats
+        downloads, parses, reports = get_artifact_store().stats(), get_parse_cache().stats(), cache_stats()
+        st.markdown(f"**Process caches** (outside the session budget): downloads {downloads['memory_bytes'] / 1e6:,.2f} MB "
+                    f"in memory / {downloads['items']} items, parsed uploads {parses['memory_items']} items, "
+                    f"rendered reports {reports['bytes'] / 1e6:,.2f} MB / {reports['items']} items")
+        st.markdown("**Profile reruns**")
+        st.checkbox("cProfile", key="profile_cpu")
+        st.checkbox("tracemalloc", key="profile_memory")
+        capture = METRICS.profiles.get(session)
+        if capture and "cprofile" in capture:
+            st.code(capture["cprofile"], language=None)
+        if capture and "tracemalloc" in capture:
+            mem = capture["tracemalloc"]
+            st.caption(f"Peak {mem['peak_bytes'] / 1e6:,.2f} MB, still allocated {mem['current_bytes'] / 1e6:,.2f} MB")
+            st.code("\n".join(mem["top"]), language=None)
+        st.download_button("Export metrics (JSON lines)", data=METRICS.export_jsonl, file_name="brokkie_metrics.jsonl",
+                           mime="application/x-ndjson", on_click="ignore")
+        if st.button("Reset metrics"):
+            METRICS.reset()
+
+def ingest_uploads(files, kind="financials"):
+    # Parse uploads in parallel with a live progress bar; per-file results go through the parse cache
+    from brokkie_ingest import ingest_documents
+    bar = st.progress(0.0, text=f"Parsing {len(files)} files...")
+
+    def on_progress(done, total, name):
+        bar.progress(done / total, text=f"Parsed {name} ({done}/{total})")
+
+    parsed, report = ingest_documents([(f.name, f.getvalue()) for f in files], kind=kind,
+                                      progress=on_progress, cache=get_parse_cache())
+    bar.empty()
+    return parsed, report
+
 # ---------- App state init ----------
+if "user_id" not in st.session_state:
+    # Key of this session's artifacts and metrics; background jobs fall back to it (see job_owner)
+    st.session_state.user_id = uuid.uuid4().hex
+current_session.set(st.session_state.user_id)
+if "_metrics_lease" not in st.session_state:
+    st.session_state._metrics_lease = METRICS.lease(st.session_state.user_id)
+if "deal_id" not in st.session_state:
+    # ?deal=<id> reopens a saved deal after a disconnect; otherwise start a new one (saved on first write)
+    deal_id = st.query_params.get("deal")
+    if deal_id and get_deal_store().get_deal(deal_id):
+        state = session_artifacts()
+        for key, value in get_deal_store().load_artifacts(deal_id).items():
+            state[key] = value
+        st.session_state.deal_saved = True
+    else:
+        deal_id = uuid.uuid4().hex
+    st.session_state.deal_id = deal_id
+    st.query_params["deal"] = deal_id
 if "step" not in st.session_state:
     st.session_state.step = 1
 if "uploaded_files" not in st.session_state:
@@ -194,8 +357,15 @@ if "inventory" not in st.session_state:
     st.session_state.inventory = None
 if "real_estate_files" not in st.session_state:
     st.session_state.real_estate_files = []
+if "real_estate_data" not in st.session_state:
+    st.session_state.real_estate_data = None
 if "final_pdf" not in st.session_state:
     st.session_state.final_pdf = None
+if "cma_seed" not in st.session_state:
+    st.session_state.cma_seed = random.randrange(2**32)
+
+with st.sidebar:
+    jobs_panel()
 
 # ---------- Layout ----------
 st.title("Brokkie — 12-Step Valuation Workflow Prototype")
@@ -228,14 +398,30 @@ with col1:
         st.info("Required: Tax Returns, Profit & Loss (TTM/YTD), Monthly DORs. Upload any files to simulate parsing.")
         uploaded = st.file_uploader("Upload supporting documents (multiple)", accept_multiple_files=True)
         if uploaded:
-            st.session_state.uploaded_files = uploaded
+            st.session_state.uploaded_files = [f.name for f in uploaded]  # the files themselves stay with the widget
             st.success(f"{len(uploaded)} files uploaded.")
-            parsed = generate_parsed_financials(uploaded)
-            st.session_state.parsed_df = parsed
-            excel_bytes = save_excel(parsed)
-            st.session_state.parsed_xlsx = excel_bytes
+            parse_cache = get_parse_cache()
+
+            def parse_uploads():
+                parsed, report = ingest_uploads(uploaded)
+                return parsed, save_excel(parsed), report
+
+            digest = uploads_digest(uploaded)
+            parsed, excel_bytes, report = parse_cache.get_or_compute(f"uploads-{digest}", parse_uploads)
+            if persist("uploads", digest):
+                # New set of files: replaces parsed_df (and so every artifact derived from it)
+                persist("parsed_df", parsed)
+                persist("parsed_xlsx", excel_bytes)
+            cache_stats = parse_cache.stats()
+            st.caption(f"Parse cache: {cache_stats['hits']} hits ({cache_stats['disk_hits']} from disk), {cache_stats['misses']} misses")
+            failed = [r for r in report if r["Status"] not in ("parsed", "cached")]
+            if failed:
+                st.warning(f"{len(failed)} of {len(report)} files could not be parsed.")
+            with st.expander("Per-file ingestion report"):
+                import pandas as pd
+                st.dataframe(pd.DataFrame(report))
             if excel_bytes:
-                st.markdown(download_link(excel_bytes, "parsed_financial_data.xlsx", "Download parsed_financial_data.xlsx"), unsafe_allow_html=True)
+                download_artifact(excel_bytes, "parsed_financial_data.xlsx", "Download parsed_financial_data.xlsx")
             st.dataframe(parsed)
 
     # ---------------- STEP 2: Confirm / Correct Primary Data ----------------
@@ -245,13 +431,14 @@ with col1:
             st.warning("No parsed data yet. Please complete Step 1 first (upload documents).")
         else:
             st.write("Preview parsed financials:")
-            df = st.session_state.parsed_df.copy()
-            edited = st.data_editor(df, num_rows="dynamic")
+            df = session_artifacts()["parsed_df"].copy()
+            with stage("ui.data_editor.step2"):
+                edited = st.data_editor(df, num_rows="dynamic")
             if st.button("Save Confirmed Data"):
-                st.session_state.parsed_df = edited
+                persist("parsed_df", edited)
+                show_invalidated("parsed_df")
+                computed("primary_data")
                 st.success("Primary data confirmed and saved.")
-                d = {r.Metric: int(r.Value) for r in edited.itertuples()}
-                st.session_state.primary_data = d
 
     # ---------------- STEP 3: Generate Q&A for Seller ----------------
     elif step == 3:
@@ -260,30 +447,22 @@ with col1:
             st.warning("Please upload parsed financials in Step 1.")
         else:
             st.write("Auto-generating Q&A based on parsed data...")
-            qs = generate_questions(st.session_state.parsed_df)
-            st.session_state.questions = qs
+            qs = computed("questions")
             for i,q in enumerate(qs):
                 st.markdown(f"**Q{i+1}.** {q}")
             if st.button("Export Questions (PDF)"):
-                pdf = FPDF()
-                pdf.add_page()
-                pdf.set_font("Arial", size=10)
-                pdf.cell(0, 6, "Seller Q&A", ln=True)
-                pdf.ln(4)
-                for i,q in enumerate(qs):
-                    pdf.multi_cell(180, 6, f"Q{i+1}. {q}")
-                    pdf.ln(2)
-                pdf_bytes = pdf.output(dest="S")
-                st.markdown(download_link(pdf_bytes, "general_questions.pdf", "Download general_questions.pdf"), unsafe_allow_html=True)
+                pdf_bytes = computed("questions_pdf")
+                download_artifact(pdf_bytes, "general_questions.pdf", "Download general_questions.pdf")
 
     # ---------------- STEP 4: Upload Answers from Seller ----------------
     elif step == 4:
         st.header("Step 4 — Upload Seller Answers / Fill Q&A")
         st.write("Paste answers or upload a text file containing answers.")
-        for i,q in enumerate(st.session_state.questions):
+        for i,q in enumerate(computed("questions")):
             ans = st.text_area(f"Answer to Q{i+1}", key=f"ans_{i}", placeholder="Type seller's answer or paste content here")
             st.session_state.answers[f"Q{i+1}"] = ans
         if st.button("Save Answers"):
+            persist("answers", st.session_state.answers)
             st.success("Saved seller answers.")
 
     # ---------------- STEP 5: Excel Tables Adjustment (Manual) ----------------
@@ -292,24 +471,26 @@ with col1:
         st.info("Download parsed Excel, edit offline, and re-upload if needed.")
         
         # Check if we have the parsed Excel data
-        if st.session_state.parsed_xlsx is not None:
-            st.markdown(download_link(st.session_state.parsed_xlsx, "parsed_financial_data.xlsx", "Download parsed_financial_data.xlsx"), unsafe_allow_html=True)
+        parsed_xlsx = computed_ref("parsed_xlsx")
+        if parsed_xlsx is not None:
+            download_artifact(parsed_xlsx, "parsed_financial_data.xlsx", "Download parsed_financial_data.xlsx")
             
             # Also show a preview of the current data
             st.write("Current parsed data:")
-            st.dataframe(st.session_state.parsed_df)
+            st.dataframe(session_artifacts()["parsed_df"])
         else:
             st.info("No parsed Excel file available. Complete Step 1 first to generate the Excel file.")
         
         uploaded_fix = st.file_uploader("Upload corrected Excel (optional)", type=["xlsx"])
-        if uploaded_fix:
+        if uploaded_fix and st.session_state.get("parsed_fix_digest") != file_digest(uploaded_fix):
             try:
+                import pandas as pd
                 df_fix = pd.read_excel(uploaded_fix)
-                st.session_state.parsed_df = df_fix
-                # Update the Excel bytes with the corrected data
-                excel_bytes = save_excel(df_fix)
-                st.session_state.parsed_xlsx = excel_bytes
+                # The Excel export and everything else derived from parsed_df follow from the graph
+                persist("parsed_df", df_fix)
+                st.session_state.parsed_fix_digest = file_digest(uploaded_fix)
                 st.success("Corrected Excel uploaded and accepted.")
+                show_invalidated("parsed_df")
                 st.dataframe(df_fix)
             except Exception as e:
                 st.error("Could not read uploaded file. Make sure it's a valid XLSX.")
@@ -321,6 +502,7 @@ with col1:
         ffe_files = st.file_uploader("FFE / Inventory / Real Estate files (multiple)", accept_multiple_files=True, key="ffe")
         if ffe_files:
             st.session_state.assets['ffe'] = [f.name for f in ffe_files]
+            persist_assets()
             st.success(f"Uploaded {len(ffe_files)} asset files.")
             st.write(st.session_state.assets['ffe'])
 
@@ -331,27 +513,41 @@ with col1:
         default_assets = {"Furniture & Fixtures": 20000, "Inventory Value": 15000, "Real Estate (land+building)": 350000}
         if st.button("Load Mock Asset Extraction"):
             st.session_state.assets['extracted'] = default_assets
+            persist_assets()
         if 'extracted' in st.session_state.assets:
+            import pandas as pd
             df_assets = pd.DataFrame(list(st.session_state.assets['extracted'].items()), columns=["Asset","Value"])
-            edited_assets = st.data_editor(df_assets, num_rows="dynamic")
+            with stage("ui.data_editor.step7"):
+                edited_assets = st.data_editor(df_assets, num_rows="dynamic")
             if st.button("Save Asset Confirmations"):
                 st.session_state.assets['confirmed'] = {r.Asset: int(r.Value) for r in edited_assets.itertuples()}
+                persist_assets()
+                show_invalidated("assets")
                 st.success("Asset inputs confirmed.")
 
     # ---------------- STEP 8: Market Research ----------------
     elif step == 8:
         st.header("Step 8 — Market Research")
-        st.info("Run automated (mock) research for FFE, Real Estate comps, and Industry CMAs.")
-        if st.button("Start Mock Market Research"):
-            research = {
-                "FFE_avg": 18000,
-                "RealEstate_comps": [{"address":"123 Main", "value": 360000}, {"address":"456 Oak", "value": 340000}],
-                "Industry_multiples": {"median_rev_multiple": 0.9, "median_sde_multiple": 3.5}
-            }
-            st.session_state.market_research = research
-            st.success("Market research completed (mock).")
-        if st.session_state.market_research:
-            st.write(st.session_state.market_research)
+        comps = get_comps_index()
+        if comps is None:
+            st.info("Run automated (mock) research for FFE, Real Estate comps, and Industry CMAs.")
+        else:
+            st.info(f"Research runs against the local comparables database ({len(comps.all_comps()):,} comps). "
+                    "Industry multiples feed the CMA and APEEV models in Step 12.")
+        if st.button("Start Market Research" if comps is not None else "Start Mock Market Research"):
+            submit_job("market_research", {"business_meta": dict(st.session_state.business_meta)},
+                       result_key="market_research")
+            st.success("Market research queued; progress is shown under Background jobs in the sidebar.")
+        research = st.session_state.market_research
+        if research and research.get("source") == "comps":
+            import pandas as pd
+            st.write(research["Industry_multiples"])
+            st.subheader("Nearest business comps")
+            st.dataframe(pd.DataFrame(research["Business_comps"]))
+            st.subheader("Nearest real estate comps")
+            st.dataframe(pd.DataFrame(research["RealEstate_comps"]))
+        elif research:
+            st.write(research)
 
     # ---------------- STEP 9: Inventory ----------------
     elif step == 9:
@@ -359,13 +555,20 @@ with col1:
         inv_file = st.file_uploader("Upload inventory CSV or XLSX (optional)", type=["csv","xlsx"])
         if inv_file:
             try:
-                if inv_file.type == "text/csv":
-                    inv = pd.read_csv(inv_file)
-                else:
-                    inv = pd.read_excel(inv_file)
-                st.session_state.inventory = inv
-                st.success("Inventory uploaded.")
-                st.dataframe(inv.head())
+                # Stream the file in chunks to Parquet; only the summary and a preview stay in session state
+                from brokkie_ingest import stream_inventory
+                kind = "csv" if inv_file.type == "text/csv" or inv_file.name.lower().endswith(".csv") else "xlsx"
+                digest = file_digest(inv_file)
+                cache = get_parse_cache()
+                out_path = cache.companion_path(f"inventory-{digest}", ".parquet")
+                inv = cache.get_or_compute(f"inventory-{digest}", lambda: stream_inventory(inv_file, kind, out_path))
+                persist("inventory", inv)
+                st.success(f"Inventory uploaded: {inv['rows']:,} items, {inv['total_quantity']:,.0f} units, extended value {format_usd(inv['extended_value'])}.")
+                st.dataframe(inv["preview"])
+                st.write("Category rollup:")
+                st.dataframe(inv["categories"])
+            except ValueError as e:
+                st.error(f"Could not parse inventory file: {e}")
             except Exception as e:
                 st.error("Could not parse inventory file.")
 
@@ -374,15 +577,18 @@ with col1:
         st.header("Step 10 — Real Estate Upload")
         re_file = st.file_uploader("Upload property docs (deeds, appraisal) (optional)", accept_multiple_files=True)
         if re_file:
-            st.session_state.real_estate_files = [f.name for f in re_file]
+            persist("real_estate_files", [f.name for f in re_file])
+            re_parsed, re_report = ingest_uploads(re_file, kind="real_estate")
+            persist("real_estate_data", re_parsed)
             st.success("Real estate docs uploaded.")
             st.write(st.session_state.real_estate_files)
+            st.dataframe(re_parsed)
 
     # ---------------- STEP 11: Asset Data Preview ----------------
     elif step == 11:
         st.header("Step 11 — Asset Data Preview")
         st.write("Consolidated preview of asset extraction results.")
-        primary = st.session_state.get("primary_data", {})
+        primary = computed("primary_data")
         assets_confirmed = st.session_state.assets.get("confirmed", {})
         market = st.session_state.market_research or {}
         st.subheader("Primary Financials")
@@ -396,34 +602,32 @@ with col1:
                 "business_name": st.session_state.business_meta.get("name","Demo Business"),
                 "location": st.session_state.business_meta.get("location","N/A"),
                 "industry": st.session_state.business_meta.get("industry","N/A"),
-                "primary_data": st.session_state.get("primary_data", {}),
+                "primary_data": primary,
                 "market_research": st.session_state.market_research or {},
                 "highlights": ["Recurring contracts", "High margin services", "Low customer churn"],
                 "one_liner": "Confidential business opportunity — summary available upon ND.",
                 "broker_contact": "broker@antlabs.example"
             }
-            cim_bytes = generate_cim_pdf(ctx)
-            st.markdown(download_link(cim_bytes, "CIM_Teaser.pdf", "Download CIM / Teaser (mock)"), unsafe_allow_html=True)
-            st.success("CIM / Teaser generated (mock).")
+            submit_job("cim_pdf", {"context": ctx}, result_key="cim_pdf")
+            st.success("CIM / Teaser queued (mock); download it from Background jobs in the sidebar.")
 
     # ---------------- STEP 12: Research Results & Valuation Models ----------------
     elif step == 12:
         st.header("Step 12 — Valuation Models & Final Report")
         st.info("Select valuation models to run, review model outputs, validate and generate final report.")
-        primary = st.session_state.get("primary_data")
+        primary = computed("primary_data")
         if not primary:
             st.warning("Primary financial data is missing. Please confirm parsed data in Step 2.")
         else:
-            assets_confirmed = st.session_state.assets.get("confirmed", {})
-            primary_with_assets = primary.copy()
-            primary_with_assets.update(assets_confirmed)
+            primary_with_assets = computed("primary_with_assets")
             st.subheader("Valuation Models")
             run_BE = st.checkbox("Basic Evaluation (BE)", value=True)
             run_APEEV = st.checkbox("Assets + Excess Earnings (APEEV)", value=True)
             run_IVB = st.checkbox("Investment Value of Business (IVB)", value=True)
             run_CMA = st.checkbox("Comparative Market Analysis (CMA)", value=True)
 
-            valuations = compute_valuation_models(primary_with_assets)
+            # Recomputed only when primary data, confirmed assets, research or the seed changed
+            valuations = computed("model_valuations")
             selected = {}
             if run_BE: selected['BE'] = valuations['BE']
             if run_APEEV: selected['APEEV'] = valuations['APEEV']
@@ -434,6 +638,24 @@ with col1:
             for k,v in selected.items():
                 st.metric(k, format_usd(v))
 
+            if run_CMA:
+                with st.expander("CMA simulation (Monte Carlo)"):
+                    seed = st.number_input("Simulation seed", value=st.session_state.cma_seed, min_value=0, max_value=2**32 - 1, step=1)
+                    if int(seed) != st.session_state.cma_seed:
+                        persist("cma_seed", int(seed))
+                        st.rerun()  # the CMA output above follows the new seed's P50
+                    sim = simulate_cma(primary_with_assets, st.session_state.cma_seed)
+                    if (st.session_state.market_research or {}).get("source") == "comps":
+                        st.caption("The CMA output above uses the comparables' industry multiple; the simulation "
+                                   "shows the spread under generic market assumptions.")
+                    c10, c50, c90 = st.columns(3)
+                    c10.metric("P10", format_usd(sim["P10"]))
+                    c50.metric("P50", format_usd(sim["P50"]))
+                    c90.metric("P90", format_usd(sim["P90"]))
+                    st.caption(f"{sim['n_samples']:,} samples, seed {sim['seed']}. Sensitivity of value to each assumption (P10 to P90):")
+                    import pandas as pd
+                    st.dataframe(pd.DataFrame(sim["sensitivities"]))
+
             st.subheader("Model Validation")
             adjustments = {}
             for k,v in selected.items():
@@ -447,38 +669,118 @@ with col1:
                     "valuations": adjustments,
                     "notes": st.text_area("Notes / Recommended Value and rationale", value="Selected recommended value based on weighted median of models.")
                 }
-                pdf_bytes = generate_final_pdf(context)
-                st.session_state.final_pdf = pdf_bytes
-                st.success("Final report generated.")
-                st.markdown(download_link(pdf_bytes, "Final_Valuation_Report.pdf", "Download Final_Valuation_Report.pdf"), unsafe_allow_html=True)
+                persist("valuations", adjustments)
+                recommended = statistics.median(adjustments.values()) if adjustments else None
+                store = get_deal_store()
+                store.update_deal(st.session_state.deal_id, status="Valuation Complete", valuation=recommended)
+                matcher = get_buyer_matcher(store.buyers_version())
+                if matcher is not None:
+                    # Only this deal is rescored against the indexed buyer registry
+                    from brokkie_matching import rematch_store_deal
+                    matched = rematch_store_deal(store, matcher, st.session_state.deal_id, adjustments,
+                                                 primary_with_assets.get("SDE (est)"))
+                    st.info(f"{matched:,} buyers match this deal.")
+                submit_job("final_pdf", {"context": context}, result_key="final_pdf")
+                st.success("Models confirmed. The final report is rendering in the background (see Background jobs in the sidebar).")
 
 # ---------------- TOP NAV: BrokerIQ Dashboard & DealReady ----------------
 st.sidebar.markdown("---")
 view = st.sidebar.selectbox("Quick View", ["Workflow", "BrokerIQ Dashboard", "DealReady (SMB)"])
 
 if view == "BrokerIQ Dashboard":
+    import pandas as pd  # loaded on first use so a cold start only pays for Streamlit
     st.header("BrokerIQ — Dashboard (Demo)")
-    demo_deals = pd.DataFrame([
-        {"Business":"Auto Paving", "Valuation":250000, "Matched Buyers":3, "Status":"Negotiation"},
-        {"Business":"Coffee Chain", "Valuation":120000, "Matched Buyers":0, "Status":"Data Collection"},
-        {"Business":"IT Services", "Valuation":500000, "Matched Buyers":2, "Status":"Marketing"}
-    ])
-    st.table(demo_deals)
-    st.subheader("Deal Analytics (mock)")
-    st.line_chart({"Deal Value":[250000,120000,500000],"Matched Buyers":[3,0,2]})
+    store = get_deal_store()
+    data = get_dashboard_data()
+    if data.summary()["deals"]:
+        # Saved deals: filters, aggregates and pages are computed server-side and cached per store version
+        f1, f2, f3 = st.columns(3)
+        status = f1.selectbox("Status", ["All"] + store.distinct_values("status"))
+        industry = f2.selectbox("Industry", ["All"] + store.distinct_values("industry"))
+        group_col = f3.selectbox("Group by", ["status", "industry", "broker"])
+        filters = {"status": None if status == "All" else status, "industry": None if industry == "All" else industry}
+        if st.session_state.get("dash_filters") != filters:
+            st.session_state.dash_filters = filters
+            st.session_state.dash_cursors = [None]
+        summary = data.summary(**filters)
+        k1, k2, k3 = st.columns(3)
+        k1.metric("Deals", f"{summary['deals']:,}")
+        k2.metric("Total Valuation", format_usd(summary["total_valuation"]))
+        k3.metric("Matched Buyers", f"{summary['matched_buyers']:,}")
+
+        rows, next_cursor = data.page(limit=50, after=st.session_state.dash_cursors[-1], **filters)
+        p1, p2, p3 = st.columns([1, 1, 4])
+        if p1.button("Previous page", disabled=len(st.session_state.dash_cursors) == 1):
+            st.session_state.dash_cursors.pop()
+            st.rerun()
+        if p2.button("Next page", disabled=next_cursor is None):
+            st.session_state.dash_cursors.append(next_cursor)
+            st.rerun()
+        p3.caption(f"Page {len(st.session_state.dash_cursors)} of {summary['deals']:,} deals")
+        demo_deals = pd.DataFrame(rows, columns=["name", "industry", "valuation", "matched_buyers", "status"]).rename(
+            columns={"name": "Business", "industry": "Industry", "valuation": "Valuation",
+                     "matched_buyers": "Matched Buyers", "status": "Status"})
+        demo_deals["Valuation"] = demo_deals["Valuation"].fillna(0)
+        st.table(demo_deals)
+
+        st.subheader("Deal Analytics")
+        grouped = data.group_by(group_col, **filters)
+        st.bar_chart(grouped.set_index(grouped.columns[0])["Total Valuation"])
+        bucket = st.radio("Time bucket", ["day", "week", "month"], index=1, horizontal=True)
+        st.line_chart(data.time_series(bucket=bucket, **filters))
+
+        with st.expander("Buyer registry"):
+            st.caption("CSV columns: buyer_id, name, industries, locations, min_price, max_price, min_sde, max_sde "
+                       "(industries / locations separated by ';', empty = any)")
+            buyers_file = st.file_uploader("Upload buyer registry (CSV)", type=["csv"], key="buyers_csv")
+            if buyers_file is not None and st.button("Import buyers"):
+                store.save_buyers(pd.read_csv(buyers_file), replace=True)
+                st.success("Buyer registry imported.")
+            matcher = get_buyer_matcher(store.buyers_version())
+            st.caption(f"{len(matcher.buyer_ids):,} buyers indexed." if matcher is not None else "No buyers imported yet.")
+            if matcher is not None and st.button("Rematch all deals"):
+                from brokkie_matching import match_store
+                counts = match_store(store, matcher)
+                st.success(f"Rematched {len(counts):,} deals.")
+
+        with st.expander("Comparables database"):
+            comps = get_comps_index()
+            st.caption("CSV columns: comp_id, kind (business / real_estate), industry, location, address, lat, lon, "
+                       "price, revenue, sde, ffe, closed_at")
+            st.caption(f"{len(comps.all_comps()):,} comps loaded." if comps is not None else "No comparables database on disk yet.")
+            comps_file = st.file_uploader("Add closed deals / sales (CSV)", type=["csv"], key="comps_csv")
+            if comps_file is not None and st.button("Add comps"):
+                from brokkie_comps import CompsIndex, default_comps_path, default_index
+                rows = pd.read_csv(comps_file)
+                if comps is None:
+                    CompsIndex(rows).save(default_comps_path())
+                    default_index.cache_clear()
+                    added = len(get_comps_index().comps)
+                else:
+                    # Multiples and the spatial lookup update in place; no reload needed
+                    added = comps.add_comps(rows)
+                    comps.save(default_comps_path())
+                st.success(f"Added {added:,} comps.")
+    else:
+        demo_deals = pd.DataFrame([
+            {"Business":"Auto Paving", "Valuation":250000, "Matched Buyers":3, "Status":"Negotiation"},
+            {"Business":"Coffee Chain", "Valuation":120000, "Matched Buyers":0, "Status":"Data Collection"},
+            {"Business":"IT Services", "Valuation":500000, "Matched Buyers":2, "Status":"Marketing"}
+        ])
+        st.table(demo_deals)
+        st.subheader("Deal Analytics (mock)")
+        st.line_chart({"Deal Value":[250000,120000,500000],"Matched Buyers":[3,0,2]})
     if st.button("Export Portfolio Report (Demo)"):
-       pdf = FPDF()
-       pdf.add_page()
-       pdf.set_font("Arial","B",12)
-       pdf.cell(0,6,safe_text("BrokerIQ Portfolio Report (Demo)"), ln=True)
-       pdf.ln(4)
-       for i,r in demo_deals.iterrows():
-           pdf.set_font("Arial","",10)
-        # FIXED: Use safe_text on the entire string
-           text = safe_text(f"{r['Business']} - Valuation: ${int(r['Valuation']):,} - Status: {r['Status']} - Matched Buyers: {r['Matched Buyers']}")
-           pdf.multi_cell(180, 6, text)
-       pdf_bytes = pdf.output(dest="S")
-       st.markdown(download_link(pdf_bytes, "BrokerIQ_Portfolio_Report.pdf", "Download Portfolio Report"), unsafe_allow_html=True)
+       # Streamed page by page to disk so large books never sit in memory as one PDF
+       fd, report_path = tempfile.mkstemp(prefix="brokkie-portfolio-", suffix=".pdf")
+       os.close(fd)
+       if data.summary()["deals"]:
+           submit_job("portfolio_report", {"filters": dict(st.session_state.dash_filters), "path": report_path}, attach=False)
+           st.success("Portfolio report queued; download it from Background jobs in the sidebar.")
+       else:
+           from brokkie_reports import write_portfolio_report
+           write_portfolio_report(demo_deals, report_path)
+           download_artifact_file(report_path, "BrokerIQ_Portfolio_Report.pdf", "Download Portfolio Report")
 elif view == "DealReady (SMB)":
     st.header("DealReady — SMB Owner Tool (Demo)")
     st.write("Enter your business data to get an instant estimate and exit-prep suggestions.")
@@ -487,18 +789,25 @@ elif view == "DealReady (SMB)":
     profit = st.number_input("Net Profit ($)", value=45000)
     assets_val = st.number_input("Total Assets ($)", value=20000)
     if st.button("Estimate Value"):
-        est = int(rev * 0.8 + profit * 3 + assets_val * 0.5)
+        est = quick_estimate(rev, profit, assets_val)
         st.metric("Estimated Business Value", f"${est:,}")
         st.markdown("**Exit Prep Suggestions:**")
-        st.markdown("- Improve recurring revenue share\n- Formalize contracts & processes\n- Clean up one-time expenses and records\n- Prepare professional marketing materials")
-        owner_ctx = {
-            "business_name": name,
-            "primary_data": {"TTM Revenue": rev, "Net Income": profit, "Assets": assets_val},
-            "valuations": {"QuickEstimate": est},
-            "notes": "Owner-facing simplified valuation and exit prep checklist."
-        }
-        pdf_bytes = generate_final_pdf(owner_ctx)
-        st.markdown(download_link(pdf_bytes, f"{name}_DealReady_Report.pdf", "Download Owner Report"), unsafe_allow_html=True)
+        st.markdown("\n".join(f"- {s}" for s in EXIT_PREP_SUGGESTIONS))
+        pdf_bytes = generate_final_pdf(owner_report_context(name, rev, profit, assets_val, est))
+        download_artifact(pdf_bytes, f"{name}_DealReady_Report.pdf", "Download Owner Report")
 # Footer quick help
 st.sidebar.markdown("---")
 st.sidebar.markdown("Prototype by Ruslan — Simulated outputs. Connect AI models / parsers to replace mock computations.")
+
+# ---------- Instrumentation ----------
+# Reruns are recorded per view (and per step in the workflow); the admin panel is drawn last so it
+# includes this run
+METRICS.record(f"rerun.step{st.session_state.step}" if view == "Workflow" else f"rerun.{view.split()[0].lower()}",
+               (time.perf_counter() - rerun_started) * 1000)
+METRICS.track_state(st.session_state.user_id, st.session_state)
+if profiler is not None:
+    METRICS.save_profile(st.session_state.user_id, profiler.stop())
+METRICS.flush()
+if admin_enabled():
+    with st.sidebar:
+        admin_panel()
@@ -0,0 +1,85 @@
+# brokkie_importtime.py
+# Cold-start import budget check, based on `python -X importtime`.
+#
+#   python brokkie_importtime.py [MODULE ...] [--budget-ms 300] [--repeat 3] [--top 10] [--allow pandas,numpy]
+#
+# Each module is imported in a fresh interpreter. The best of --repeat runs is compared with the
+# budget, and the run fails if a module pulls in one of HEAVY_MODULES at import time.
+# Exits non-zero on any regression so it can gate CI / image builds.
+#
+# Importing the Streamlit app runs its first page in bare mode. Streamlit's own import time and
+# whatever Streamlit loads itself are measured separately and not charged to the app (FRAMEWORKS).
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["brokkie_core", "brokkie_full"]
+FRAMEWORKS = {"brokkie_full": "streamlit"}
+DEFAULT_BUDGET_MS = float(os.environ.get("BROKKIE_IMPORT_BUDGET_MS", 300))
+# Loaded on first use only (dataframes, PDF export, Excel export, Parquet spill, charts, comps KD-trees)
+HEAVY_MODULES = ["pandas", "numpy", "fpdf", "openpyxl", "pyarrow", "matplotlib", "plotly", "scipy"]
+
+def measure(module):
+    # Returns (total_us, [(cumulative_us, child)] for direct imports of module, set of all imported modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    total, children, pending, imported = 0, [], [], set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        # -X importtime prints children before their parent, indented two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        imported.add(name)
+        if depth == 1:
+            pending.append((int(cumulative), name))
+        elif depth == 0:
+            if name == module:
+                total, children = int(cumulative), pending
+            pending = []
+    return total, sorted(children, reverse=True), imported
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of Brokkie modules against a budget.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="max import time per module (default: $BROKKIE_IMPORT_BUDGET_MS or 300)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per module; the fastest is reported")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list per module")
+    parser.add_argument("--allow", default="", help="comma-separated heavy modules that may load eagerly")
+    args = parser.parse_args(argv)
+
+    allowed = {m.strip() for m in args.allow.split(",") if m.strip()}
+    failed = False
+    for module in args.modules:
+        runs = [measure(module) for _ in range(args.repeat)]
+        total_us, children, imported = min(runs, key=lambda r: r[0])
+        framework = FRAMEWORKS.get(module)
+        note = ""
+        if framework:
+            framework_us, _, framework_imported = min((measure(framework) for _ in range(args.repeat)),
+                                                      key=lambda r: r[0])
+            total_us = max(total_us - framework_us, 0)
+            imported = imported - framework_imported
+            children = [c for c in children if c[1] != framework]
+            note = f", excluding {framework} {framework_us / 1000:.1f} ms"
+        total_ms = total_us / 1000
+        heavy = sorted(m for m in HEAVY_MODULES if m in imported and m not in allowed)
+        over = total_ms > args.budget_ms
+        status = "FAIL" if over or heavy else "ok"
+        print(f"[{status}] import {module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms{note})")
+        if heavy:
+            print(f"       eagerly imports heavy modules: {', '.join(heavy)}")
+        for us, name in children[:args.top]:
+            print(f"       {us / 1000:8.1f} ms  {name}")
+        failed = failed or over or bool(heavy)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+# brokkie_ingest.py
+# Document ingestion for the workflow. Kept free of Streamlit so process-pool workers can
+# import it (brokkie_full.py builds the whole UI at import time).
+import hashlib
+import multiprocessing
+import os
+import queue
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+
+def parse_financial_document(name, data):
+    # Mocked per-document parser (tax return / P&L / DOR). Seeded by the file content so the
+    # same document always yields the same figures.
+    rng = random.Random(hashlib.sha256(data).hexdigest())
+    revenue = rng.randint(200000, 3000000)
+    cogs = int(revenue * rng.uniform(0.2, 0.6))
+    expenses = int(revenue * rng.uniform(0.1, 0.3))
+    net_income = revenue - cogs - expenses
+    sde = net_income + int(expenses * 0.25)  # simplified add-backs
+    return [
+        {"Metric": "TTM Revenue", "Value": revenue},
+        {"Metric": "COGS", "Value": cogs},
+        {"Metric": "Operating Expenses", "Value": expenses},
+        {"Metric": "Net Income", "Value": net_income},
+        {"Metric": "SDE (est)", "Value": sde},
+    ]
+
+def parse_real_estate_document(name, data):
+    # Mocked deed / appraisal parser
+    rng = random.Random(hashlib.sha256(data).hexdigest())
+    land = rng.randint(50000, 400000)
+    building = rng.randint(100000, 900000)
+    return [
+        {"Metric": "Land Value", "Value": land},
+        {"Metric": "Building Value", "Value": building},
+        {"Metric": "Appraised Value", "Value": land + building},
+    ]
+
+PARSERS = {
+    "financials": parse_financial_document,
+    "real_estate": parse_real_estate_document,
+}
+
+# Worker side: queue on which _parse_one announces each file as it starts (set by _init_worker)
+_started = None
+
+def _init_worker(started):
+    global _started
+    _started = started
+
+def _parse_one(parser, name, data, index=None):
+    # Runs in the worker; the parse time is measured there so queueing is not counted. Pool
+    # workers announce the file first so the caller's timeout starts when the parse does.
+    if _started is not None and index is not None:
+        _started.put(index)
+    start = time.perf_counter()
+    rows = parser(name, data)
+    return rows, time.perf_counter() - start
+
+def _pool_context():
+    # Workers are never forked from the app process: it runs Streamlit and job threads, and a
+    # fork taken while another thread holds a lock can deadlock the child
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def merge_parsed(results):
+    # Merge per-file rows into one Metric/Value frame. Files describe the same business, so a
+    # metric reported by several documents is averaged; metrics keep first-seen order.
+    rows = [row for file_rows in results for row in file_rows]
+    frame = pd.DataFrame(rows, columns=["Metric", "Value"])
+    if frame.empty:
+        return frame
+    merged = frame.groupby("Metric", sort=False)["Value"].mean().round().astype("int64")
+    return merged.reset_index()
+
+def ingest_documents(files, kind="financials", max_workers=None, timeout=60, progress=None, cache=None,
+                     parser=None):
+    # Parse (name, bytes) pairs in a process pool and merge them into a Metric/Value frame.
+    # - timeout: seconds allowed per file, counted from when a worker starts parsing it; workers
+    #   still busy with a timed-out file are terminated. Once every worker is stuck on a timed-out
+    #   file (or the whole batch overruns its deadline) the pool is torn down and files that never
+    #   started are reported as "skipped".
+    # - progress: called as progress(done, total, name) from the calling thread
+    # - cache: optional ParseCache-like object (get/put); files are keyed by kind + SHA-256
+    # - parser: importable parse(name, data) -> rows; defaults to PARSERS[kind]
+    # Returns (parsed_df, report) where report has one status row per file.
+    parser = parser or PARSERS[kind]
+    total = len(files)
+    results = {}
+    report = {}
+    pending = []
+    done = 0
+
+    def finish(i, status, seconds=0.0):
+        nonlocal done
+        done += 1
+        report[i] = {"File": files[i][0], "Status": status, "Seconds": round(seconds, 3)}
+        if progress:
+            progress(done, total, files[i][0])
+
+    keys = [f"{kind}-{hashlib.sha256(data).hexdigest()}" for _, data in files]
+    for i, (name, data) in enumerate(files):
+        rows = cache.get(keys[i]) if cache is not None else None
+        if rows is not None:
+            results[i] = rows
+            finish(i, "cached")
+        else:
+            pending.append(i)
+
+    def store(i, rows, status, seconds):
+        results[i] = rows
+        if cache is not None:
+            cache.put(keys[i], rows)
+        finish(i, status, seconds)
+
+    workers = max_workers or os.cpu_count() or 1
+    if len(pending) <= 1 or workers == 1:
+        # Not worth spinning up a pool; parse inline
+        for i in pending:
+            start = time.perf_counter()
+            try:
+                rows, seconds = _parse_one(parser, *files[i])
+            except Exception as e:
+                finish(i, f"error: {e}", time.perf_counter() - start)
+                continue
+            store(i, rows, "parsed", seconds)
+    elif pending:
+        size = min(workers, len(pending))
+        ctx = _pool_context()
+        announced = ctx.Queue()
+        pool = ProcessPoolExecutor(max_workers=size, mp_context=ctx, initializer=_init_worker,
+                                   initargs=(announced,))
+        futures = {pool.submit(_parse_one, parser, *files[i], i): i for i in pending}
+        # Backstop for workers that never report in: every round of files gets its timeout, plus
+        # one extra round for pool start-up
+        deadline = time.perf_counter() + timeout * (-(-len(pending) // size) + 1)
+        started = {}  # file index -> when its worker announced it
+        timed_out = []
+        abandoned = False
+        not_done = set(futures)
+        while not_done:
+            finished, not_done = wait(not_done, timeout=0.1, return_when=FIRST_COMPLETED)
+            now = time.perf_counter()
+            while True:
+                try:
+                    started.setdefault(announced.get_nowait(), now)
+                except queue.Empty:
+                    break
+            for fut in finished:
+                i = futures[fut]
+                try:
+                    rows, seconds = fut.result()
+                    store(i, rows, "parsed", seconds)
+                except Exception as e:
+                    finish(i, f"error: {e}", now - started.get(i, now))
+            for fut in list(not_done):
+                i = futures[fut]
+                if i in started and now - started[i] > timeout:
+                    not_done.discard(fut)
+                    timed_out.append(fut)
+                    finish(i, "timeout", now - started[i])
+            stuck = sum(not fut.done() for fut in timed_out)
+            if not_done and (stuck >= size or now > deadline):
+                # No worker is left to pick up the rest
+                for fut in not_done:
+                    i = futures[fut]
+                    finish(i, "timeout" if i in started else "skipped", now - started.get(i, now))
+                not_done = set()
+                abandoned = True
+        # shutdown() drops the pool's process table, so take it first
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        kill = abandoned or any(not fut.done() for fut in timed_out)
+        if kill:
+            for proc in processes:
+                if proc.is_alive():
+                    proc.terminate()
+        pool.shutdown(wait=not kill, cancel_futures=True)
+        for proc in processes if kill else ():
+            proc.join(5)
+        announced.close()
+
+    parsed = merge_parsed([results[i] for i in sorted(results)])
+    return parsed, [report[i] for i in range(total)]
+
+# ---------- Inventory ----------
+# Header aliases for the normalized inventory columns (matched case-insensitively)
+INVENTORY_ALIASES = {
+    "SKU": ("sku", "item", "item #", "item number", "part number", "upc"),
+    "Description": ("description", "name", "item name", "product"),
+    "Category": ("category", "department", "dept", "class"),
+    "Quantity": ("quantity", "qty", "on hand", "qty on hand", "count", "units"),
+    "Unit Cost": ("unit cost", "cost", "unit price", "price"),
+    "Extended Value": ("extended value", "extended cost", "total value", "total", "value"),
+}
+INVENTORY_TEXT = ["SKU", "Description", "Category"]
+INVENTORY_NUMERIC = {"Quantity": "float32", "Unit Cost": "float64", "Extended Value": "float64"}
+
+def _inventory_column_map(columns):
+    # normalized name -> source column, for the columns we can recognize
+    lookup = {str(c).strip().lower(): c for c in columns}
+    mapping = {}
+    for target, aliases in INVENTORY_ALIASES.items():
+        for alias in aliases:
+            if alias in lookup:
+                mapping[target] = lookup[alias]
+                break
+    return mapping
+
+def _to_number(series):
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        series = series.astype("string").str.replace(r"[$,\s]", "", regex=True)
+    return pd.to_numeric(series, errors="coerce")
+
+def normalize_inventory_chunk(chunk, mapping):
+    out = pd.DataFrame(index=chunk.index)
+    for name in INVENTORY_TEXT:
+        src = mapping.get(name)
+        out[name] = chunk[src].astype("string") if src is not None else pd.Series(pd.NA, index=chunk.index, dtype="string")
+    out["Category"] = out["Category"].fillna("Uncategorized")
+    for name, dtype in INVENTORY_NUMERIC.items():
+        src = mapping.get(name)
+        out[name] = _to_number(chunk[src]) if src is not None else float("nan")
+    qty = out["Quantity"].fillna(0)
+    extended = qty * out["Unit Cost"]
+    out["Quantity"] = qty
+    out["Extended Value"] = out["Extended Value"].fillna(extended).fillna(0)
+    return out.astype(INVENTORY_NUMERIC).reset_index(drop=True)
+
+def _require_inventory_columns(mapping, header):
+    if not mapping:
+        found = ", ".join(str(c) for c in header if c is not None) or "none"
+        raise ValueError(f"no inventory columns recognized (found: {found}); expected headers such as "
+                         f"{', '.join(INVENTORY_ALIASES)}")
+    return mapping
+
+def _iter_csv_chunks(file, chunksize):
+    try:
+        header = pd.read_csv(file, nrows=0)
+    except pd.errors.EmptyDataError:
+        header = pd.DataFrame()
+    file.seek(0)
+    mapping = _require_inventory_columns(_inventory_column_map(header.columns), header.columns)
+    # Read only recognized columns, all as strings; numbers are coerced per chunk after cleanup
+    usecols = list(mapping.values())
+    for chunk in pd.read_csv(file, chunksize=chunksize, usecols=usecols, dtype=str):
+        yield chunk, mapping
+
+def _iter_xlsx_chunks(file, chunksize):
+    from openpyxl import load_workbook
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        mapping = _require_inventory_columns(_inventory_column_map(header), header)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=header), mapping
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header), mapping
+    finally:
+        wb.close()
+
+def stream_inventory(file, kind, out_path, chunksize=100_000, preview_rows=5):
+    # Read an inventory CSV/XLSX chunk by chunk, spill the normalized rows to Parquet at out_path
+    # and return only running totals, category rollups and a small preview. Raises ValueError when
+    # the header has none of the INVENTORY_ALIASES columns.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    chunks = _iter_csv_chunks(file, chunksize) if kind == "csv" else _iter_xlsx_chunks(file, chunksize)
+    schema = pa.schema([(name, pa.string()) for name in INVENTORY_TEXT] +
+                       [("Quantity", pa.float32()), ("Unit Cost", pa.float64()), ("Extended Value", pa.float64())])
+    rows = 0
+    total_quantity = 0.0
+    extended_value = 0.0
+    rollup = None
+    preview = None
+    tmp_path = f"{out_path}.tmp"
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        for raw, mapping in chunks:
+            chunk = normalize_inventory_chunk(raw, mapping)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+            total_quantity += float(chunk["Quantity"].sum())
+            extended_value += float(chunk["Extended Value"].sum())
+            part = chunk.groupby("Category").agg(Items=("Quantity", "size"), Quantity=("Quantity", "sum"),
+                                                 Value=("Extended Value", "sum"))
+            rollup = part if rollup is None else rollup.add(part, fill_value=0)
+            if preview is None:
+                preview = chunk.head(preview_rows)
+    os.replace(tmp_path, out_path)
+    if rollup is None:
+        rollup = pd.DataFrame(columns=["Items", "Quantity", "Value"])
+    return {
+        "rows": rows,
+        "total_quantity": total_quantity,
+        "extended_value": extended_value,
+        "categories": rollup.sort_values("Value", ascending=False).reset_index(),
+        "preview": preview if preview is not None else pd.DataFrame(columns=schema.names),
+        "path": out_path,
+    }
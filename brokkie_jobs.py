@@ -0,0 +1,186 @@
+# brokkie_jobs.py
+# Local background job runner. Jobs are rows in the deal store's jobs table (queued -> running ->
+# done / failed / cancelled) and run on daemon threads of the server process, so they survive
+# reruns, step changes and disconnects of the session that submitted them. Results with a
+# result_key are attached to the job's deal as artifacts; other results stay on the job row.
+#
+# At most max_workers jobs run per server and at most per_user per owner; the rest wait queued
+# (oldest first) so long exports cannot starve interactive sessions. Job functions report
+# progress through progress(fraction, message), which also raises JobCancelled on cancel.
+#
+# A job interrupted by a server restart is queued again, up to max_attempts starts in total
+# ($BROKKIE_JOB_MAX_ATTEMPTS, default 3). Finished jobs are deleted after retention_days
+# ($BROKKIE_JOB_RETENTION_DAYS, default 7), together with the files of FILE_RESULT_KINDS.
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+ACTIVE = ("queued", "running")
+FINISHED = ("done", "failed", "cancelled")
+
+class JobCancelled(Exception):
+    pass
+
+# ---------- job kinds ----------
+def _final_pdf(progress, store, context):
+    from brokkie_core import generate_final_pdf
+    progress(0.1, "Rendering final report")
+    return generate_final_pdf(context)
+
+def _cim_pdf(progress, store, context):
+    from brokkie_core import generate_cim_pdf
+    progress(0.1, "Rendering CIM / teaser")
+    return generate_cim_pdf(context)
+
+def _market_research(progress, store, business_meta):
+    from brokkie_core import run_market_research
+    from brokkie_comps import default_index
+    progress(0.1, "Loading comparables")
+    comps = default_index()
+    progress(0.5, "Searching comparables" if comps is not None else "Running mock research")
+    return run_market_research(business_meta, comps)
+
+def _portfolio_report(progress, store, filters, path, title="BrokerIQ Portfolio Report"):
+    # Streams the filtered deals to a PDF at path; returns the path
+    from brokkie_reports import write_portfolio_report
+    total = max(store.count_deals(**filters), 1)
+
+    def rows():
+        for i, d in enumerate(store.iter_deals(**filters)):
+            if i % 5000 == 0:
+                progress(i / total, f"{i:,} of {total:,} deals")
+            yield d["name"], d["industry"], d["status"], d["valuation"] or 0, d["matched_buyers"]
+    write_portfolio_report(rows(), path, title=title)
+    return path
+
+JOB_KINDS = {
+    "final_pdf": _final_pdf,
+    "cim_pdf": _cim_pdf,
+    "market_research": _market_research,
+    "portfolio_report": _portfolio_report,
+}
+# Kinds whose result is the path of a file the job wrote
+FILE_RESULT_KINDS = ("portfolio_report",)
+SWEEP_EVERY = 3600  # seconds between retention sweeps
+
+def _now():
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+class JobRunner:
+    def __init__(self, store, max_workers=None, per_user=None, max_attempts=None, retention_days=None):
+        self.store = store
+        self.max_workers = max_workers or int(os.environ.get("BROKKIE_JOB_WORKERS", 2))
+        self.per_user = per_user or int(os.environ.get("BROKKIE_JOBS_PER_USER", 1))
+        self.max_attempts = max_attempts or int(os.environ.get("BROKKIE_JOB_MAX_ATTEMPTS", 3))
+        self.retention_days = retention_days or float(os.environ.get("BROKKIE_JOB_RETENTION_DAYS", 7))
+        self._lock = threading.Lock()
+        self._running = {}  # job id -> owner
+        self._cancel = set()
+        self._swept = 0.0
+        self.recover()
+
+    def recover(self):
+        # Jobs left running by a previous server process start over (until they have been started
+        # max_attempts times: a job that keeps taking the server down is not retried forever);
+        # queued ones are picked up
+        for job in self.store.list_jobs(status="running", limit=10_000):
+            if job["id"] in self._running:
+                continue
+            if job["attempts"] >= self.max_attempts:
+                self.store.update_job(job["id"], status="failed", finished_at=_now(),
+                                      error=f"Interrupted by a server restart {job['attempts']} times; not retried")
+            else:
+                self.store.update_job(job["id"], status="queued", progress=0, message="Restarted")
+        self.sweep()
+        self._dispatch()
+
+    def sweep(self):
+        # Delete jobs finished more than retention_days ago and the files they produced
+        self._swept = time.monotonic()
+        cutoff = (datetime.utcnow() - timedelta(days=self.retention_days)).isoformat(timespec="seconds")
+        purged = self.store.purge_jobs(cutoff)
+        for job in purged:
+            if job["kind"] in FILE_RESULT_KINDS and isinstance(job["result"], str):
+                try:
+                    os.remove(job["result"])
+                except OSError:
+                    pass
+        return len(purged)
+
+    def submit(self, kind, owner, params=None, deal_id=None, result_key=None):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"unknown job kind {kind!r}; expected one of {sorted(JOB_KINDS)}")
+        job_id = self.store.create_job(kind, owner, params, deal_id=deal_id, result_key=result_key)
+        if time.monotonic() - self._swept > SWEEP_EVERY:
+            self.sweep()
+        self._dispatch()
+        return job_id
+
+    def cancel(self, job_id):
+        job = self.store.get_job(job_id, blobs=False)
+        if job is None or job["status"] in FINISHED:
+            return False
+        with self._lock:
+            if job_id in self._running:
+                self._cancel.add(job_id)  # honoured at the job's next progress() call
+            else:
+                self.store.update_job(job_id, status="cancelled", finished_at=_now())
+        return True
+
+    def _dispatch(self):
+        # Start queued jobs, oldest first, while the server and per-owner limits allow
+        with self._lock:
+            if len(self._running) >= self.max_workers:
+                return
+            for job in self.store.list_jobs(status="queued", oldest_first=True, limit=1000):
+                if len(self._running) >= self.max_workers:
+                    break
+                if job["id"] in self._running or Counter(self._running.values())[job["owner"]] >= self.per_user:
+                    continue
+                self._running[job["id"]] = job["owner"]
+                self.store.update_job(job["id"], status="running", started_at=_now(), message="Started",
+                                      attempts=job["attempts"] + 1)
+                threading.Thread(target=self._run, args=(job["id"],), daemon=True,
+                                 name=f"brokkie-job-{job['id'][:8]}").start()
+
+    def _run(self, job_id):
+        job = self.store.get_job(job_id)
+
+        def progress(fraction, message=None):
+            if job_id in self._cancel:
+                raise JobCancelled()
+            self.store.update_job(job_id, progress=min(max(float(fraction), 0.0), 1.0), message=message)
+
+        try:
+            result = JOB_KINDS[job["kind"]](progress, self.store, **job["params"])
+            if job["deal_id"] and job["result_key"]:
+                self.store.save_artifact(job["deal_id"], job["result_key"], result)
+                self.store.update_job(job_id, status="done", progress=1.0, message="Done", finished_at=_now())
+            else:
+                self.store.update_job(job_id, status="done", progress=1.0, message="Done", result=result,
+                                      finished_at=_now())
+        except JobCancelled:
+            self.store.update_job(job_id, status="cancelled", message="Cancelled", finished_at=_now())
+        except Exception as e:
+            self.store.update_job(job_id, status="failed", error=f"{type(e).__name__}: {e}", finished_at=_now())
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+                self._cancel.discard(job_id)
+            self._dispatch()
+
+    def result(self, job_id):
+        # The job's output: the attached deal artifact, or the value kept on the job row
+        job = self.store.get_job(job_id)
+        if job is None or job["status"] != "done":
+            return None
+        if job["deal_id"] and job["result_key"]:
+            return self.store.load_artifact(job["deal_id"], job["result_key"])
+        return job["result"]
+
+    def stats(self):
+        with self._lock:
+            return {"running": len(self._running), "max_workers": self.max_workers, "per_user": self.per_user,
+                    "queued": len(self.store.list_jobs(status="queued", limit=10_000))}
@@ -0,0 +1,191 @@
+# brokkie_matching.py
+# Buyer matching for BrokerIQ. Buyers are indexed by industry and location (inverted indexes of
+# buyer positions); each deal only scores the buyers posted under its industry, and price band,
+# SDE range and location are evaluated as numpy array operations over those candidates.
+#
+# Buyer registry columns: buyer_id, name, industries, locations, min_price, max_price, min_sde, max_sde
+# (industries / locations are ";"-separated; empty means "any").
+MODEL_COLUMNS = ("BE", "APEEV", "IVB", "CMA")
+DEFAULT_WEIGHTS = {"industry": 0.4, "price": 0.3, "sde": 0.2, "location": 0.1}
+ANY = "*"
+
+def _keys(value):
+    if value is None or value != value:  # None / NaN
+        return []
+    return [k.strip().lower() for k in str(value).split(";") if k.strip()]
+
+def location_keys(location):
+    # "Seattle, WA" matches buyers registered for "seattle, wa" or the state "wa"
+    if not location:
+        return []
+    location = str(location).strip().lower()
+    keys = [location]
+    if "," in location:
+        keys.append(location.rsplit(",", 1)[1].strip())
+    return keys
+
+def price_band(valuations):
+    # Low/high asking range from the valuation model outputs (negative models are ignored)
+    values = [float(v) for k, v in valuations.items() if k in MODEL_COLUMNS and v is not None and float(v) > 0]
+    if not values:
+        return 0.0, 0.0
+    return min(values), max(values)
+
+class BuyerMatcher:
+    def __init__(self, buyers, weights=None, min_score=0.6, max_matches=50):
+        import numpy as np
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.min_score = min_score
+        self.max_matches = max_matches
+        self.buyer_ids = buyers["buyer_id"].astype(str).to_numpy()
+        n = len(buyers)
+
+        def bound(col, fill):
+            if col not in buyers.columns:
+                return np.full(n, fill)
+            return buyers[col].astype("float64").fillna(fill).to_numpy()
+        self.min_price, self.max_price = bound("min_price", 0.0), bound("max_price", np.inf)
+        self.min_sde, self.max_sde = bound("min_sde", -np.inf), bound("max_sde", np.inf)
+        self.industry_index = self._index(buyers.get("industries"), n)
+        self.location_index = self._index(buyers.get("locations"), n)
+        self.matches = {}  # deal_id -> (buyer positions, scores best first, total matched)
+
+    @staticmethod
+    def _index(column, n):
+        import numpy as np
+        postings = {}
+        values = column if column is not None else [None] * n
+        for pos, value in enumerate(values):
+            for key in _keys(value) or [ANY]:
+                postings.setdefault(key, []).append(pos)
+        return {k: np.asarray(v, dtype=np.int64) for k, v in postings.items()}
+
+    def _candidates(self, industry):
+        import numpy as np
+        parts = [self.industry_index.get(k) for k in _keys(industry) + [ANY]]
+        parts = [p for p in parts if p is not None]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def _location_mask(self, location, cand):
+        import numpy as np
+        mask = np.zeros(len(cand), dtype=bool)
+        for key in location_keys(location) + [ANY]:
+            posting = self.location_index.get(key)
+            if posting is not None:
+                mask |= np.isin(cand, posting, assume_unique=True)
+        return mask
+
+    def score_many(self, industry, locations, lows, highs, sdes, chunk_cells=2_000_000):
+        # Score several deals of one industry against its candidate buyers as a (deals x candidates)
+        # matrix, in chunks of at most chunk_cells. A deal needs a positive price band to match
+        # at all, and SDE <= 0 (unknown) gets no SDE credit. Yields (row, buyer positions best first, scores,
+        # total matched) per deal; only the top max_matches are kept per deal.
+        import numpy as np
+        cand = self._candidates(industry)
+        lows, highs, sdes = (np.asarray(a, dtype="float32") for a in (lows, highs, sdes))
+        if not len(cand):
+            for i in range(len(lows)):
+                yield i, cand, np.empty(0), 0
+            return
+        # float32 is plenty for scoring and halves the memory traffic of the deal x buyer matrices
+        bmin, bmax = self.min_price[cand].astype("float32"), self.max_price[cand].astype("float32")
+        smin, smax = self.min_sde[cand].astype("float32"), self.max_sde[cand].astype("float32")
+        loc_codes, loc_inverse = np.unique(np.asarray(locations, dtype=object).astype(str), return_inverse=True)
+        loc_rows = np.vstack([self._location_mask(loc, cand) for loc in loc_codes])
+        w = self.weights
+        step = max(1, chunk_cells // len(cand))
+        for start in range(0, len(lows), step):
+            sl = slice(start, start + step)
+            low, high = lows[sl, None], highs[sl, None]
+            # Price: share of the deal's band inside the buyer's range (a point band counts if inside)
+            overlap = np.minimum(bmax, high) - np.maximum(bmin, low)
+            width = high - low
+            point = width <= 0
+            price = np.clip(overlap / np.where(point, 1, width), 0, 1)
+            price = np.where(point, overlap >= 0, price)
+            # No valuation (an empty or non-positive band) and no SDE earn no credit
+            price = np.where(high > 0, price, 0).astype("float32")
+            sde = sdes[sl, None]
+            sde_ok = (sde > 0) & (smin <= sde) & (sde <= smax)
+            scores = price * np.float32(w["price"])
+            scores += np.float32(w["industry"])
+            scores += sde_ok * np.float32(w["sde"])
+            scores += loc_rows[loc_inverse[sl]] * np.float32(w["location"])
+            keep = (price > 0) & (scores >= self.min_score)
+            scores[~keep] = -np.inf
+            counts = keep.sum(axis=1)
+            k = min(self.max_matches, len(cand))
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < len(cand) else np.tile(np.arange(len(cand)), (len(counts), 1))
+            for r in range(len(counts)):
+                idx = top[r][np.isfinite(scores[r, top[r]])]
+                idx = idx[np.argsort(-scores[r, idx], kind="stable")]
+                yield start + r, cand[idx], scores[r, idx], int(counts[r])
+
+    def match_deal(self, deal_id, industry, location, valuations, sde):
+        # Returns the number of matched buyers; top matches are kept in self.matches
+        low, high = price_band(valuations)
+        _, positions, scores, count = next(self.score_many(industry, [location], [low], [high], [float(sde or 0)]))
+        self.matches[deal_id] = (positions, scores, count)
+        return count
+
+    def rematch(self, deal_id, industry, location, valuations, sde):
+        # Incremental path: one deal's valuation changed, only that deal is rescored
+        return self.match_deal(deal_id, industry, location, valuations, sde)
+
+    def match_all(self, deals):
+        # deals: DataFrame with deal_id, industry, location, SDE (est) and the model columns
+        # (or price_low / price_high). Deals are grouped by industry so each group shares one
+        # candidate set. Returns {deal_id: matched buyer count}.
+        import numpy as np
+        if "price_low" in deals.columns and "price_high" in deals.columns:
+            lows = deals["price_low"].astype("float64").to_numpy()
+            highs = deals["price_high"].astype("float64").to_numpy()
+        else:
+            models = deals[[c for c in MODEL_COLUMNS if c in deals.columns]].astype("float64").to_numpy()
+            positive = models > 0  # False for NaN too
+            lows = np.where(positive.any(axis=1), np.where(positive, models, np.inf).min(axis=1), 0.0)
+            highs = np.where(positive, models, 0.0).max(axis=1)
+        sdes = deals["SDE (est)"].astype("float64").fillna(0).to_numpy() if "SDE (est)" in deals.columns else np.zeros(len(deals))
+        ids = deals["deal_id"].to_numpy()
+        industries = deals["industry"].fillna("").astype(str).to_numpy()
+        locations = deals["location"].fillna("").astype(str).to_numpy() if "location" in deals.columns else np.full(len(deals), "")
+        counts = {}
+        for industry in np.unique(industries):
+            rows = np.flatnonzero(industries == industry)
+            for r, positions, scores, count in self.score_many(industry, locations[rows], lows[rows], highs[rows], sdes[rows]):
+                deal_id = ids[rows[r]]
+                self.matches[deal_id] = (positions, scores, count)
+                counts[deal_id] = count
+        return counts
+
+    def top_matches(self, deal_id, n=None):
+        positions, scores, _ = self.matches.get(deal_id, ((), (), 0))
+        n = n or self.max_matches
+        return [(self.buyer_ids[p], float(s)) for p, s in zip(positions[:n], scores[:n])]
+
+def store_deals_frame(store):
+    # One row per stored deal with its industry, location, adjusted model values and SDE
+    import pandas as pd
+    valuations = store.load_artifact_for_all("valuations")
+    primary = store.load_artifact_for_all("primary_data")
+    rows = []
+    for deal in store.iter_deals():
+        row = {"deal_id": deal["id"], "industry": deal["industry"], "location": deal["location"],
+               "SDE (est)": (primary.get(deal["id"]) or {}).get("SDE (est)", 0)}
+        vals = valuations.get(deal["id"]) or ({"BE": deal["valuation"]} if deal["valuation"] else {})
+        row.update({k: vals.get(k) for k in MODEL_COLUMNS})
+        rows.append(row)
+    return pd.DataFrame(rows, columns=["deal_id", "industry", "location", "SDE (est)", *MODEL_COLUMNS])
+
+def match_store(store, matcher):
+    # Full rematch of every stored deal; writes top matches and counts back to the store
+    counts = matcher.match_all(store_deals_frame(store))
+    store.save_matches_many((deal_id, matcher.top_matches(deal_id), count) for deal_id, count in counts.items())
+    return counts
+
+def rematch_store_deal(store, matcher, deal_id, valuations, sde):
+    # Incremental rematch after one deal's valuation changed
+    deal = store.get_deal(deal_id) or {}
+    count = matcher.rematch(deal_id, deal.get("industry"), deal.get("location"), valuations, sde)
+    store.save_matches(deal_id, matcher.top_matches(deal_id), count)
+    return count
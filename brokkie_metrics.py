@@ -0,0 +1,221 @@
+# brokkie_metrics.py
+# In-process instrumentation. Named stages are timed with the @timed decorator or the stage()
+# context manager; each call becomes an event (stage, ms, session, ts) in a bounded buffer and
+# updates per-stage aggregates, so time whole stages rather than per-row helpers. track_state()
+# adds a session_state size event per rerun; a session's sizes and profile are dropped when its
+# lease() is collected. Events can be exported as JSON lines, and are appended to
+# $BROKKIE_METRICS_PATH on flush() when that is set. Standard library only, so importing it
+# costs nothing at startup.
+import contextvars
+import functools
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+
+current_session = contextvars.ContextVar("brokkie_session", default=None)
+
+def _percentile(ordered, q):
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+def value_size(value):
+    # Approximate bytes held by one session value
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+class Metrics:
+    def __init__(self, max_events=50_000, window=1000, sink_path=None):
+        self.window = window
+        self.sink_path = sink_path if sink_path is not None else os.environ.get("BROKKIE_METRICS_PATH")
+        self.events = deque(maxlen=max_events)
+        self.stages = {}  # name -> {"count", "total", "max", "recent": deque of ms}
+        self.sessions = {}  # session -> {"bytes", "keys": {key: bytes}, "updated"}
+        self.profiles = {}  # session -> last profile capture
+        self._sizes = {}  # session -> {key: (id(value), bytes)}
+        self._unflushed = []
+        self._lock = threading.Lock()
+
+    def record(self, name, ms, **extra):
+        event = {"ts": round(time.time(), 3), "stage": name, "ms": round(ms, 3),
+                 "session": current_session.get()}
+        event.update(extra)
+        with self._lock:
+            agg = self.stages.get(name)
+            if agg is None:
+                agg = self.stages[name] = {"count": 0, "total": 0.0, "max": 0.0, "recent": deque(maxlen=self.window)}
+            agg["count"] += 1
+            agg["total"] += ms
+            agg["max"] = max(agg["max"], ms)
+            agg["recent"].append(ms)
+        self._emit(event)
+
+    def _emit(self, event):
+        with self._lock:
+            self.events.append(event)
+            if self.sink_path:
+                self._unflushed.append(event)
+
+    def stage(self, name, **extra):
+        return _Stage(self, name, extra)
+
+    def timed(self, name=None):
+        # Decorator; the stage defaults to module.function
+        def wrap(fn):
+            label = name or f"{fn.__module__}.{fn.__name__}"
+
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(label, (time.perf_counter() - start) * 1000)
+            return inner
+        return wrap
+
+    def summary(self):
+        # One row per stage: count, total / mean / p50 / p95 / max ms (percentiles over the recent window)
+        with self._lock:
+            items = [(n, a["count"], a["total"], a["max"], sorted(a["recent"])) for n, a in self.stages.items()]
+        rows = [{"stage": n, "count": c, "total_ms": round(t, 2), "mean_ms": round(t / c, 3),
+                 "p50_ms": round(_percentile(r, 0.5), 3), "p95_ms": round(_percentile(r, 0.95), 3),
+                 "max_ms": round(m, 3)} for n, c, t, m, r in items]
+        return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+    def track_state(self, session, state):
+        # Per-key size of one session's state; unchanged values (same object) are not re-measured
+        previous = self._sizes.get(session, {})
+        sizes = {}
+        for key in list(state.keys()):
+            try:
+                value = state[key]
+            except KeyError:
+                continue
+            cached = previous.get(key)
+            sizes[key] = cached if cached is not None and cached[0] == id(value) else (id(value), value_size(value))
+        keys = {key: size for key, (_, size) in sizes.items()}
+        total = sum(keys.values())
+        now = round(time.time(), 3)
+        with self._lock:
+            self._sizes[session] = sizes  # keys no longer in the state are dropped
+            self.sessions[session] = {"bytes": total, "keys": keys, "updated": now}
+        self._emit({"ts": now, "type": "session_state", "session": session, "bytes": total})
+        return total
+
+    def end_session(self, session):
+        with self._lock:
+            self.sessions.pop(session, None)
+            self._sizes.pop(session, None)
+            self.profiles.pop(session, None)
+
+    def lease(self, session):
+        # Keep the returned object in the session's state: once the session is dropped and the
+        # object collected, end_session() forgets the session
+        lease = _SessionLease()
+        weakref.finalize(lease, self.end_session, session)
+        return lease
+
+    def save_profile(self, session, profile):
+        with self._lock:
+            self.profiles[session] = dict(profile, ts=round(time.time(), 3))
+
+    def export_jsonl(self):
+        # Events followed by one summary line per stage and per session, as JSON lines
+        with self._lock:
+            events = list(self.events)
+            sessions = {s: {"bytes": v["bytes"], "updated": v["updated"]} for s, v in self.sessions.items()}
+        lines = [json.dumps(e) for e in events]
+        lines += [json.dumps(dict(row, type="stage_summary")) for row in self.summary()]
+        lines += [json.dumps({"type": "session_summary", "session": s, **v}) for s, v in sessions.items()]
+        return ("\n".join(lines) + "\n").encode() if lines else b""
+
+    def flush(self):
+        # Append events recorded since the last flush to the sink file
+        if not self.sink_path:
+            return 0
+        with self._lock:
+            pending, self._unflushed = self._unflushed, []
+        if pending:
+            os.makedirs(os.path.dirname(os.path.abspath(self.sink_path)), exist_ok=True)
+            with open(self.sink_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(e) + "\n" for e in pending))
+        return len(pending)
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self.stages.clear()
+            self.profiles.clear()
+
+class _SessionLease:
+    pass
+
+class _Stage:
+    def __init__(self, metrics, name, extra):
+        self.metrics = metrics
+        self.name = name
+        self.extra = extra
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, (time.perf_counter() - self.start) * 1000, **self.extra)
+        return False
+
+class RerunProfiler:
+    # Opt-in cProfile and/or tracemalloc capture around one script run. Both are process-wide, so
+    # concurrent sessions show up in the capture; meant for an admin on a quiet server.
+    def __init__(self, cpu=False, memory=False, top=25):
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self._profile = None
+
+    def start(self):
+        if self.cpu:
+            import cProfile
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:
+                self._profile = None  # another session is being profiled (one profiler per process)
+        if self.memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        return self
+
+    def stop(self):
+        out = {}
+        if self._profile is not None:
+            import io
+            import pstats
+            self._profile.disable()
+            buf = io.StringIO()
+            pstats.Stats(self._profile, stream=buf).sort_stats("cumulative").print_stats(self.top)
+            out["cprofile"] = buf.getvalue()
+        if self.memory:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            out["tracemalloc"] = {"current_bytes": current, "peak_bytes": peak,
+                                  "top": [str(s) for s in snapshot.statistics("lineno")[:self.top]]}
+        return out
+
+METRICS = Metrics()
+timed = METRICS.timed
+stage = METRICS.stage
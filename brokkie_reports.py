@@ -0,0 +1,329 @@
+# brokkie_reports.py
+# Template-based PDF rendering. Each report layout is a list of ops that is compiled once into
+# drawing steps (static text is sanitized at compile time); rendered bytes are cached by a hash
+# of the report name and context. render_reports_batch fans out over a process pool.
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from brokkie_core import safe_text, format_usd
+from brokkie_metrics import timed
+
+class _Fields(dict):
+    # format_map source: context values, then template defaults, then empty string
+    def __init__(self, context, defaults):
+        super().__init__(defaults)
+        self.update(context)
+
+    def __missing__(self, key):
+        return ""
+
+class ReportTemplate:
+    # Ops (all text templates use str.format_map over the context):
+    #   ("page",)                          new page
+    #   ("font", style, size)              set Arial font
+    #   ("space", h)                       vertical gap
+    #   ("text", h, template[, align])     single line cell
+    #   ("wrap", w, h, template)           multi_cell paragraph
+    #   ("money", h, key)                  "k: $v" line for each item of dict context[key]
+    #   ("list", w, h, key, template[, gap])  multi_cell per item of context[key] ({n}, {item}, or row fields)
+    def __init__(self, name, ops, defaults=None, margin=None, derived=None):
+        self.name = name
+        self.defaults = defaults or {}
+        self.margin = margin
+        self.derived = derived or {}
+        self.steps = [self._compile(op) for op in ops]
+
+    def _compile(self, op):
+        kind, args = op[0], op[1:]
+        if kind == "page":
+            return lambda pdf, fields: pdf.add_page()
+        if kind == "font":
+            style, size = args
+            return lambda pdf, fields: pdf.set_font("Arial", style, size)
+        if kind == "space":
+            h, = args
+            return lambda pdf, fields: pdf.ln(h)
+        if kind == "text":
+            h, template, align = (args + ("L",))[:3]
+            render = self._text(template)
+            return lambda pdf, fields: pdf.cell(0, h, render(fields), ln=True, align=align)
+        if kind == "wrap":
+            w, h, template = args
+            render = self._text(template)
+            return lambda pdf, fields: pdf.multi_cell(w, h, render(fields))
+        if kind == "money":
+            h, key = args
+
+            def money(pdf, fields):
+                for k, v in (fields.get(key) or {}).items():
+                    pdf.cell(0, h, safe_text(f"{k}: {format_usd(v)}"), ln=True)
+            return money
+        if kind == "list":
+            w, h, key, template, gap = (args + (0,))[:5]
+
+            def items(pdf, fields):
+                for n, item in enumerate(fields.get(key) or [], start=1):
+                    values = item if isinstance(item, dict) else {"item": item}
+                    pdf.multi_cell(w, h, safe_text(template.format_map(_Fields(values, {"n": n}))))
+                    if gap:
+                        pdf.ln(gap)
+            return items
+        raise ValueError(f"unknown report op {kind!r} in {self.name}")
+
+    @staticmethod
+    def _text(template):
+        if "{" not in template:
+            text = safe_text(template)
+            return lambda fields: text
+        return lambda fields: safe_text(template.format_map(fields))
+
+    def render(self, context):
+        from fpdf import FPDF
+        fields = _Fields(context, self.defaults)
+        for key, derive in self.derived.items():
+            fields[key] = derive(fields)
+        pdf = FPDF()
+        if self.margin is not None:
+            pdf.set_auto_page_break(auto=True, margin=self.margin)
+        for step in self.steps:
+            step(pdf, fields)
+        return bytes(pdf.output())
+
+TEMPLATES = {}
+
+def register_template(template):
+    TEMPLATES[template.name] = template
+    return template
+
+register_template(ReportTemplate("final", [
+    ("page",),
+    ("font", "B", 16), ("text", 8, "Final Valuation Report"),
+    ("font", "", 10), ("space", 4),
+    ("text", 6, "Generated: {generated}"), ("space", 6),
+    ("font", "B", 12), ("text", 6, "Business Summary"),
+    ("font", "", 10),
+    ("text", 6, "Business Name: {business_name}"),
+    ("text", 6, "Primary Contact: {seller_contact}"),
+    ("space", 4),
+    ("font", "B", 12), ("text", 6, "Primary Data"),
+    ("font", "", 10), ("money", 6, "primary_data"),
+    ("space", 4),
+    ("font", "B", 12), ("text", 6, "Valuation Models Summary"),
+    ("font", "", 10), ("money", 6, "valuations"),
+    ("space", 6),
+    ("font", "B", 12), ("text", 6, "Recommended Value & Notes"),
+    ("font", "", 10), ("wrap", 0, 6, "{notes}"),
+], defaults={"business_name": "N/A", "seller_contact": "N/A", "notes": "No notes"}, margin=15))
+
+register_template(ReportTemplate("cim", [
+    # Cover / Teaser page
+    ("page",),
+    ("font", "B", 16), ("text", 10, "{business_name} - Teaser", "C"),
+    ("space", 4),
+    ("font", "", 10), ("wrap", 180, 6, "{one_liner}"),
+    ("space", 4),
+    ("text", 6, "Location: {location}"),
+    ("text", 6, "Industry: {industry}"),
+    ("text", 6, "Est. Revenue (TTM): {ttm_revenue}"),
+    # Financial snapshot
+    ("page",),
+    ("font", "B", 12), ("text", 8, "Financial Snapshot"),
+    ("font", "", 10), ("money", 6, "primary_data"),
+    # Highlights
+    ("space", 4),
+    ("font", "B", 12), ("text", 6, "Investment Highlights"),
+    ("font", "", 10), ("list", 180, 6, "highlights", "- {item}"),
+], defaults={
+    "business_name": "Company", "location": "N/A", "industry": "N/A",
+    "one_liner": "Confidential business opportunity - summary below.",
+    "highlights": ["Recurring revenue", "Strong margins", "Scalable operations"],
+}, margin=12, derived={
+    "ttm_revenue": lambda f: format_usd((f.get("primary_data") or {}).get("TTM Revenue", 0)),
+}))
+
+register_template(ReportTemplate("questions", [
+    ("page",),
+    ("font", "", 10), ("text", 6, "Seller Q&A"),
+    ("space", 4),
+    ("list", 180, 6, "questions", "Q{n}. {item}", 2),
+]))
+
+# ---------- Cache ----------
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+CACHE_SIZE = int(os.environ.get("BROKKIE_REPORT_CACHE_SIZE", 256))
+
+def context_key(name, context):
+    payload = json.dumps([name, context], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def render_report(name, context, use_cache=True):
+    # The "generated" stamp is part of the key, so a cached report is reused only within the
+    # minute it shows
+    if "generated" not in context:
+        context = dict(context, generated=datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC'))
+    key = context_key(name, context) if use_cache else None
+    if key is not None:
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+    data = TEMPLATES[name].render(context)
+    if key is not None:
+        with _cache_lock:
+            _cache[key] = data
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return data
+
+def cache_stats():
+    with _cache_lock:
+        return {"items": len(_cache), "bytes": sum(len(v) for v in _cache.values())}
+
+# ---------- Batch ----------
+def _render_job(job):
+    name, context, path = (tuple(job) + (None,))[:3]
+    data = render_report(name, context, use_cache=False)
+    if path is None:
+        return data
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def render_reports_batch(jobs, workers=None):
+    # jobs: iterable of (template name, context[, output path]). Jobs with a path are written by
+    # the worker and return the path; the rest return PDF bytes. Results keep job order.
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        return [_render_job(job) for job in jobs]
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_render_job, jobs, chunksize=chunksize))
+
+# ---------- Streaming portfolio report ----------
+# FPDF keeps every page in memory until output(). For large books the portfolio table is written
+# by a small PDF writer instead: each page's content stream is compressed and flushed to the
+# output file as soon as it is full, so memory holds one page of rows plus an offset per object.
+PAGE_W, PAGE_H, PAGE_MARGIN = 595.28, 841.89, 36  # A4 in points
+PORTFOLIO_COLUMNS = [
+    # (column, header, relative width, formatter)
+    ("Business", "Business", 0.34, str),
+    ("Industry", "Industry", 0.16, str),
+    ("Status", "Status", 0.18, str),
+    ("Valuation", "Valuation", 0.18, lambda v: format_usd(v)),
+    ("Matched Buyers", "Buyers", 0.14, str),
+]
+
+def _pdf_string(text):
+    text = safe_text(str(text)).replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return "(" + text + ")"
+
+def _fit(text, width, size):
+    # Helvetica averages roughly half an em per character; truncate with an ellipsis to fit
+    max_chars = max(1, int(width / (size * 0.52)))
+    return text if len(text) <= max_chars else text[:max(1, max_chars - 3)] + "..."
+
+class StreamingTablePDF:
+    def __init__(self, path, title, headers, widths, font_size=9, row_h=13):
+        self.file = open(path, "wb")
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 5  # 1 catalog, 2 pages, 3-4 fonts
+        self.title = title
+        self.headers = headers
+        usable = PAGE_W - 2 * PAGE_MARGIN
+        self.widths = [usable * w / sum(widths) for w in widths]
+        self.font_size = font_size
+        self.row_h = row_h
+        self.ops = []
+        self.y = None
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self._object(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+
+    def _object(self, obj_id, body):
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(f"{obj_id} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def _text(self, x, y, text, bold=False, size=None):
+        size = size or self.font_size
+        self.ops.append(f"BT /F{2 if bold else 1} {size} Tf {x:.2f} {y:.2f} Td {_pdf_string(text)} Tj ET")
+
+    def _start_page(self):
+        self.y = PAGE_H - PAGE_MARGIN
+        if not self.page_ids:
+            self._text(PAGE_MARGIN, self.y - 14, self.title, bold=True, size=14)
+            self.y -= 30
+        self._row(self.headers, bold=True)
+        self.ops.append(f"{PAGE_MARGIN:.2f} {self.y + 3:.2f} m {PAGE_W - PAGE_MARGIN:.2f} {self.y + 3:.2f} l S")
+
+    def _row(self, cells, bold=False):
+        self.y -= self.row_h
+        x = PAGE_MARGIN
+        for text, width in zip(cells, self.widths):
+            self._text(x, self.y, _fit(text, width - 4, self.font_size), bold=bold)
+            x += width
+
+    def add_row(self, cells):
+        if self.y is None:
+            self._start_page()
+        elif self.y - self.row_h < PAGE_MARGIN + self.row_h:
+            self._flush_page()
+            self._start_page()
+        self._row(cells)
+
+    def _flush_page(self):
+        import zlib
+        self._text(PAGE_W - PAGE_MARGIN - 40, PAGE_MARGIN / 2, f"Page {len(self.page_ids) + 1}", size=8)
+        stream = zlib.compress("\n".join(self.ops).encode("latin1"))
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self._object(content_id, f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode() + stream + b"\nendstream")
+        self._object(page_id, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_W} {PAGE_H}] "
+                               f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content_id} 0 R >>").encode())
+        self.page_ids.append(page_id)
+        self.ops = []
+        self.y = None
+        self.file.flush()
+
+    def close(self):
+        if self.y is None and not self.page_ids:
+            self._start_page()  # empty book still gets a titled page
+        if self.y is not None:
+            self._flush_page()
+        kids = " ".join(f"{i} 0 R" for i in self.page_ids)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode())
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.file.tell()
+        size = self.next_id
+        self.file.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for obj_id in range(1, size):
+            self.file.write(f"{self.offsets[obj_id]:010d} 00000 n \n".encode())
+        self.file.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        self.file.close()
+
+@timed()
+def write_portfolio_report(deals, path, title="BrokerIQ Portfolio Report", columns=None):
+    # Stream a paginated portfolio table to `path`. `deals` is a DataFrame (iterated column-wise
+    # with itertuples) or an iterable of row tuples matching `columns`. Returns the page count.
+    columns = columns or PORTFOLIO_COLUMNS
+    if hasattr(deals, "itertuples"):
+        columns = [c for c in columns if c[0] in deals.columns]
+        rows = deals[[c[0] for c in columns]].itertuples(index=False, name=None)
+    else:
+        rows = deals
+    formatters = [c[3] for c in columns]
+    pdf = StreamingTablePDF(path, title, [c[1] for c in columns], [c[2] for c in columns])
+    try:
+        for row in rows:
+            pdf.add_row([fmt(v) for fmt, v in zip(formatters, row)])
+    finally:
+        pdf.close()
+    return len(pdf.page_ids)
@@ -0,0 +1,309 @@
+# brokkie_session.py
+# Memory-budgeted storage for large session artifacts (XLSX / PDF bytes, parsed DataFrames).
+# A managed value is written once per content fingerprint to a spill directory on local disk and
+# session_state only keeps an ArtifactRef to it. Values stay in memory while the per-session and
+# global budgets allow (least recently used are dropped first) and are reloaded from their
+# memory-mapped file on the next access. Identical content from any number of sessions is stored
+# once; the file is deleted when the last session releases it.
+#
+# Budgets: $BROKKIE_SESSION_MEMORY_MB per session (default 32) and $BROKKIE_MEMORY_BUDGET_MB for
+# the process (default 512). Spill files go under $BROKKIE_SPILL_DIR (default: system temp dir),
+# in a directory owned by this process. Values are shared between sessions: treat them as read-only.
+#
+# The budgets cover these artifacts only. The process-wide caches keep their own bounds and are
+# reported next to this one in the admin panel: ArtifactStore (download blobs, max_items, large
+# ones spooled to disk), ParseCache (max_memory_items parsed uploads) and the report render LRU
+# ($BROKKIE_REPORT_CACHE_SIZE PDFs).
+#
+# Reads avoid copies where they can: Arrow spills are memory-mapped and numeric columns stay on
+# the mapped pages, and view() serves bytes straight from the mapped file.
+import itertools
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+MIN_MANAGED_BYTES = 64 * 1024
+
+class ArtifactRef:
+    # What session_state holds in place of a managed value
+    __slots__ = ("digest", "kind", "size")
+
+    def __init__(self, digest, kind, size):
+        self.digest = digest
+        self.kind = kind
+        self.size = size
+
+    def __repr__(self):
+        return f"ArtifactRef({self.kind}, {self.size:,} bytes, {self.digest[:12]})"
+
+    def __getstate__(self):
+        return (self.digest, self.kind, self.size)
+
+    def __setstate__(self, state):
+        self.digest, self.kind, self.size = state
+
+class _Entry:
+    __slots__ = ("kind", "size", "path", "sessions")
+
+    def __init__(self, kind, size, path):
+        self.kind = kind
+        self.size = size
+        self.path = path
+        self.sessions = {}  # session -> number of its keys holding this entry
+
+def _kind(value):
+    if isinstance(value, (bytes, bytearray)):
+        return "bytes"
+    if hasattr(value, "columns") and hasattr(value, "dtypes"):
+        return "frame"
+    return None
+
+class SessionArtifacts:
+    def __init__(self, spill_dir=None, session_budget=None, global_budget=None, min_bytes=MIN_MANAGED_BYTES):
+        mb = 1024 * 1024
+        self.session_budget = session_budget or int(float(os.environ.get("BROKKIE_SESSION_MEMORY_MB", 32)) * mb)
+        self.global_budget = global_budget or int(float(os.environ.get("BROKKIE_MEMORY_BUDGET_MB", 512)) * mb)
+        self.min_bytes = min_bytes
+        base = spill_dir or os.environ.get("BROKKIE_SPILL_DIR") or tempfile.gettempdir()
+        os.makedirs(base, exist_ok=True)
+        self.spill_dir = tempfile.mkdtemp(prefix="brokkie-spill-", dir=base)
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.spill_dir, ignore_errors=True)
+        self._entries = {}  # digest -> _Entry
+        self._memory = OrderedDict()  # digest -> value, least recently used first
+        self._memory_bytes = 0
+        self._refs = {}  # (session, key) -> digest
+        self._lock = threading.Lock()
+        self._tmp_ids = itertools.count()
+        self.stored = 0
+        self.deduped = 0
+        self.reloads = 0
+
+    # ---------- storing ----------
+    def put(self, session, key, value):
+        # -> ArtifactRef for a managed value, or the value itself when it is small or not a
+        # bytes / DataFrame value (the caller keeps those in session_state as before)
+        from brokkie_metrics import value_size
+        kind = _kind(value)
+        size = value_size(value) if kind else 0
+        if kind is None or size < self.min_bytes:
+            self.release(session, key)
+            return value
+        from brokkie_dag import fingerprint
+        digest = fingerprint(value)
+        written = None  # (tmp file, spill path) once written
+        while True:
+            with self._lock:
+                entry = self._entries.get(digest)
+                if entry is not None and written is not None:
+                    self._remove_file(written[0])  # another session stored it meanwhile
+                if self._refs.get((session, key)) == digest:
+                    pass  # same content under the same key
+                elif entry is not None or written is not None:
+                    if entry is None:
+                        # Renamed only here, under the lock, so it never replaces a live entry's file
+                        tmp, path = written
+                        os.replace(tmp, path)
+                        entry = self._entries[digest] = _Entry(kind, size, path)
+                        self.stored += 1
+                    else:
+                        self.deduped += 1
+                    self._unref(session, key)
+                    self._refs[(session, key)] = digest
+                    entry.sessions[session] = entry.sessions.get(session, 0) + 1
+                else:
+                    entry = None
+                if entry is not None:
+                    self._remember(digest, value)
+                    self._enforce(session)
+                    break
+            written = self._write(digest, kind, value)  # outside the lock: may be large
+        return ArtifactRef(digest, kind, size)
+
+    def _write(self, digest, kind, value):
+        # -> (tmp file, spill path); put() moves the file into place
+        path = os.path.join(self.spill_dir, digest)
+        tmp = f"{path}.{next(self._tmp_ids)}.tmp"  # unique per write, even for the same digest
+        if kind == "bytes":
+            with open(tmp, "wb") as f:
+                f.write(value)
+            return tmp, path
+        try:
+            import pyarrow as pa
+            # Arrow only where it round-trips exactly: string column names, no object columns
+            if not all(isinstance(c, str) for c in value.columns) or (value.dtypes == object).any():
+                raise TypeError("not Arrow-exact")
+            # A RangeIndex is kept as metadata instead of being written (and read back) as a column
+            table = pa.Table.from_pandas(value, preserve_index=None)
+            with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            return tmp, path + ".arrow"
+        except Exception:
+            # Object columns and other frames Arrow cannot hold exactly
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            return tmp, path + ".pkl"
+
+    # ---------- loading ----------
+    def get(self, ref):
+        with self._lock:
+            if ref.digest in self._memory:
+                self._memory.move_to_end(ref.digest)
+                return self._memory[ref.digest]
+            entry = self._entries.get(ref.digest)
+        if entry is None:
+            raise KeyError(f"{ref!r} was released")
+        value = self._read(entry)
+        with self._lock:
+            self.reloads += 1
+            if ref.digest in self._entries:
+                self._remember(ref.digest, value)
+                sessions = list(entry.sessions)
+                for session in sessions:
+                    self._enforce(session)
+                if not sessions:
+                    self._enforce(None)
+        return value
+
+    def view(self, ref):
+        # Read-only memoryview of a managed bytes value without copying it or bringing it back into
+        # memory (for one-off readers such as downloads): the in-memory value if it is there, else
+        # the memory-mapped spill file, which stays readable after a release while the view lives.
+        if ref.kind != "bytes":
+            raise TypeError(f"view() needs a bytes artifact, not {ref.kind}")
+        with self._lock:
+            value = self._memory.get(ref.digest)
+            entry = self._entries.get(ref.digest)
+        if value is not None:
+            return memoryview(value).toreadonly()
+        if entry is None:
+            raise KeyError(f"{ref!r} was released")
+        with open(entry.path, "rb") as f:
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @staticmethod
+    def _read(entry):
+        if entry.path.endswith(".arrow"):
+            import pyarrow as pa
+            # Numeric columns can stay on the mapped file's pages instead of being read in
+            with pa.memory_map(entry.path, "r") as source:
+                return pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+        with open(entry.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if entry.path.endswith(".pkl"):
+                return pickle.loads(mapped)
+            return mapped[:]
+
+    # ---------- budgets ----------
+    def _remember(self, digest, value):
+        if digest not in self._memory:
+            self._memory_bytes += self._entries[digest].size
+        self._memory[digest] = value
+        self._memory.move_to_end(digest)
+
+    def _drop(self, digest):
+        self._memory.pop(digest)
+        self._memory_bytes -= self._entries[digest].size
+
+    def _session_bytes(self, session):
+        return sum(self._entries[d].size for d in self._memory if session in self._entries[d].sessions)
+
+    def _enforce(self, session):
+        # Least recently used values leave memory first: this session's over its budget, then
+        # anyone's over the global budget. Their spill files stay for reloads.
+        if session is not None:
+            used = self._session_bytes(session)
+            for digest in list(self._memory):
+                if used <= self.session_budget:
+                    break
+                if session in self._entries[digest].sessions:
+                    used -= self._entries[digest].size
+                    self._drop(digest)
+        for digest in list(self._memory):
+            if self._memory_bytes <= self.global_budget:
+                break
+            self._drop(digest)
+
+    # ---------- releasing ----------
+    def _unref(self, session, key):
+        digest = self._refs.pop((session, key), None)
+        if digest is None:
+            return
+        entry = self._entries[digest]
+        entry.sessions[session] -= 1
+        if not entry.sessions[session]:
+            del entry.sessions[session]
+        if not entry.sessions:
+            if digest in self._memory:
+                self._drop(digest)
+            del self._entries[digest]
+            self._remove_file(entry.path)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def release(self, session, key):
+        with self._lock:
+            self._unref(session, key)
+
+    def release_session(self, session):
+        with self._lock:
+            for s, key in [k for k in self._refs if k[0] == session]:
+                self._unref(s, key)
+
+    def stats(self):
+        with self._lock:
+            disk = sum(e.size for e in self._entries.values())
+            return {"entries": len(self._entries), "in_memory": len(self._memory),
+                    "memory_bytes": self._memory_bytes, "global_budget": self.global_budget,
+                    "session_budget": self.session_budget, "spilled_bytes": disk,
+                    "sessions": len({s for s, _ in self._refs}), "stored": self.stored,
+                    "deduped": self.deduped, "reloads": self.reloads}
+
+    def session_stats(self, session):
+        with self._lock:
+            digests = {d for (s, _), d in self._refs.items() if s == session}
+            return {"artifacts": len(digests), "bytes": sum(self._entries[d].size for d in digests),
+                    "memory_bytes": self._session_bytes(session)}
+
+class _Lease:
+    # Kept in session_state; when Streamlit drops the session, its artifacts are released
+    pass
+
+class SessionView:
+    # Dict-like view of a session's state (what RecomputeGraph and the steps read and write):
+    # managed values go through SessionArtifacts, references resolve on read.
+    LEASE_KEY = "_artifact_lease"
+
+    def __init__(self, state, manager, session):
+        self.state = state
+        self.manager = manager
+        self.session = session
+        if self.LEASE_KEY not in state:
+            lease = _Lease()
+            weakref.finalize(lease, manager.release_session, session)
+            state[self.LEASE_KEY] = lease
+
+    def __contains__(self, key):
+        return key in self.state
+
+    def __getitem__(self, key):
+        value = self.state[key]
+        return self.manager.get(value) if isinstance(value, ArtifactRef) else value
+
+    def get(self, key, default=None):
+        return self[key] if key in self.state else default
+
+    def __setitem__(self, key, value):
+        self.state[key] = self.manager.put(self.session, key, value)
+
+    def ref(self, key):
+        # The stored reference (or plain value) without loading it
+        return self.state.get(key)
@@ -0,0 +1,398 @@
+# brokkie_store.py
+# Local SQLite deal store. One row per deal (indexed by status, industry and valuation for the
+# dashboard) plus one row per (deal, artifact key) holding each workflow step's output.
+# Artifacts are written through as each step saves them; unchanged values are skipped by digest.
+import hashlib
+import io
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deals (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    industry TEXT,
+    location TEXT,
+    broker TEXT,
+    status TEXT NOT NULL DEFAULT 'Data Collection',
+    valuation REAL,
+    matched_buyers INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_deals_status ON deals (status, COALESCE(valuation, -1e308), id);
+CREATE INDEX IF NOT EXISTS idx_deals_industry ON deals (industry, COALESCE(valuation, -1e308), id);
+CREATE INDEX IF NOT EXISTS idx_deals_valuation ON deals (COALESCE(valuation, -1e308), id);
+CREATE INDEX IF NOT EXISTS idx_deals_updated ON deals (updated_at, id);
+-- version is bumped by triggers on every deal change; readers use it to invalidate caches
+CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', 0);
+CREATE TRIGGER IF NOT EXISTS deals_version_insert AFTER INSERT ON deals
+BEGIN UPDATE store_meta SET value = value + 1 WHERE key = 'version'; END;
+CREATE TRIGGER IF NOT EXISTS deals_version_update AFTER UPDATE ON deals
+BEGIN UPDATE store_meta SET value = value + 1 WHERE key = 'version'; END;
+CREATE TRIGGER IF NOT EXISTS deals_version_delete AFTER DELETE ON deals
+BEGIN UPDATE store_meta SET value = value + 1 WHERE key = 'version'; END;
+-- buyers_version is bumped on every registry import; the buyer matcher is rebuilt when it changes
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('buyers_version', 0);
+CREATE TABLE IF NOT EXISTS buyers (
+    buyer_id TEXT PRIMARY KEY,
+    name TEXT,
+    industries TEXT,
+    locations TEXT,
+    min_price REAL,
+    max_price REAL,
+    min_sde REAL,
+    max_sde REAL
+);
+CREATE TABLE IF NOT EXISTS deal_matches (
+    deal_id TEXT NOT NULL REFERENCES deals (id) ON DELETE CASCADE,
+    buyer_id TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (deal_id, buyer_id)
+) WITHOUT ROWID;
+-- background jobs (brokkie_jobs); params / result are pickled
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    deal_id TEXT,
+    result_key TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    error TEXT,
+    params BLOB,
+    result BLOB,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_deal ON jobs (deal_id, created_at);
+CREATE TABLE IF NOT EXISTS deal_artifacts (
+    deal_id TEXT NOT NULL REFERENCES deals (id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    payload BLOB,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (deal_id, key)
+) WITHOUT ROWID;
+"""
+
+JOB_FIELDS = ("status", "progress", "message", "error", "result", "started_at", "finished_at", "attempts")
+DEAL_FIELDS = ("name", "industry", "location", "broker", "status", "valuation", "matched_buyers")
+# Sort expressions for list_deals; valuation matches the expression indexes above (unvalued deals sort last)
+SORT_KEYS = {
+    "valuation": "COALESCE(valuation, -1e308)",
+    "updated_at": "updated_at",
+    "created_at": "created_at",
+    "name": "COALESCE(name, '')",
+}
+
+def default_db_path():
+    return os.environ.get("BROKKIE_DB_PATH", os.path.join(os.path.expanduser("~"), ".brokkie", "deals.db"))
+
+def _now():
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+def encode_artifact(value):
+    # -> (kind, payload bytes). DataFrames as JSON (split orient), bytes as-is, plain data as JSON,
+    # anything else pickled.
+    if isinstance(value, (bytes, bytearray)):
+        return "bytes", bytes(value)
+    if hasattr(value, "to_json") and hasattr(value, "columns"):
+        return "frame", value.to_json(orient="split", date_format="iso").encode()
+    try:
+        return "json", json.dumps(value).encode()  # keeps dict order (drives report line order)
+    except (TypeError, ValueError):
+        return "pickle", pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+def decode_artifact(kind, payload):
+    if kind == "bytes":
+        return payload
+    if kind == "frame":
+        import pandas as pd
+        return pd.read_json(io.StringIO(payload.decode()), orient="split")
+    if kind == "json":
+        return json.loads(payload)
+    return pickle.loads(payload)
+
+class DealStore:
+    def __init__(self, path=None):
+        self.path = path or default_db_path()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+            # Columns added since a database may have been created
+            if "attempts" not in {r[1] for r in self._conn.execute("PRAGMA table_info(jobs)")}:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    # ---------- deals ----------
+    def create_deal(self, deal_id=None, **fields):
+        deal_id = deal_id or uuid.uuid4().hex
+        now = _now()
+        cols = {k: v for k, v in fields.items() if k in DEAL_FIELDS}
+        names = ", ".join(["id", "created_at", "updated_at", *cols])
+        marks = ", ".join("?" * (3 + len(cols)))
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT OR IGNORE INTO deals ({names}) VALUES ({marks})",
+                               (deal_id, now, now, *cols.values()))
+        return deal_id
+
+    def update_deal(self, deal_id, **fields):
+        cols = {k: v for k, v in fields.items() if k in DEAL_FIELDS}
+        if not cols:
+            return
+        assignments = ", ".join(f"{k} = ?" for k in cols)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE deals SET {assignments}, updated_at = ? WHERE id = ?",
+                               (*cols.values(), _now(), deal_id))
+
+    def get_deal(self, deal_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM deals WHERE id = ?", (deal_id,)).fetchone()
+        return dict(row) if row else None
+
+    def delete_deal(self, deal_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM deals WHERE id = ?", (deal_id,))
+
+    def filter_clause(self, status=None, industry=None, broker=None, min_valuation=None, max_valuation=None):
+        clauses, params = [], []
+        for col, value in (("status", status), ("industry", industry), ("broker", broker)):
+            if value is not None:
+                if isinstance(value, (list, tuple, set)):
+                    clauses.append(f"{col} IN ({', '.join('?' * len(value))})")
+                    params.extend(value)
+                else:
+                    clauses.append(f"{col} = ?")
+                    params.append(value)
+        if min_valuation is not None:
+            clauses.append("valuation >= ?")
+            params.append(min_valuation)
+        if max_valuation is not None:
+            clauses.append("valuation <= ?")
+            params.append(max_valuation)
+        return clauses, params
+
+    def distinct_values(self, column):
+        if column not in ("status", "industry", "broker", "location"):
+            raise ValueError(f"unsupported column {column!r}")
+        with self._lock:
+            rows = self._conn.execute(f"SELECT DISTINCT {column} FROM deals WHERE {column} IS NOT NULL ORDER BY 1")
+            return [r[0] for r in rows]
+
+    def version(self):
+        # Changes whenever any deal row is inserted, updated or deleted (from any process)
+        with self._lock:
+            return self._conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()[0]
+
+    def query(self, sql, params=()):
+        # Read-only helper for aggregate queries (see brokkie_dashboard)
+        with self._lock:
+            return [tuple(r) for r in self._conn.execute(sql, params)]
+
+    def count_deals(self, **filters):
+        clauses, params = self.filter_clause(**filters)
+        sql = "SELECT COUNT(*) FROM deals" + (" WHERE " + " AND ".join(clauses) if clauses else "")
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def list_deals(self, limit=50, after=None, order_by="valuation", descending=True, **filters):
+        # Keyset pagination: pass the returned cursor as `after` to get the next page.
+        # Returns (rows, next_cursor); next_cursor is None on the last page.
+        if order_by not in SORT_KEYS:
+            raise ValueError(f"order_by must be one of {tuple(SORT_KEYS)}")
+        clauses, params = self.filter_clause(**filters)
+        direction, op = ("DESC", "<") if descending else ("ASC", ">")
+        key = SORT_KEYS[order_by]
+        if after is not None:
+            clauses.append(f"({key}, id) {op} (?, ?)")
+            params.extend(after)
+        sql = (f"SELECT *, {key} AS _sort FROM deals" + (" WHERE " + " AND ".join(clauses) if clauses else "") +
+               f" ORDER BY {key} {direction}, id {direction} LIMIT ?")
+        with self._lock:
+            rows = [dict(r) for r in self._conn.execute(sql, (*params, limit + 1))]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]["_sort"], rows[-1]["id"])
+        for r in rows:
+            r.pop("_sort")
+        return rows, next_cursor
+
+    def iter_deals(self, page_size=5000, order_by="valuation", descending=True, **filters):
+        # Stream every matching deal page by page (constant memory for exports)
+        cursor = None
+        while True:
+            rows, cursor = self.list_deals(limit=page_size, after=cursor, order_by=order_by,
+                                           descending=descending, **filters)
+            yield from rows
+            if cursor is None:
+                return
+
+    # ---------- buyers & matches ----------
+    BUYER_COLUMNS = ("buyer_id", "name", "industries", "locations", "min_price", "max_price", "min_sde", "max_sde")
+
+    def save_buyers(self, buyers, replace=False):
+        # buyers: DataFrame with BUYER_COLUMNS (missing columns stored as NULL)
+        cols = self.BUYER_COLUMNS
+        frame = buyers.reindex(columns=cols)
+        frame = frame.astype({c: "float64" for c in cols[4:]}).astype(object)
+        frame = frame.where(frame.notna(), None)
+        with self._lock, self._conn:
+            if replace:
+                self._conn.execute("DELETE FROM buyers")
+            self._conn.executemany(f"INSERT OR REPLACE INTO buyers ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                                   frame.itertuples(index=False, name=None))
+            self._conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'buyers_version'")
+
+    def buyers_version(self):
+        with self._lock:
+            return self._conn.execute("SELECT value FROM store_meta WHERE key = 'buyers_version'").fetchone()[0]
+
+    def load_buyers(self):
+        import pandas as pd
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(self.BUYER_COLUMNS)} FROM buyers").fetchall()
+        return pd.DataFrame([tuple(r) for r in rows], columns=list(self.BUYER_COLUMNS))
+
+    def save_matches(self, deal_id, matches, total):
+        # matches: [(buyer_id, score)] top matches; total: full matched count shown on the dashboard
+        self.save_matches_many([(deal_id, matches, total)])
+
+    def save_matches_many(self, results):
+        # results: iterable of (deal_id, matches, total), written in one transaction
+        with self._lock, self._conn:
+            for deal_id, matches, total in results:
+                self._conn.execute("DELETE FROM deal_matches WHERE deal_id = ?", (deal_id,))
+                self._conn.executemany("INSERT INTO deal_matches (deal_id, buyer_id, score) VALUES (?, ?, ?)",
+                                       [(deal_id, b, s) for b, s in matches])
+                self._conn.execute("UPDATE deals SET matched_buyers = ? WHERE id = ?", (total, deal_id))
+
+    def load_matches(self, deal_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT m.buyer_id, b.name, m.score FROM deal_matches m LEFT JOIN buyers b USING (buyer_id) "
+                "WHERE m.deal_id = ? ORDER BY m.score DESC", (deal_id,)).fetchall()
+        return [tuple(r) for r in rows]
+
+    # ---------- jobs ----------
+    def create_job(self, kind, owner, params=None, deal_id=None, result_key=None):
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, owner, deal_id, result_key, params, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, owner, deal_id, result_key,
+                 pickle.dumps(params or {}, protocol=pickle.HIGHEST_PROTOCOL), _now()))
+        return job_id
+
+    def update_job(self, job_id, **fields):
+        unknown = set(fields) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"unknown job fields: {sorted(unknown)}")
+        if "result" in fields:
+            fields["result"] = pickle.dumps(fields["result"], protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                               (*fields.values(), job_id))
+
+    @staticmethod
+    def _job(row, blobs=False):
+        job = {k: row[k] for k in row.keys() if k not in ("params", "result")}
+        if blobs:
+            job["params"] = pickle.loads(row["params"]) if row["params"] is not None else {}
+            job["result"] = pickle.loads(row["result"]) if row["result"] is not None else None
+        return job
+
+    def get_job(self, job_id, blobs=True):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row, blobs) if row else None
+
+    def list_jobs(self, owner=None, deal_id=None, status=None, limit=50, oldest_first=False):
+        # Newest first by default; status may be one value or a list
+        clauses, params = [], []
+        if owner is not None:
+            clauses.append("owner = ?")
+            params.append(owner)
+        if deal_id is not None:
+            clauses.append("deal_id = ?")
+            params.append(deal_id)
+        if status is not None:
+            status = [status] if isinstance(status, str) else list(status)
+            clauses.append(f"status IN ({', '.join('?' * len(status))})")
+            params.extend(status)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        order = "ASC" if oldest_first else "DESC"
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM jobs{where} ORDER BY created_at {order}, rowid {order} LIMIT ?",
+                                      (*params, limit)).fetchall()
+        return [self._job(r) for r in rows]
+
+    def purge_jobs(self, finished_before, statuses=("done", "failed", "cancelled")):
+        # Delete jobs that finished before the given ISO timestamp; returns the deleted jobs (with blobs)
+        marks = ", ".join("?" * len(statuses))
+        with self._lock, self._conn:
+            rows = self._conn.execute(f"SELECT * FROM jobs WHERE status IN ({marks}) AND finished_at < ?",
+                                      (*statuses, finished_before)).fetchall()
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(r["id"],) for r in rows])
+        return [self._job(r, blobs=True) for r in rows]
+
+    # ---------- step artifacts ----------
+    def save_artifact(self, deal_id, key, value):
+        # Write-through of one step output. Returns False when the stored value is already identical.
+        # The deal row is left alone (its updated_at and the store version track the dashboard
+        # columns); the artifact row carries its own updated_at.
+        if value is None:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM deal_artifacts WHERE deal_id = ? AND key = ?", (deal_id, key))
+            return True
+        kind, payload = encode_artifact(value)
+        digest = hashlib.sha256(payload).hexdigest()
+        now = _now()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT digest FROM deal_artifacts WHERE deal_id = ? AND key = ?",
+                                     (deal_id, key)).fetchone()
+            if row is not None and row[0] == digest:
+                return False
+            self._conn.execute("INSERT OR IGNORE INTO deals (id, created_at, updated_at) VALUES (?, ?, ?)",
+                               (deal_id, now, now))
+            self._conn.execute(
+                "INSERT INTO deal_artifacts (deal_id, key, kind, digest, payload, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (deal_id, key) DO UPDATE SET kind = excluded.kind, digest = excluded.digest, "
+                "payload = excluded.payload, updated_at = excluded.updated_at",
+                (deal_id, key, kind, digest, payload, now))
+        return True
+
+    def load_artifact(self, deal_id, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT kind, payload FROM deal_artifacts WHERE deal_id = ? AND key = ?",
+                                     (deal_id, key)).fetchone()
+        return decode_artifact(row["kind"], row["payload"]) if row else default
+
+    def load_artifacts(self, deal_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT key, kind, payload FROM deal_artifacts WHERE deal_id = ?",
+                                      (deal_id,)).fetchall()
+        return {r["key"]: decode_artifact(r["kind"], r["payload"]) for r in rows}
+
+    def load_artifact_for_all(self, key):
+        # {deal_id: value} for one artifact key across every deal (single query)
+        with self._lock:
+            rows = self._conn.execute("SELECT deal_id, kind, payload FROM deal_artifacts WHERE key = ?", (key,)).fetchall()
+        return {r["deal_id"]: decode_artifact(r["kind"], r["payload"]) for r in rows}
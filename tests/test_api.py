@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+from brokkie_api import MAX_BODY, EstimateService
+
+def _exchange(raw):
+    # Send one raw request to a fresh server; -> (status, headers, body)
+    async def run():
+        service = EstimateService()
+        service.batcher.start()
+        server = await asyncio.start_server(service.serve_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(raw)
+            await writer.drain()
+            head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+            headers = dict(line.split(": ", 1) for line in head[1:] if ": " in line)
+            body = await reader.readexactly(int(headers["Content-Length"]))
+            writer.close()
+            return int(head[0].split(" ")[1]), headers, body
+        finally:
+            server.close()
+            await service.batcher.stop()
+    return asyncio.run(run())
+
+def _post(length_header, body=b"", extra=""):
+    return (f"POST /estimate HTTP/1.1\r\nHost: x\r\n{length_header}{extra}\r\n").encode() + body
+
+def test_valid_body_is_estimated():
+    payload = json.dumps({"revenue": 300000, "profit": 45000, "assets": 20000}).encode()
+    status, headers, body = _exchange(_post(f"Content-Length: {len(payload)}\r\n", payload))
+    assert status == 200 and json.loads(body)["estimate"] > 0
+    assert headers["Connection"] == "keep-alive"
+
+def test_non_integer_content_length_is_rejected():
+    status, headers, _ = _exchange(_post("Content-Length: abc\r\n"))
+    assert status == 400 and headers["Connection"] == "close"
+
+def test_negative_content_length_is_rejected():
+    status, _, body = _exchange(_post("Content-Length: -5\r\n"))
+    assert status == 400 and b"Content-Length" in body
+
+def test_oversized_body_is_rejected():
+    status, headers, _ = _exchange(_post(f"Content-Length: {MAX_BODY + 1}\r\n"))
+    assert status == 413 and headers["Connection"] == "close"
+
+def test_chunked_body_is_rejected():
+    status, headers, _ = _exchange(_post("Transfer-Encoding: chunked\r\n", b"5\r\nhello\r\n0\r\n\r\n"))
+    assert status == 501 and headers["Connection"] == "close"
+
+def test_invalid_json_is_a_bad_request():
+    status, _, body = _exchange(_post("Content-Length: 3\r\n", b"{x}"))
+    assert status == 400 and json.loads(body) == {"error": "invalid JSON"}
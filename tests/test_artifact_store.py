@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+import brokkie_core
+from brokkie_core import ArtifactStore
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+def test_registered_file_is_not_hashed_again(tmp_path, monkeypatch):
+    store = ArtifactStore()
+    path = _write(tmp_path / "report.pdf", b"%PDF report")
+    digest = store.put_file(path, owned=True)
+    calls = []
+    real = brokkie_core.hashlib.sha256
+    monkeypatch.setattr(brokkie_core.hashlib, "sha256", lambda *a: calls.append(a) or real(*a))
+    assert store.put_file(path, owned=True) == digest
+    assert calls == []
+
+def test_owned_duplicate_keeps_resolving_after_removal(tmp_path):
+    store = ArtifactStore()
+    first = store.put_file(_write(tmp_path / "a.pdf", b"same"), owned=True)
+    dup = _write(tmp_path / "b.pdf", b"same")
+    assert store.put_file(dup, owned=True) == first
+    assert not os.path.exists(dup)
+    assert store.put_file(dup, owned=True) == first
+    assert store.get(first) == b"same"
+
+def test_rewritten_file_is_hashed_again(tmp_path):
+    store = ArtifactStore()
+    path = _write(tmp_path / "r.pdf", b"v1")
+    first = store.put_file(path)
+    _write(path, b"version 2")
+    assert store.put_file(path) != first
+
+def test_evicted_artifacts_are_reported_missing(tmp_path):
+    store = ArtifactStore(max_items=1)
+    path = _write(tmp_path / "old.pdf", b"old")
+    digest = store.put_file(path, owned=True)
+    store.put(b"newer")
+    with pytest.raises(KeyError):
+        store.get(digest)
+    with pytest.raises(FileNotFoundError):
+        store.put_file(path, owned=True)
+
+def test_stats_count_only_in_memory_blobs():
+    store = ArtifactStore(spool_bytes=10)
+    store.put(b"x" * 5)
+    store.put(b"y" * 50)
+    assert store.stats() == {"items": 2, "memory_bytes": 5, "files": 0}
@@ -0,0 +1,53 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from brokkie_comps import EARTH_RADIUS_KM, CompsIndex
+
+def _comps(points, prefix):
+    return pd.DataFrame({"comp_id": [f"{prefix}{i}" for i in range(len(points))], "kind": "business",
+                         "industry": "Service", "location": "Seattle, WA",
+                         "lat": [p[0] for p in points], "lon": [p[1] for p in points],
+                         "price": 500_000.0, "revenue": 1_000_000.0, "sde": 200_000.0})
+
+def _km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def test_pending_rows_keep_their_own_distance():
+    origin = (47.6, -122.3)
+    # Indexed comps are far away, pending ones close, so pending rows rank first
+    index = CompsIndex(_comps([(47.6 + d, -122.3) for d in (0.5, 1.0, 1.5)], "old"), rebuild_every=1000)
+    index.add_comps(_comps([(47.6 + d, -122.3) for d in (0.05, 0.7)], "new"))
+    result = index.nearest(*origin, k=5)
+    assert list(result["comp_id"]) == ["new0", "old0", "new1", "old1", "old2"]
+    expected = _km(origin[0], origin[1], result["lat"].to_numpy(), result["lon"].to_numpy())
+    assert np.allclose(result["distance_km"].to_numpy(), expected, rtol=1e-6)
+    assert result["distance_km"].is_monotonic_increasing
+
+def test_queries_during_add_comps():
+    rng = np.random.default_rng(7)
+    index = CompsIndex(_comps(rng.uniform(40, 48, (200, 2)) * [1, -2.5], "base"), rebuild_every=150)
+    errors = []
+
+    def add():
+        for batch in range(20):
+            index.add_comps(_comps(rng.uniform(40, 48, (40, 2)) * [1, -2.5], f"b{batch}-"))
+
+    def query():
+        try:
+            for _ in range(200):
+                r = index.nearest(44.0, -110.0, k=10)
+                d = _km(44.0, -110.0, r["lat"].to_numpy(), r["lon"].to_numpy())
+                assert np.allclose(r["distance_km"].to_numpy(), d, rtol=1e-6)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=add)] + [threading.Thread(target=query) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
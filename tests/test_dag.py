@@ -0,0 +1,64 @@
+from brokkie_dag import RecomputeGraph
+from brokkie_metrics import METRICS
+
+def counting_graph(calls):
+    # a -> doubled -> parity -> label; every compute is logged to calls
+    def compute(name, fn):
+        def run(*args):
+            calls.append(name)
+            return fn(*args)
+        return run
+
+    graph = RecomputeGraph()
+    graph.node("doubled", ["a"], compute("doubled", lambda a: a * 2))
+    graph.node("parity", ["doubled"], compute("parity", lambda d: d % 4 == 0))
+    graph.node("label", ["parity"], compute("label", lambda p: "even" if p else "odd"))
+    return graph
+
+def test_changed_input_recomputes_downstream():
+    calls, state = [], {}
+    graph = counting_graph(calls)
+    graph.set(state, "a", 1)
+    assert graph.get(state, "label") == "odd"
+    assert calls == ["doubled", "parity", "label"]
+    calls.clear()
+    assert graph.get(state, "label") == "odd" and calls == []
+    graph.set(state, "a", 2)
+    assert graph.stale(state) == ["doubled", "parity", "label"]
+    assert graph.get(state, "label") == "even"
+    assert calls == ["doubled", "parity", "label"]
+
+def test_identical_recompute_does_not_cascade():
+    calls, state = [], {}
+    graph = counting_graph(calls)
+    graph.set(state, "a", 1)
+    graph.get(state, "label")
+    calls.clear()
+    graph.set(state, "a", 3)  # doubled changes (2 -> 6) but parity stays False
+    assert graph.get(state, "label") == "odd"
+    assert calls == ["doubled", "parity"]
+
+def test_set_reports_changes_and_clears_staleness():
+    calls, state = [], {}
+    graph = counting_graph(calls)
+    assert graph.set(state, "a", 1) is True
+    assert graph.set(state, "a", 1) is False
+    assert graph.is_stale(state, "doubled")
+    graph.get(state, "label")
+    # An override of a derived node counts as computed from the current inputs
+    assert graph.set(state, "parity", True) is True
+    assert not graph.is_stale(state, "parity")
+    assert graph.is_stale(state, "label")
+    calls.clear()
+    assert graph.get(state, "label") == "even" and calls == ["label"]
+    assert graph.stale(state) == []
+
+def test_recompute_is_timed_as_a_stage():
+    state = {}
+    graph = counting_graph([])
+    graph.set(state, "a", 5)
+    before = METRICS.stages.get("dag.doubled", {"count": 0})["count"]
+    computed = []
+    graph.get(state, "doubled", on_compute=lambda name, value: computed.append((name, value)))
+    assert computed == [("doubled", 10)]
+    assert METRICS.stages["dag.doubled"]["count"] == before + 1
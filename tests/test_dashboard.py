@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from brokkie_dashboard import DashboardData, lttb
+from brokkie_store import DealStore
+
+def test_lttb_keeps_threshold_points_and_the_ends():
+    x = np.arange(1000)
+    y = np.sin(x / 25.0) * x
+    keep = lttb(x, y, 100)
+    assert len(keep) == 100
+    assert keep[0] == 0 and keep[-1] == 999
+    assert (np.diff(keep) > 0).all()
+
+@pytest.mark.parametrize("n", [2, 50, 100])
+def test_lttb_leaves_short_series_alone(n):
+    assert list(lttb(range(n), np.ones(n), 100)) == list(range(n))
+
+@pytest.fixture
+def store(tmp_path):
+    store = DealStore(str(tmp_path / "deals.db"))
+    for i in range(60):
+        store.create_deal(f"d{i:02d}", name=f"Deal {i}", industry="Retail", valuation=float(i) * 1000)
+    with store._lock, store._conn:
+        # One deal per day so the day buckets outnumber the point budget
+        store._conn.execute("UPDATE deals SET created_at = date('2024-01-01', '+' || CAST(substr(id, 2) AS INTEGER) || ' days')")
+    return store
+
+def test_time_series_is_downsampled_to_max_points(store):
+    data = DashboardData(store)
+    series = data.time_series(bucket="day", max_points=20)
+    assert len(series) == 20
+    assert series.index[0] == "2024-01-01" and series.index[-1] == "2024-02-29"
+    full = data.time_series(bucket="day", max_points=500)
+    assert len(full) == 60 and full["Deals"].sum() == 60
+
+def test_cache_follows_the_store_version(store):
+    data = DashboardData(store)
+    assert data.summary()["deals"] == 60
+    assert data.summary()["deals"] == 60
+    assert data.stats()["hits"] == 1
+    store.create_deal("new", name="New deal", valuation=1.0)
+    assert data.summary()["deals"] == 61
+    assert data.stats()["misses"] == 2
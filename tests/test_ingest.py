@@ -0,0 +1,67 @@
+import io
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from brokkie_ingest import ingest_documents, stream_inventory
+
+# Workers import parsers by reference, so they live at module level
+def slow_parser(name, data):
+    if name.startswith("hang"):
+        time.sleep(60)
+    if name.startswith("slow"):
+        time.sleep(1.5)
+    time.sleep(0.05)
+    return [{"Metric": "TTM Revenue", "Value": len(data)}]
+
+def failing_parser(name, data):
+    raise ValueError("unreadable")
+
+def test_hung_worker_is_terminated():
+    files = [("hang.pdf", b"x"), ("ok-1.pdf", b"ab"), ("ok-2.pdf", b"abc")]
+    start = time.perf_counter()
+    parsed, report = ingest_documents(files, max_workers=3, timeout=10, parser=slow_parser)
+    assert time.perf_counter() - start < 40
+    status = {r["File"]: r["Status"] for r in report}
+    assert status == {"hang.pdf": "timeout", "ok-1.pdf": "parsed", "ok-2.pdf": "parsed"}
+    assert multiprocessing.active_children() == []
+
+def test_all_workers_hung_skips_the_rest():
+    files = [("hang-1.pdf", b"a"), ("hang-2.pdf", b"b"), ("ok-1.pdf", b"c"), ("ok-2.pdf", b"d")]
+    start = time.perf_counter()
+    _, report = ingest_documents(files, max_workers=2, timeout=2, parser=slow_parser)
+    assert time.perf_counter() - start < 20
+    assert [r["Status"] for r in report] == ["timeout", "timeout", "skipped", "skipped"]
+    assert multiprocessing.active_children() == []
+
+def test_timeout_excludes_queue_and_startup_time():
+    # Three 1.5 s parses on two workers: the third waits its turn (and all wait for the pool to
+    # start) without that counting against its timeout
+    files = [("slow-1.pdf", b"a"), ("slow-2.pdf", b"b"), ("slow-3.pdf", b"c")]
+    _, report = ingest_documents(files, max_workers=2, timeout=2.2, parser=slow_parser)
+    assert [r["Status"] for r in report] == ["parsed"] * 3
+    assert all(1.5 <= r["Seconds"] < 2.2 for r in report)
+
+def test_seconds_measured_in_worker():
+    files = [("a.pdf", b"a"), ("b.pdf", b"bb")]
+    _, report = ingest_documents(files, max_workers=2, parser=slow_parser)
+    assert [r["Status"] for r in report] == ["parsed", "parsed"]
+    assert all(r["Seconds"] >= 0.04 for r in report)
+
+def test_parser_errors_are_reported():
+    files = [("a.pdf", b"a"), ("b.pdf", b"bb")]
+    _, report = ingest_documents(files, max_workers=2, parser=failing_parser)
+    assert all(r["Status"] == "error: unreadable" for r in report)
+
+def test_inventory_without_known_headers_is_rejected(tmp_path):
+    data = io.BytesIO(b"foo,bar\n1,2\n")
+    with pytest.raises(ValueError, match="no inventory columns recognized"):
+        stream_inventory(data, "csv", str(tmp_path / "inv.parquet"))
+
+def test_inventory_is_streamed_to_parquet(tmp_path):
+    data = io.BytesIO(b"SKU,Qty,Unit Cost,Dept\nA1,2,$10.50,Tools\nB2,1,4,\n")
+    inv = stream_inventory(data, "csv", str(tmp_path / "inv.parquet"))
+    assert inv["rows"] == 2 and inv["extended_value"] == 25.0
+    assert os.path.exists(inv["path"])
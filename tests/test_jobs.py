@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import brokkie_jobs
+from brokkie_jobs import FINISHED, JobRunner
+from brokkie_store import DealStore
+
+@pytest.fixture
+def store(tmp_path):
+    return DealStore(str(tmp_path / "deals.db"))
+
+@pytest.fixture
+def release(monkeypatch):
+    # "wait" jobs block until the test sets the returned event
+    event = threading.Event()
+
+    def wait_job(progress, store):
+        event.wait(30)
+        return "ok"
+    monkeypatch.setitem(brokkie_jobs.JOB_KINDS, "wait", wait_job)
+    yield event
+    event.set()
+
+def wait_for(store, job_ids, statuses=FINISHED):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if all(store.get_job(j)["status"] in statuses for j in job_ids):
+            return
+        time.sleep(0.05)
+    raise AssertionError(f"jobs did not reach {statuses}")
+
+def test_second_job_of_an_owner_waits_for_the_first(store, release):
+    runner = JobRunner(store, max_workers=2, per_user=1)
+    first = runner.submit("wait", "user:a@example.com")
+    second = runner.submit("wait", "user:a@example.com")
+    other = runner.submit("wait", "user:b@example.com")
+    wait_for(store, [first, other], ("running",))
+    assert store.get_job(second)["status"] == "queued"
+    release.set()
+    wait_for(store, [first, second, other])
+    assert [store.get_job(j)["status"] for j in (first, second, other)] == ["done"] * 3
+    assert store.get_job(second)["attempts"] == 1
+
+def test_repeatedly_interrupted_job_fails_at_the_attempt_cap(store, release):
+    job_id = store.create_job("wait", "user:a@example.com")
+    for attempt in range(1, 4):
+        # Each runner stands for a server start that finds the job still marked running
+        JobRunner(store, max_workers=1, max_attempts=3)
+        job = store.get_job(job_id)
+        assert job["status"] == "running" and job["attempts"] == attempt
+    JobRunner(store, max_workers=1, max_attempts=3)
+    job = store.get_job(job_id)
+    assert job["status"] == "failed" and "not retried" in job["error"]
+
+def test_interrupted_job_is_retried_below_the_cap(store):
+    job_id = store.create_job("final_pdf", "user:a@example.com", {"context": {}})
+    store.update_job(job_id, status="running", attempts=1)
+    JobRunner(store, max_workers=1, max_attempts=3)
+    wait_for(store, [job_id])
+    job = store.get_job(job_id)
+    assert job["status"] == "done" and job["attempts"] == 2
+
+def test_startup_sweep_deletes_old_finished_jobs_and_their_files(store, tmp_path, release):
+    report = tmp_path / "portfolio.pdf"
+    report.write_bytes(b"%PDF")
+    old = store.create_job("portfolio_report", "session:x", {})
+    store.update_job(old, status="done", result=str(report), finished_at="2020-01-01T00:00:00")
+    recent = store.create_job("final_pdf", "session:x", {})
+    store.update_job(recent, status="done", finished_at="2999-01-01T00:00:00")
+    queued = store.create_job("wait", "session:x")
+    runner = JobRunner(store, max_workers=1, retention_days=7)
+    assert store.get_job(old) is None and not os.path.exists(report)
+    assert store.get_job(recent) is not None and store.get_job(queued) is not None
+    assert runner.sweep() == 0
+
+def test_existing_database_gains_the_attempts_column(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, owner TEXT NOT NULL, deal_id TEXT, "
+                 "result_key TEXT, status TEXT NOT NULL DEFAULT 'queued', progress REAL NOT NULL DEFAULT 0, "
+                 "message TEXT, error TEXT, params BLOB, result BLOB, created_at TEXT NOT NULL, "
+                 "started_at TEXT, finished_at TEXT)")
+    conn.commit()
+    conn.close()
+    store = DealStore(path)
+    job_id = store.create_job("final_pdf", "session:x", {})
+    assert store.get_job(job_id)["attempts"] == 0
@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+
+from brokkie_matching import BuyerMatcher
+
+def _matcher():
+    buyers = pd.DataFrame({"buyer_id": ["open", "ranged"], "industries": ["", "Service"],
+                           "locations": ["", "WA"], "min_price": [None, 100_000],
+                           "max_price": [None, 2_000_000], "min_sde": [None, 50_000], "max_sde": [None, 500_000]})
+    return BuyerMatcher(buyers, min_score=0.0)
+
+def test_no_valuation_and_no_sde_is_not_a_match():
+    matcher = _matcher()
+    assert matcher.match_deal("d", "Service", "Seattle, WA", {}, None) == 0
+    assert matcher.top_matches("d") == []
+
+def test_non_positive_band_is_not_a_match():
+    matcher = _matcher()
+    assert matcher.match_deal("d", "Service", "Seattle, WA", {"BE": -5_000, "CMA": 0}, 200_000) == 0
+
+def test_missing_sde_gets_no_sde_credit():
+    matcher = _matcher()
+    matcher.match_deal("with", "Service", "Seattle, WA", {"BE": 800_000, "CMA": 900_000}, 200_000)
+    matcher.match_deal("without", "Service", "Seattle, WA", {"BE": 800_000, "CMA": 900_000}, None)
+    with_sde, without_sde = dict(matcher.top_matches("with")), dict(matcher.top_matches("without"))
+    assert with_sde["open"] == pytest.approx(1.0)
+    assert without_sde["open"] == pytest.approx(1.0 - matcher.weights["sde"])
+
+def test_match_all_skips_deals_without_a_band():
+    deals = pd.DataFrame({"deal_id": ["a", "b"], "industry": ["Service", "Service"],
+                          "location": ["Seattle, WA", "Seattle, WA"], "SDE (est)": [200_000, None],
+                          "BE": [800_000, None], "CMA": [900_000, None]})
+    assert _matcher().match_all(deals) == {"a": 2, "b": 0}
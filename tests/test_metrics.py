@@ -0,0 +1,18 @@
+import gc
+
+from brokkie_metrics import Metrics
+
+def test_track_state_drops_removed_keys():
+    metrics = Metrics(sink_path="")
+    metrics.track_state("s", {"a": b"x" * 100, "b": b"y" * 10})
+    assert metrics.track_state("s", {"a": b"x" * 100}) == 100
+    assert set(metrics._sizes["s"]) == {"a"}
+
+def test_session_is_forgotten_when_its_lease_is_collected():
+    metrics = Metrics(sink_path="")
+    lease = metrics.lease("s")
+    metrics.track_state("s", {"a": b"x"})
+    metrics.save_profile("s", {"cprofile": "..."})
+    del lease
+    gc.collect()
+    assert metrics.sessions == {} and metrics._sizes == {} and metrics.profiles == {}
@@ -0,0 +1,46 @@
+import os
+import stat
+import tempfile
+
+import pytest
+
+from brokkie_core import ParseCache, default_cache_dir
+
+posix_only = pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+
+def test_round_trip_from_disk(tmp_path):
+    ParseCache(str(tmp_path / "c")).put("k", {"rows": 3})
+    fresh = ParseCache(str(tmp_path / "c"))
+    assert fresh.get("k") == {"rows": 3} and fresh.disk_hits == 1
+
+@posix_only
+def test_cache_dir_is_private(tmp_path):
+    path = tmp_path / "c"
+    path.mkdir(mode=0o777)
+    os.chmod(path, 0o777)
+    ParseCache(str(path))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o700
+
+@posix_only
+def test_writable_by_others_is_not_loaded(tmp_path):
+    cache = ParseCache(str(tmp_path / "c"))
+    cache.put("k", "value")
+    os.chmod(os.path.join(cache.cache_dir, "k.pkl"), 0o666)
+    fresh = ParseCache(cache.cache_dir)
+    assert fresh.get("k") is None and fresh.misses == 1
+
+def test_default_dir_is_not_the_shared_temp_dir(monkeypatch):
+    monkeypatch.delenv("BROKKIE_CACHE_DIR", raising=False)
+    assert not os.path.abspath(default_cache_dir()).startswith(os.path.abspath(tempfile.gettempdir()) + os.sep)
+
+def test_companion_files_count_and_are_evicted_with_their_key(tmp_path):
+    cache = ParseCache(str(tmp_path / "c"), max_disk_bytes=20_000)
+    spill = cache.companion_path("inventory-old", ".parquet")
+    with open(spill, "wb") as f:
+        f.write(b"x" * 15_000)
+    cache.put("inventory-old", {"path": spill})
+    os.utime(spill, (1, 1))
+    os.utime(os.path.join(cache.cache_dir, "inventory-old.pkl"), (1, 1))
+    cache.put("financials-new", b"y" * 10_000)
+    assert sorted(os.listdir(cache.cache_dir)) == ["financials-new.pkl"]
+    assert cache.get("inventory-old") is None
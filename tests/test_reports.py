@@ -0,0 +1,15 @@
+from brokkie_core import owner_report_context
+from brokkie_reports import render_report
+
+def test_cached_report_shows_its_own_timestamp():
+    context = owner_report_context("Cache Co", 500_000, 80_000, 10_000)
+    first = render_report("final", dict(context, generated="2026-01-01 09:00 UTC"))
+    again = render_report("final", dict(context, generated="2026-01-01 09:00 UTC"))
+    later = render_report("final", dict(context, generated="2026-01-01 09:01 UTC"))
+    assert again is first
+    assert later != first
+
+def test_unstamped_report_is_stamped_and_cached():
+    context = owner_report_context("Stamp Co", 500_000, 80_000, 10_000)
+    assert render_report("final", context)[:5] == b"%PDF-"
+    assert "generated" not in context
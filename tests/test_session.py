@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from brokkie_session import SessionArtifacts
+
+@pytest.fixture
+def spilled(tmp_path):
+    # Budgets of one byte: every value leaves memory as soon as it is stored
+    return SessionArtifacts(spill_dir=str(tmp_path), session_budget=1, global_budget=1, min_bytes=1)
+
+def test_frame_reads_back_from_the_mapped_spill(spilled):
+    frame = pd.DataFrame({"a": np.arange(100_000, dtype="float64"), "b": np.arange(100_000)})
+    ref = spilled.put("s", "k", frame)
+    out = spilled.get(ref)
+    assert out.equals(frame) and isinstance(out.index, pd.RangeIndex)
+    assert not out["a"].to_numpy().flags.writeable  # still on the mapped pages
+
+def test_view_reads_bytes_without_reloading(spilled):
+    data = os.urandom(200_000)
+    ref = spilled.put("s", "pdf", data)
+    view = spilled.view(ref)
+    assert bytes(view) == data
+    assert spilled.stats()["in_memory"] == 0 and spilled.stats()["reloads"] == 0
+
+def test_view_of_a_released_value(spilled):
+    ref = spilled.put("s", "pdf", b"x" * 1000)
+    spilled.release("s", "pdf")
+    with pytest.raises(KeyError):
+        spilled.view(ref)
+
+def test_concurrent_store_keeps_the_live_spill(spilled, monkeypatch):
+    data = os.urandom(100_000)
+    write = spilled._write
+    raced = []
+
+    def racing_write(digest, kind, value):
+        written = write(digest, kind, value)
+        if not raced:
+            # Another session stores the same content while this write is in flight
+            raced.append(None)
+            raced[0] = spilled.put("other", "pdf", data)
+        return written
+
+    monkeypatch.setattr(spilled, "_write", racing_write)
+    ref = spilled.put("s", "pdf", data)
+    assert spilled.get(ref) == data and spilled.get(raced[0]) == data
+    assert len(os.listdir(spilled.spill_dir)) == 1
+    assert spilled.stats()["stored"] == 1 and spilled.stats()["deduped"] == 1
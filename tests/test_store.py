@@ -0,0 +1,62 @@
+import pytest
+
+from brokkie_store import DealStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = DealStore(str(tmp_path / "deals.db"))
+    # Ties on valuation and unvalued deals exercise the (sort key, id) cursor
+    for i in range(57):
+        store.create_deal(f"d{i:03d}", name=f"Deal {i}", industry="Service" if i % 3 else "Retail",
+                          status="Data Collection", valuation=None if i % 10 == 0 else float(i % 7) * 1000)
+    return store
+
+def all_pages(store, limit, **kwargs):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = store.list_deals(limit=limit, after=cursor, **kwargs)
+        rows.extend(page)
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("order_by", ["valuation", "created_at", "name"])
+def test_pages_cover_every_deal_once_in_order(store, order_by, descending):
+    rows, pages = all_pages(store, 10, order_by=order_by, descending=descending)
+    ids = [r["id"] for r in rows]
+    assert len(ids) == 57 and len(set(ids)) == 57
+    assert pages == 6
+    whole, cursor = store.list_deals(limit=1000, order_by=order_by, descending=descending)
+    assert cursor is None and [r["id"] for r in whole] == ids
+
+def test_unvalued_deals_sort_last(store):
+    rows, _ = all_pages(store, 8, order_by="valuation")
+    values = [r["valuation"] for r in rows]
+    assert values[-6:] == [None] * 6
+    assert values[:-6] == sorted(values[:-6], reverse=True)
+
+def test_filters_apply_to_every_page(store):
+    rows, _ = all_pages(store, 4, industry="Retail")
+    assert len(rows) == store.count_deals(industry="Retail") == 19
+    assert {r["industry"] for r in rows} == {"Retail"}
+
+def test_iter_deals_streams_all_pages(store):
+    assert [d["id"] for d in store.iter_deals(page_size=7)] == [r["id"] for r in store.list_deals(limit=100)[0]]
+
+def test_exact_page_boundary_has_no_empty_trailing_page(store):
+    page, cursor = store.list_deals(limit=57)
+    assert len(page) == 57 and cursor is None
+
+def test_artifact_writes_do_not_invalidate_the_dashboard(store):
+    version, before = store.version(), store.get_deal("d001")
+    assert store.save_artifact("d001", "parsed_xlsx", b"xlsx bytes")
+    assert store.save_artifact("d001", "primary_data", {"TTM Revenue": 1})
+    assert store.version() == version and store.get_deal("d001") == before
+    store.update_deal("d001", valuation=5000.0)
+    assert store.version() > version
+
+def test_first_artifact_creates_the_deal(store):
+    version = store.version()
+    store.save_artifact("new", "primary_data", {"TTM Revenue": 1})
+    assert store.get_deal("new") is not None and store.version() > version
@@ -0,0 +1,63 @@
+import json
+
+import pandas as pd
+import pytest
+
+from brokkie_core import (
+    compute_valuation_models, compute_valuation_models_batch, quick_estimate, quick_estimate_batch, simulate_cma,
+    simulated_cma_multiple, valuation_multiples,
+)
+
+DEALS = [
+    {"TTM Revenue": 1_000_000, "Net Income": 200_000, "SDE (est)": 250_000, "Assets": 50_000},
+    {"TTM Revenue": 350_000, "Net Income": -20_000, "SDE (est)": 0},
+    {"TTM Revenue": 0},
+    {},
+]
+
+@pytest.mark.parametrize("sde_multiple", [None, 0, 2.5])
+def test_batch_matches_scalar(sde_multiple):
+    frame = pd.DataFrame(DEALS)
+    frame["CMA Multiple"] = 0.9
+    frame["SDE Multiple"] = sde_multiple
+    batch = compute_valuation_models_batch(frame).to_dict("records")
+    for deal, row in zip(DEALS, batch):
+        scalar = compute_valuation_models(deal, cma_multiple=0.9, sde_multiple=sde_multiple)
+        assert row == pytest.approx(scalar)
+
+@pytest.mark.parametrize("inputs", [[(300_000, 45_000, 20_000)], [(1e20, 0, 0), (-1e20, 5, 7), (300_000, 45_000, 20_000)]])
+def test_quick_estimate_batch_matches_scalar(inputs):
+    batch = quick_estimate_batch(*zip(*inputs)).tolist()
+    assert batch == [quick_estimate(*row) for row in inputs]
+
+def test_explicit_zero_sde_multiple_is_kept():
+    deal = {"TTM Revenue": 100_000, "SDE (est)": 500_000}
+    assert compute_valuation_models(deal, cma_multiple=1.0, sde_multiple=0)["APEEV"] == pytest.approx(48_000)
+
+def test_cli_values_deals_in_one_batch(tmp_path):
+    from brokkie_cli import run_batch
+    deals = tmp_path / "deals"
+    for name in ("alpha", "beta"):
+        (deals / name).mkdir(parents=True)
+        (deals / name / "pnl.pdf").write_bytes(name.encode() * 100)
+        (deals / name / "deal.json").write_text(json.dumps({"name": name, "seed": 7}))
+    rows, errors = run_batch(str(deals), str(tmp_path / "out"), workers=1)
+    assert not errors and [r["Deal"] for r in rows] == ["alpha", "beta"]
+    for name in ("alpha", "beta"):
+        out = tmp_path / "out" / name
+        assert (out / "Final_Valuation_Report.pdf").read_bytes().startswith(b"%PDF")
+        saved = json.loads((out / "valuations.json").read_text())
+        expected = compute_valuation_models(saved["primary_data"], cma_multiple=simulated_cma_multiple(saved["primary_data"], 7))
+        assert saved["valuations"] == pytest.approx(expected)
+
+def test_cma_point_value_is_simulation_p50():
+    deal = DEALS[0]
+    cma_multiple, sde_multiple = valuation_multiples(None, 42, deal)
+    cma = compute_valuation_models(deal, cma_multiple=cma_multiple, sde_multiple=sde_multiple)["CMA"]
+    assert cma == pytest.approx(simulate_cma(deal, 42)["P50"])
+
+def test_cma_simulation_reads_numpy_figures():
+    import numpy as np
+    deal = DEALS[0]
+    as_numpy = {k: np.int64(v) if k == "TTM Revenue" else np.float64(v) for k, v in deal.items()}
+    assert simulate_cma(as_numpy, 42)["P50"] == simulate_cma(deal, 42)["P50"] > 0